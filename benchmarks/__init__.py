@@ -0,0 +1,3 @@
+"""
+Load tests for the REST API. See :mod:`benchmarks.__main__` for usage.
+"""
@@ -0,0 +1,120 @@
+"""
+Measures the throughput and latency of the main API endpoints.
+
+The schema of the target database is dropped and seeded with ``--users`` × ``--contacts``,
+then the application is served by an in-process uvicorn and driven by ``--concurrency``
+async clients. By default it runs on a throwaway SQLite file with an in-memory Redis::
+
+    python -m benchmarks --users 20 --contacts 1000 --duration 30 --save-baseline benchmarks/baseline.json
+    python -m benchmarks --users 20 --contacts 1000 --duration 30 --baseline benchmarks/baseline.json
+
+With ``--baseline`` the exit status is 1 when an endpoint regressed by more than ``--tolerance``.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import random
+import sys
+import tempfile
+from pathlib import Path
+
+from benchmarks import load
+from benchmarks.stats import compare, format_table, summarize
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--database-url", help="Synchronous URL of a database the benchmark may drop "
+                                               "(default: a temporary SQLite file)")
+    parser.add_argument("--redis", choices=["fake", "real"], default="fake",
+                        help="Use an in-memory Redis (default) or the one from the settings")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--contacts", type=int, default=500, help="Contacts per user")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--bcrypt-rounds", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save-baseline", type=Path, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", type=Path, help="Compare the results with this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Accepted relative regression (default 0.2)")
+    return parser.parse_args(argv)
+
+
+async def benchmark(args: argparse.Namespace, database_url: str) -> dict:
+    # Settings read at import time (rate limit policies) must be set before the app is imported.
+    load.use_settings(rate_limits={}, bcrypt_rounds=args.bcrypt_rounds, query_budget_strict=False, slow_query_ms=None)
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    from main import app
+    from src.database import db as database
+    from src.database.db import engine_options, get_async_url, get_db
+
+    rng = random.Random(args.seed)
+    emails = load.seed(database_url, args.users, args.contacts, args.bcrypt_rounds, rng)
+
+    async_url = get_async_url(database_url)
+    engine = create_async_engine(async_url, **engine_options(async_url))
+    # The lifespan handler pre-warms the application engine.
+    database.engine = engine
+    session_factory = async_sessionmaker(engine, autoflush=False, expire_on_commit=False)
+
+    async def get_benchmark_db():
+        async with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = get_benchmark_db
+    if args.redis == "fake":
+        from fakeredis import FakeAsyncRedis
+        from src.database import redis as redis_db
+        # The lifespan handler creates the application client.
+        redis_db.create_redis = lambda **overrides: FakeAsyncRedis()
+
+    port = load.free_port()
+    server, task = await load.start_server(app, port)
+    try:
+        recorder = await load.run_load(f"http://127.0.0.1:{port}", emails, args.concurrency, args.warmup,
+                                       args.duration, rng)
+    finally:
+        server.should_exit = True
+        await task
+        await engine.dispose()
+    return {
+        name: summarize(recorder.latencies[name], recorder.errors[name], args.duration)
+        for name in recorder.latencies
+    }
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory() as tmp:
+        database_url = args.database_url or f"sqlite:///{tmp}/benchmark.db"
+        results = asyncio.run(benchmark(args, database_url))
+    print(format_table(results))
+
+    report = {
+        "meta": {
+            "database": load.describe_database(database_url),
+            "redis": args.redis,
+            "users": args.users,
+            "contacts": args.contacts,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "python": platform.python_version(),
+        },
+        "endpoints": results,
+    }
+    if args.save_baseline:
+        args.save_baseline.write_text(json.dumps(report, indent=2) + "\n")
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = compare(results, baseline["endpoints"], args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
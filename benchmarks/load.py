@@ -0,0 +1,222 @@
+import asyncio
+import random
+import socket
+import time
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import Dict, List, Tuple
+
+import httpx
+import uvicorn
+from sqlalchemy import create_engine, insert
+from sqlalchemy.engine import make_url
+
+from src.conf.config import settings
+from src.database.models import Base, Contact, User
+from src.repository.contacts import to_birthday_md
+from src.services.auth import auth_service
+
+PASSWORD = "benchmark"
+FIRST_NAMES = ["Anna", "Borys", "Daryna", "Ivan", "Kateryna", "Mykola", "Olena", "Petro", "Sofiia", "Taras"]
+LAST_NAMES = ["Bondarenko", "Hrytsenko", "Kovalenko", "Melnyk", "Shevchenko", "Tkachenko"]
+SEARCH_TERMS = ["ann", "ryn", "van", "oko", "enko", "lny", "tar", "ofi"]
+
+
+@dataclass
+class Endpoint:
+    """
+    A request the load generator sends, and how often relative to the others.
+    """
+    name: str
+    method: str
+    path: str
+    weight: int
+    params: Tuple = ()
+
+
+ENDPOINTS = [
+    Endpoint("login", "POST", "/api/auth/login", 1),
+    Endpoint("contacts", "GET", "/api/contacts/", 4, (("limit", 50),)),
+    Endpoint("search", "GET", "/api/contacts/search/", 3),
+    Endpoint("birthdays", "GET", "/api/contacts/birthdays/", 2, (("days", 30),)),
+]
+
+
+@dataclass
+class Recorder:
+    """
+    The latencies and errors of the requests sent during the measurement.
+    """
+    measuring: bool = False
+    latencies: Dict[str, List[float]] = field(default_factory=lambda: {e.name: [] for e in ENDPOINTS})
+    errors: Dict[str, int] = field(default_factory=lambda: {e.name: 0 for e in ENDPOINTS})
+
+    def record(self, name: str, elapsed: float, ok: bool) -> None:
+        if not self.measuring:
+            return
+        if ok:
+            self.latencies[name].append(elapsed)
+        else:
+            self.errors[name] += 1
+
+
+def seed(database_url: str, users: int, contacts: int, rounds: int, rng: random.Random) -> List[str]:
+    """
+    Recreates the schema and fills it with confirmed users and their contacts.
+
+    :param database_url: The synchronous database URL.
+    :type database_url: str
+    :param users: The number of users.
+    :type users: int
+    :param contacts: The number of contacts per user.
+    :type contacts: int
+    :param rounds: The bcrypt cost factor of the user passwords.
+    :type rounds: int
+    :param rng: The random generator for the contact data.
+    :type rng: random.Random
+    :return: The emails of the users, whose password is :data:`PASSWORD`.
+    :rtype: List[str]
+    """
+    engine = create_engine(database_url)
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    auth_service.configure_password_rounds(rounds)
+    password = auth_service.get_password_hash(PASSWORD)
+    emails = [f"bench{i}@example.com" for i in range(users)]
+    with engine.begin() as conn:
+        user_ids = conn.execute(insert(User).returning(User.id), [
+            {"username": f"bench{i}", "email": email, "password": password, "confirmed": True}
+            for i, email in enumerate(emails)
+        ]).scalars().all()
+        for user_id in user_ids:
+            rows = []
+            for i in range(contacts):
+                first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                birthday = date(1990, 1, 1) + timedelta(days=rng.randrange(365))
+                rows.append({
+                    "first_name": first_name,
+                    "last_name": last_name,
+                    "email": f"{first_name}.{last_name}.{user_id}.{i}@example.com".lower(),
+                    "phone": f"+380{rng.randrange(10 ** 8, 10 ** 9)}",
+                    "birthday_date": birthday,
+                    "birthday_md": to_birthday_md(birthday),
+                    "user_id": user_id,
+                })
+            conn.execute(insert(Contact), rows)
+    engine.dispose()
+    return emails
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def start_server(app, port: int) -> Tuple[uvicorn.Server, asyncio.Task]:
+    """
+    Starts uvicorn on the current event loop and waits until it accepts connections.
+
+    :param app: The ASGI application.
+    :param port: The port to listen on.
+    :type port: int
+    :return: The server and the task running it.
+    :rtype: Tuple[uvicorn.Server, asyncio.Task]
+    """
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+async def login(client: httpx.AsyncClient, email: str) -> httpx.Response:
+    return await client.post("/api/auth/login", data={"username": email, "password": PASSWORD})
+
+
+async def worker(client: httpx.AsyncClient, email: str, recorder: Recorder, deadline: float, rng: random.Random) -> None:
+    """
+    Sends a weighted mix of requests as one user until the deadline.
+
+    :param client: The HTTP client.
+    :type client: httpx.AsyncClient
+    :param email: The user to log in as.
+    :type email: str
+    :param recorder: Collects the results.
+    :type recorder: Recorder
+    :param deadline: The ``time.perf_counter()`` value to stop at.
+    :type deadline: float
+    :param rng: The random generator choosing the requests.
+    :type rng: random.Random
+    :return: None
+    """
+    response = await login(client, email)
+    response.raise_for_status()
+    headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    weights = [endpoint.weight for endpoint in ENDPOINTS]
+    while time.perf_counter() < deadline:
+        endpoint = rng.choices(ENDPOINTS, weights)[0]
+        start = time.perf_counter()
+        try:
+            if endpoint.name == "login":
+                response = await login(client, email)
+            else:
+                params = dict(endpoint.params)
+                if endpoint.name == "search":
+                    params["query"] = rng.choice(SEARCH_TERMS)
+                response = await client.request(endpoint.method, endpoint.path, params=params, headers=headers)
+            ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        recorder.record(endpoint.name, time.perf_counter() - start, ok)
+
+
+async def run_load(base_url: str, emails: List[str], concurrency: int, warmup: float, duration: float,
+                   rng: random.Random) -> Recorder:
+    """
+    Runs ``concurrency`` clients for ``warmup`` + ``duration`` seconds, recording the second part.
+
+    :param base_url: The URL of the server.
+    :type base_url: str
+    :param emails: The users the clients log in as, in turn.
+    :type emails: List[str]
+    :param concurrency: The number of concurrent clients.
+    :type concurrency: int
+    :param warmup: The seconds of unrecorded traffic.
+    :type warmup: float
+    :param duration: The seconds of recorded traffic.
+    :type duration: float
+    :param rng: The random generator seeding the clients.
+    :type rng: random.Random
+    :return: The recorded results.
+    :rtype: Recorder
+    """
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + warmup + duration
+        tasks = [asyncio.create_task(worker(client, emails[i % len(emails)], recorder, deadline,
+                                            random.Random(rng.random())))
+                 for i in range(concurrency)]
+        await asyncio.sleep(warmup)
+        recorder.measuring = True
+        await asyncio.gather(*tasks)
+    return recorder
+
+
+def describe_database(database_url: str) -> str:
+    return make_url(database_url).get_backend_name()
+
+
+def use_settings(**values) -> None:
+    """
+    Overrides settings for the benchmark. Must run before :mod:`main` is imported, since the
+    rate limiters read their policies when the routes are defined.
+
+    :param values: The settings to override.
+    :return: None
+    """
+    for name, value in values.items():
+        setattr(settings, name, value)
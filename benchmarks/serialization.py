@@ -0,0 +1,136 @@
+"""
+Compares the two ways of answering a contact list request, from query to response body.
+
+The model path loads ORM objects and lets FastAPI validate them against
+``List[ContactResponse]`` and encode the result, as the routes used to. The row path
+selects only the response columns and encodes the rows with a precompiled adapter::
+
+    python -m benchmarks.serialization --rows 100 1000 10000
+
+Both bodies are checked to be identical before anything is timed.
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from benchmarks.load import FIRST_NAMES, LAST_NAMES
+from src.database.models import Base, Contact, User
+from src.repository.contacts import RESPONSE_COLUMNS
+from src.schemas import ContactResponse, contact_rows
+
+response_field = create_model_field("Response_read_contacts", List[ContactResponse], mode="serialization")
+
+
+def model_body(contacts: List[Contact]) -> bytes:
+    """
+    Encodes ORM contacts the way FastAPI does for ``response_model=List[ContactResponse]``.
+
+    :param contacts: The contacts.
+    :type contacts: List[Contact]
+    :return: The response body.
+    :rtype: bytes
+    """
+    content = asyncio.run(serialize_response(field=response_field, response_content=contacts))
+    return JSONResponse(content).body
+
+
+def row_body(rows: List[dict]) -> bytes:
+    """
+    Encodes contact rows the way the list routes do.
+
+    :param rows: The rows of :data:`src.repository.contacts.RESPONSE_COLUMNS`.
+    :type rows: List[dict]
+    :return: The response body.
+    :rtype: bytes
+    """
+    return contact_rows.dump_json(rows)
+
+
+def seed(engine: Engine, count: int, rng: random.Random) -> int:
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        user_id = conn.execute(insert(User).returning(User.id), {
+            "username": "bench", "email": "bench@example.com", "password": "-", "confirmed": True,
+        }).scalar_one()
+        conn.execute(insert(Contact), [{
+            "first_name": rng.choice(FIRST_NAMES),
+            "last_name": rng.choice(LAST_NAMES),
+            "email": f"contact{i}@example.com",
+            "phone": f"+380{rng.randrange(10 ** 8, 10 ** 9)}",
+            "birthday_date": datetime(1990, 1, 1) + timedelta(days=rng.randrange(365)),
+            "user_id": user_id,
+        } for i in range(count)])
+    return user_id
+
+
+def best_of(func: Callable[[], bytes], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run(count: int, repeat: int, rng: random.Random) -> dict:
+    """
+    Times both paths on ``count`` contacts held in an in-memory SQLite database.
+
+    :param count: The number of contacts in the response.
+    :type count: int
+    :param repeat: The number of timed runs per path; the best one is kept.
+    :type repeat: int
+    :param rng: The random generator for the contact data.
+    :type rng: random.Random
+    :return: The best time of each path in ms and the speedup.
+    :rtype: dict
+    """
+    engine = create_engine("sqlite://")
+    user_id = seed(engine, count, rng)
+
+    def by_model() -> bytes:
+        with Session(engine) as session:
+            contacts = session.execute(select(Contact).where(Contact.user_id == user_id).order_by(Contact.id)).scalars().all()
+            return model_body(contacts)
+
+    def by_row() -> bytes:
+        with engine.connect() as conn:
+            result = conn.execute(select(*RESPONSE_COLUMNS).where(Contact.user_id == user_id).order_by(Contact.id))
+            return row_body([dict(row) for row in result.mappings()])
+
+    if by_model() != by_row():
+        raise AssertionError(f"The response bodies differ for {count} contacts")
+    model_s, row_s = best_of(by_model, repeat), best_of(by_row, repeat)
+    engine.dispose()
+    return {"rows": count, "model_ms": round(model_s * 1000, 3), "row_ms": round(row_s * 1000, 3),
+            "speedup": round(model_s / row_s, 2)}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.serialization", description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    print(f"{'rows':>8}{'model_ms':>12}{'row_ms':>12}{'speedup':>10}")
+    for count in args.rows:
+        result = run(count, args.repeat, rng)
+        print(f"{result['rows']:>8}{result['model_ms']:>12}{result['row_ms']:>12}{result['speedup']:>9}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
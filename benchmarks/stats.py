@@ -0,0 +1,92 @@
+import math
+from typing import Dict, List, Sequence
+
+
+def percentile(sorted_values: Sequence[float], fraction: float) -> float:
+    """
+    Returns the nearest-rank percentile of sorted values.
+
+    :param sorted_values: The values, in ascending order.
+    :type sorted_values: Sequence[float]
+    :param fraction: The percentile as a fraction (0.99 for p99).
+    :type fraction: float
+    :return: The percentile, or 0 if there are no values.
+    :rtype: float
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(fraction * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: List[float], errors: int, duration: float) -> dict:
+    """
+    Summarizes the requests sent to one endpoint.
+
+    :param latencies: The latency of every successful request, in seconds.
+    :type latencies: List[float]
+    :param errors: The number of failed requests.
+    :type errors: int
+    :param duration: The length of the measurement, in seconds.
+    :type duration: float
+    :return: The request and error counts, the throughput and the latency percentiles in ms.
+    :rtype: dict
+    """
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "rps": round(len(values) / duration, 2) if duration else 0.0,
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 3),
+    }
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[str]:
+    """
+    Lists the endpoints that regressed against a baseline.
+
+    An endpoint regresses when its p95 latency grows, or its throughput drops, by more than
+    ``tolerance``, or when it fails requests the baseline did not fail.
+
+    :param results: The summaries of this run, per endpoint.
+    :type results: Dict[str, dict]
+    :param baseline: The summaries of the baseline run, per endpoint.
+    :type baseline: Dict[str, dict]
+    :param tolerance: The accepted relative change (0.2 for 20%).
+    :type tolerance: float
+    :return: One message per regression.
+    :rtype: List[str]
+    """
+    regressions = []
+    for endpoint, before in baseline.items():
+        after = results.get(endpoint)
+        if after is None:
+            regressions.append(f"{endpoint}: not measured")
+            continue
+        if after["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{endpoint}: p95 {after['p95_ms']} ms, baseline {before['p95_ms']} ms")
+        if after["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{endpoint}: {after['rps']} req/s, baseline {before['rps']} req/s")
+        if after["errors"] and not before["errors"]:
+            regressions.append(f"{endpoint}: {after['errors']} failed requests")
+    return regressions
+
+
+def format_table(results: Dict[str, dict]) -> str:
+    """
+    Formats the summaries as a text table.
+
+    :param results: The summaries, per endpoint.
+    :type results: Dict[str, dict]
+    :return: The table.
+    :rtype: str
+    """
+    columns = ["requests", "errors", "rps", "p50_ms", "p95_ms", "p99_ms"]
+    width = max([len("endpoint")] + [len(name) for name in results])
+    lines = ["endpoint".ljust(width) + "".join(f"{column:>12}" for column in columns)]
+    for endpoint, summary in results.items():
+        lines.append(endpoint.ljust(width) + "".join(f"{summary[column]:>12}" for column in columns))
+    return "\n".join(lines)
@@ -0,0 +1,89 @@
+"""
+Measures JWT sign and verify throughput of every backend and algorithm.
+
+Keys are generated for the run; "cached" verifies one token repeatedly through the cache
+of verified tokens, as happens when a client sends the same access token on every request::
+
+    python -m benchmarks.tokens --seconds 1
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+
+from src.services.jwt_backend import CachingBackend, JoseBackend, JWTBackend, NativeBackend
+
+
+def private_pem(private_key) -> bytes:
+    return private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                     serialization.NoEncryption())
+
+
+def backends() -> List[tuple]:
+    """
+    Builds the backends to compare.
+
+    :return: ``(name, backend)`` pairs.
+    :rtype: List[tuple]
+    """
+    secret = "benchmark-secret"
+    es256 = private_pem(ec.generate_private_key(ec.SECP256R1()))
+    eddsa = private_pem(ed25519.Ed25519PrivateKey.generate())
+    return [
+        ("jose HS256", JoseBackend("HS256", secret)),
+        ("native HS256", NativeBackend("HS256", secret)),
+        ("jose ES256", JoseBackend("ES256", es256)),
+        ("native ES256", NativeBackend("ES256", es256)),
+        ("native EdDSA", NativeBackend("EdDSA", eddsa)),
+        ("cached HS256", CachingBackend(NativeBackend("HS256", secret), maxsize=1000, ttl=60)),
+    ]
+
+
+def ops_per_second(operation: Callable[[], object], seconds: float) -> float:
+    """
+    Runs an operation repeatedly for about ``seconds`` and returns its rate.
+
+    :param operation: The operation.
+    :type operation: Callable[[], object]
+    :param seconds: The measuring time.
+    :type seconds: float
+    :return: Operations per second.
+    :rtype: float
+    """
+    count, start = 0, time.perf_counter()
+    deadline = start + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(100):
+            operation()
+        count += 100
+    return count / (time.perf_counter() - start)
+
+
+def measure(backend: JWTBackend, seconds: float) -> dict:
+    claims = {"sub": "bench@example.com", "scope": "access_token", "jti": "0" * 32,
+              "iat": datetime.utcnow(), "exp": datetime.utcnow() + timedelta(minutes=15)}
+    token = backend.encode(claims)
+    return {
+        "sign": round(ops_per_second(lambda: backend.encode(claims), seconds)),
+        "verify": round(ops_per_second(lambda: backend.decode(token), seconds)),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.tokens", description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("--seconds", type=float, default=1.0, help="Measuring time per operation")
+    args = parser.parse_args(argv)
+
+    print(f"{'backend':<14}{'sign/s':>12}{'verify/s':>12}")
+    for name, backend in backends():
+        result = measure(backend, args.seconds)
+        print(f"{name:<14}{result['sign']:>12}{result['verify']:>12}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,43 @@
-import redis.asyncio as redis
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi_limiter import FastAPILimiter
 
 from src.routes import contacts, auth, users
 from src.conf.config import settings
+from src.database import db, redis as redis_db
+from src.services.auth import auth_service
+from src.services.cache import contacts_cache
+from src.services.metrics import MetricsMiddleware, registry
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Opens the application-scoped Redis pool, pre-warms the database pool, calibrates the bcrypt
+    cost factor and subscribes to contacts cache invalidations and token revocations; undoes it
+    all at shutdown.
+
+    :param app: The application.
+    :type app: FastAPI
+    :return: None
+    """
+    auth_service.r = redis_db.create_redis()
+    await db.prewarm(db.engine, settings.db_pool_prewarm)
+    await auth_service.setup_password_hashing()
+    contacts_cache.start()
+    auth_service.revocations.start()
+    try:
+        yield
+    finally:
+        await contacts_cache.stop()
+        await auth_service.revocations.stop()
+        await redis_db.close_redis(auth_service.r)
+        await db.engine.dispose()
+
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 origins = [ 
     "http://localhost:3000"
@@ -18,24 +49,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+app.add_middleware(MetricsMiddleware)
 
 app.include_router(contacts.router, prefix='/api')
 app.include_router(auth.router, prefix='/api')
 app.include_router(users.router, prefix='/api')
 
-@app.on_event("startup")
-async def startup():
-    """
-    Initializes the Redis connection and sets up the rate limiter during application startup.
-
-    :return: None
-    :raises ConnectionError: If the connection to Redis fails.
-    """
-    r = await redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0, encoding="utf-8",
-                          decode_responses=True)
-    await FastAPILimiter.init(r)
-
 @app.get("/")
 def read_root():
     """
@@ -44,4 +65,27 @@ def read_root():
     :return: A dictionary containing the greeting message.
     :rtype: dict
     """
-    return {"message": "Hello World"}
\ No newline at end of file
+    return {"message": "Hello World"}
+
+
+@app.get("/cache/stats")
+def read_cache_stats():
+    """
+    Returns the contacts cache statistics of the worker that serves the request.
+
+    :return: The hit, miss and error counters.
+    :rtype: dict
+    """
+    return contacts_cache.get_stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def read_metrics():
+    """
+    Returns the request, database and Redis metrics of the worker that serves the request,
+    in the Prometheus text format.
+
+    :return: The metrics.
+    :rtype: PlainTextResponse
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,39 @@
+"""Contacts birthday_md
+
+Revision ID: 277a8f5a80d7
+Revises: bd69fa2eb2a1
+Create Date: 2026-10-17 03:29:26.976643
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '277a8f5a80d7'
+down_revision: Union[str, None] = 'bd69fa2eb2a1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('contacts', sa.Column('birthday_md', sa.SmallInteger(), nullable=True))
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(
+            "UPDATE contacts SET birthday_md = "
+            "CAST(EXTRACT(MONTH FROM birthday_date) * 100 + EXTRACT(DAY FROM birthday_date) AS SMALLINT) "
+            "WHERE birthday_date IS NOT NULL"
+        )
+    else:
+        op.execute(
+            "UPDATE contacts SET birthday_md = CAST(strftime('%m%d', birthday_date) AS INTEGER) "
+            "WHERE birthday_date IS NOT NULL"
+        )
+    op.create_index('ix_contacts_user_id_birthday_md', 'contacts', ['user_id', 'birthday_md'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_birthday_md', table_name='contacts')
+    op.drop_column('contacts', 'birthday_md')
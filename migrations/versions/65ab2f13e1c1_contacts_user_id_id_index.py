@@ -0,0 +1,26 @@
+"""Contacts user_id id index
+
+Revision ID: 65ab2f13e1c1
+Revises: 1f2550271432
+Create Date: 2026-10-17 03:26:56.598119
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '65ab2f13e1c1'
+down_revision: Union[str, None] = '1f2550271432'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index('ix_contacts_user_id_id', 'contacts', ['user_id', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_contacts_user_id_id', table_name='contacts')
@@ -0,0 +1,67 @@
+"""Contacts search indexes
+
+Revision ID: bd69fa2eb2a1
+Revises: 65ab2f13e1c1
+Create Date: 2026-10-17 03:28:27.875792
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'bd69fa2eb2a1'
+down_revision: Union[str, None] = '65ab2f13e1c1'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TRGM_COLUMNS = ('first_name', 'last_name', 'email')
+
+# SQLite: an FTS5 trigram index over the same columns, maintained by triggers.
+SQLITE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5("
+    "first_name, last_name, email, content='contacts', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ai AFTER INSERT ON contacts BEGIN "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_ad AFTER DELETE ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); END",
+    "CREATE TRIGGER IF NOT EXISTS contacts_fts_au AFTER UPDATE OF first_name, last_name, email ON contacts BEGIN "
+    "INSERT INTO contacts_fts(contacts_fts, rowid, first_name, last_name, email) "
+    "VALUES ('delete', old.id, old.first_name, old.last_name, old.email); "
+    "INSERT INTO contacts_fts(rowid, first_name, last_name, email) "
+    "VALUES (new.id, new.first_name, new.last_name, new.email); END",
+    # Index the contacts that exist already.
+    "INSERT INTO contacts_fts(contacts_fts) VALUES('rebuild')",
+]
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_FTS_DDL:
+            op.execute(statement)
+        return
+    if dialect != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name in TRGM_COLUMNS:
+        op.create_index(f'ix_contacts_{name}_trgm', 'contacts', [name], unique=False,
+                        postgresql_using='gin', postgresql_ops={name: 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == 'sqlite':
+        for name in ('ai', 'ad', 'au'):
+            op.execute(f'DROP TRIGGER IF EXISTS contacts_fts_{name}')
+        op.execute('DROP TABLE IF EXISTS contacts_fts')
+        return
+    if dialect != 'postgresql':
+        return
+    for name in TRGM_COLUMNS:
+        op.drop_index(f'ix_contacts_{name}_trgm', table_name='contacts')
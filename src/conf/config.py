@@ -3,18 +3,87 @@ from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     sqlalchemy_database_url: str
+    db_pool_size: int = 10
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 10
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    db_pool_prewarm: int = 5
+    db_pgbouncer: bool = False
     secret_key: str
     algorithm: str
+    jwt_backend: str = "native"
+    jwt_private_key_file: str | None = None
+    jwt_public_key_file: str | None = None
+    jwt_cache_size: int = 10000
+    jwt_cache_ttl: float = 60
     mail_username: str
     mail_password: str
     mail_from: str
     mail_port: int
     mail_server: str
+    mail_from_name: str = "Rest API Application"
+    mail_ssl_tls: bool = True
+    mail_starttls: bool = False
+    mail_use_credentials: bool = True
+    mail_validate_certs: bool = True
+    email_queue: str = "email:queue"
+    email_batch_size: int = 50
+    email_max_attempts: int = 5
+    email_retry_delay: float = 30
+    email_timeout: float = 30
+    email_idle_timeout: float = 60
     redis_host: str = 'localhost'
     redis_port: int = 6379
+    redis_db: int = 0
+    redis_password: str | None = None
+    redis_max_connections: int = 50
+    redis_pool_timeout: float = 2.0
+    redis_socket_timeout: float = 5.0
+    redis_connect_timeout: float = 2.0
+    redis_health_check_interval: int = 30
+    user_cache_ttl: int = 900
+    refresh_token_ttl: int = 7 * 24 * 3600
+    revocation_capacity: int = 100000
+    revocation_error_rate: float = 0.001
+    revocation_rebuild_interval: float = 300
+    contacts_version_ttl: int = 86400
+    cache_local_size: int = 1024
+    cache_local_ttl: float = 60
+    cache_version_ttl: float = 5
+    cache_redis_ttl: int = 300
+    slow_query_ms: float | None = 200
+    slow_query_explain: bool = True
+    n_plus_one_threshold: int = 5
+    query_budget_strict: bool = False
+    rate_limits: dict[str, str] = {
+        "auth": "30/60",
+        "contacts": "300/60",
+        "contacts:list": "10/60",
+        "users": "60/60",
+    }
+    rate_limit_lease: float = 0.2
+    rate_limit_local_size: int = 10000
+    bcrypt_rounds: int | None = None
+    bcrypt_min_rounds: int = 10
+    bcrypt_target_ms: int = 250
+    password_hash_workers: int = 2
+    import_batch_size: int = 1000
+    import_max_errors: int = 1000
+    import_max_record_size: int = 64 * 1024
+    export_batch_size: int = 500
+    sync_page_size: int = 500
+    sync_settle_seconds: float = 2.0
     cloudinary_name: str
     cloudinary_api_key: str
     cloudinary_api_secret: str
+    avatar_storage: str = "cloudinary"
+    avatar_local_dir: str = "static/avatars"
+    avatar_base_url: str = "/static/avatars"
+    avatar_size: int = 250
+    avatar_quality: int = 85
+    avatar_max_bytes: int = 10 * 1024 * 1024
+    avatar_workers: int = 2
 
     class Config:
         env_file = ".env"
@@ -1,17 +1,120 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+import asyncio
+import logging
+from uuid import uuid4
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.pool import NullPool, QueuePool
 from src.conf.config import settings
+from src.services.metrics import InstrumentedPool, instrument_engine
+from src.services.profiling import instrument_profiling
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def get_async_url(url: str) -> str:
+    """
+    Converts a synchronous database URL into its asyncio counterpart.
+
+    ``postgresql://`` and ``postgresql+psycopg2://`` become ``postgresql+asyncpg://``,
+    ``sqlite://`` becomes ``sqlite+aiosqlite://``. URLs that already use an async driver
+    are returned unchanged.
+
+    :param url: The database URL from the settings.
+    :type url: str
+    :return: The URL with an asyncio driver.
+    :rtype: str
+    """
+    sa_url = make_url(url)
+    driver = ASYNC_DRIVERS.get(sa_url.get_backend_name())
+    if driver is not None and sa_url.get_driver_name() not in ("asyncpg", "aiosqlite"):
+        sa_url = sa_url.set(drivername=driver)
+    return sa_url.render_as_string(hide_password=False)
+
+
+def engine_options(url: str) -> dict:
+    """
+    Builds the connection pool options of ``create_async_engine`` from the settings.
+
+    The pool keeps ``db_pool_size`` connections and opens up to ``db_max_overflow`` more under
+    bursts; a checkout waits ``db_pool_timeout`` seconds for a free connection before failing.
+    Connections older than ``db_pool_recycle`` seconds are replaced, and with
+    ``db_pool_pre_ping`` each checkout first tests the connection. With ``db_pgbouncer`` the
+    application keeps no connections of its own, asyncpg caches no prepared statements, and
+    every statement it prepares gets a unique name. Otherwise PgBouncer in transaction
+    pooling mode hands the auto-named ``__asyncpg_stmt_N__`` statements of one client to
+    another, which fails with "prepared statement already exists". In-memory SQLite
+    databases keep the default single-connection pool.
+
+    :param url: The asyncio database URL.
+    :type url: str
+    :return: The keyword arguments for ``create_async_engine``.
+    :rtype: dict
+    """
+    sa_url = make_url(url)
+    options = {"pool_pre_ping": settings.db_pool_pre_ping}
+    if settings.db_pgbouncer:
+        options["poolclass"] = NullPool
+        if sa_url.get_driver_name() == "asyncpg":
+            options["connect_args"] = {
+                "statement_cache_size": 0,
+                "prepared_statement_cache_size": 0,
+                "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+            }
+    elif not (sa_url.get_backend_name() == "sqlite" and sa_url.database in (None, "", ":memory:")):
+        options.update(
+            poolclass=InstrumentedPool,
+            pool_size=settings.db_pool_size,
+            max_overflow=settings.db_max_overflow,
+            pool_timeout=settings.db_pool_timeout,
+            pool_recycle=settings.db_pool_recycle,
+        )
+    return options
+
+
+async def prewarm(engine: AsyncEngine, count: int) -> int:
+    """
+    Opens pool connections ahead of the first requests, so that they do not wait for the
+    connection setup. At most the pool size is opened; failures are logged and not raised.
+
+    :param engine: The engine.
+    :type engine: AsyncEngine
+    :param count: The number of connections to open.
+    :type count: int
+    :return: The number of connections opened.
+    :rtype: int
+    """
+    pool = engine.pool
+    count = min(count, pool.size()) if isinstance(pool, QueuePool) else 0
+    if count <= 0:
+        return 0
+    # The connections are held together so that the pool has to open each of them.
+    results = await asyncio.gather(*(engine.connect().start() for _ in range(count)), return_exceptions=True)
+    opened = 0
+    for result in results:
+        if isinstance(result, BaseException):
+            logger.warning("Database pool pre-warm failed: %s", result)
+        else:
+            await result.close()
+            opened += 1
+    return opened
+
 
 SQLALCHEMY_DATABASE_URL = settings.sqlalchemy_database_url
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+ASYNC_DATABASE_URL = get_async_url(SQLALCHEMY_DATABASE_URL)
+engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+instrument_engine(engine.sync_engine)
+instrument_profiling(engine.sync_engine)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 
 # Dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
\ No newline at end of file
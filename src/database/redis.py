@@ -0,0 +1,80 @@
+from typing import Any, List, Sequence
+
+import redis.asyncio as redis
+
+from src.conf.config import settings
+from src.services.metrics import instrument_redis
+
+
+def create_pool(**overrides) -> redis.BlockingConnectionPool:
+    """
+    Creates a Redis connection pool configured from the settings.
+
+    The pool holds at most ``redis_max_connections`` connections; when they are all in use a
+    command waits up to ``redis_pool_timeout`` seconds for one instead of failing at once.
+
+    :param overrides: Connection options replacing the ones from the settings.
+    :return: The pool. Connections are opened on first use.
+    :rtype: redis.BlockingConnectionPool
+    """
+    options = dict(
+        host=settings.redis_host,
+        port=settings.redis_port,
+        db=settings.redis_db,
+        password=settings.redis_password,
+        max_connections=settings.redis_max_connections,
+        timeout=settings.redis_pool_timeout,
+        socket_timeout=settings.redis_socket_timeout,
+        socket_connect_timeout=settings.redis_connect_timeout,
+        health_check_interval=settings.redis_health_check_interval,
+    )
+    options.update(overrides)
+    return redis.BlockingConnectionPool(**options)
+
+
+def create_redis(**overrides) -> redis.Redis:
+    """
+    Creates an instrumented Redis client on a new pool, see :func:`create_pool`.
+
+    The application creates one in its lifespan handler and shares it as ``auth_service.r``.
+
+    :param overrides: Connection options replacing the ones from the settings.
+    :return: The client.
+    :rtype: redis.Redis
+    """
+    client = redis.Redis(connection_pool=create_pool(**overrides))
+    instrument_redis(client)
+    return client
+
+
+async def close_redis(client: redis.Redis) -> None:
+    """
+    Closes a client created by :func:`create_redis` and the connections of its pool.
+
+    :param client: The client.
+    :type client: redis.Redis
+    :return: None
+    """
+    await client.aclose(close_connection_pool=True)
+
+
+async def pipelined(client: redis.Redis, *commands: Sequence, transaction: bool = False) -> List[Any]:
+    """
+    Sends several commands in one round trip, e.g.::
+
+        count, _ = await pipelined(r, ("INCRBY", key, 10), ("EXPIRE", key, 60))
+
+    :param client: The client.
+    :type client: redis.Redis
+    :param commands: The commands, each a sequence of the command name and its arguments.
+    :type commands: Sequence
+    :param transaction: Whether to wrap the commands in MULTI/EXEC.
+    :type transaction: bool
+    :return: The replies, in the order of the commands.
+    :rtype: List[Any]
+    :raises RedisError: If the round trip or one of the commands failed.
+    """
+    pipe = client.pipeline(transaction=transaction)
+    for command in commands:
+        pipe.execute_command(*command)
+    return await pipe.execute()
@@ -1,21 +1,99 @@
-from typing import List
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
 
-from sqlalchemy.orm import Session
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
 
-from src.database.models import Contact, User
+from src.database.models import Contact, User, utcnow
 from src.schemas import ContactModel
+from src.services.cache import contacts_cache
 
-from datetime import datetime
-from datetime import datetime, timedelta
+import calendar
+from datetime import date, datetime, timedelta
 
-from sqlalchemy import func
-from sqlalchemy import and_
+from sqlalchemy import func, select, insert, update, table, column, literal_column, case
+from sqlalchemy import and_, or_
 
+# The columns of ContactResponse, in its field order. List endpoints select only these and
+# return plain rows, which are serialized without building ORM objects or response models.
+RESPONSE_COLUMNS = (Contact.first_name, Contact.last_name, Contact.email, Contact.phone, Contact.id, Contact.birthday_date)
 
-async def get_contacts(skip: int, limit: int, user: User, db: Session) -> List[Contact]:
+
+def response_columns(fields: Optional[Tuple[str, ...]] = None) -> tuple:
+    """
+    Returns the columns to select for a sparse fieldset.
+
+    :param fields: The ContactResponse field names, or None for all of them.
+    :type fields: Optional[Tuple[str, ...]]
+    :return: The columns.
+    :rtype: tuple
+    """
+    if fields is None:
+        return RESPONSE_COLUMNS
+    return tuple(getattr(Contact, name) for name in fields)
+
+
+async def _fetch_rows(stmt, db: AsyncSession) -> List[dict]:
+    """
+    Runs a select of response columns and returns its rows as dicts.
+
+    :param stmt: The select statement.
+    :type stmt: Select
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: One dict per row, keyed by column name.
+    :rtype: List[dict]
+    """
+    result = await db.execute(stmt)
+    return [dict(row) for row in result.mappings()]
+
+
+def to_birthday_md(birthday_date: date | None) -> int | None:
+    """
+    Packs the month and day of a birthday into an MMDD integer (e.g. 1231 for December 31).
+
+    :param birthday_date: The birthday.
+    :type birthday_date: date | None
+    :return: The MMDD value, or None if there is no birthday.
+    :rtype: int | None
+    """
+    if birthday_date is None:
+        return None
+    return birthday_date.month * 100 + birthday_date.day
+
+
+def birthday_md_ranges(today: date, days: int) -> List[tuple[int, int]]:
+    """
+    Returns the inclusive MMDD ranges covering the ``days`` days after ``today``.
+
+    A window crossing the new year is split in two ranges. In a non-leap year a window that
+    ends on February 28 also covers February 29, so those birthdays are not skipped.
+
+    :param today: The first day of the window.
+    :type today: date
+    :param days: The number of days after ``today`` to include.
+    :type days: int
+    :return: A list of ``(start, end)`` MMDD ranges.
+    :rtype: List[tuple[int, int]]
+    """
+    if days >= 365:
+        return [(101, 1231)]
+    end_date = today + timedelta(days=days)
+    start, end = to_birthday_md(today), to_birthday_md(end_date)
+    if end == 228 and not calendar.isleap(end_date.year):
+        end = 229
+    if start <= end:
+        return [(start, end)]
+    return [(start, 1231), (101, end)]
+
+
+async def get_contacts(skip: int, limit: int, user: User, db: AsyncSession, after_id: int | None = None,
+                       fields: Optional[Tuple[str, ...]] = None, version: Optional[str] = None) -> List[dict]:
     """
     Retrieves a list of contacts for a specific user with specified pagination parameters.
 
+    Contacts are ordered by ID. When ``after_id`` is given the page starts right after that
+    contact (keyset pagination over the ``(user_id, id)`` index) and ``skip`` is ignored.
+
     :param skip: The number of contacts to skip.
     :type skip: int
     :param limit: The maximum number of contacts to return.
@@ -23,14 +101,56 @@ async def get_contacts(skip: int, limit: int, user: User, db: Session) -> List[C
     :param user: The user to retrieve contacts for.
     :type user: User
     :param db: The database session.
-    :type db: Session
-    :return: A list of contacts.
-    :rtype: List[Contact]
+    :type db: AsyncSession
+    :param after_id: The ID of the last contact of the previous page.
+    :type after_id: int | None
+    :param fields: The fields to select, or None for all of :data:`RESPONSE_COLUMNS`.
+    :type fields: Optional[Tuple[str, ...]]
+    :param version: The contacts version the response is tagged with, or None to resolve it.
+    :type version: Optional[str]
+    :return: A list of contacts, as rows of the selected columns.
+    :rtype: List[dict]
     """
-    return db.query(Contact).filter(Contact.user_id == user.id).offset(skip).limit(limit).all()
+    stmt = select(*response_columns(fields)).where(Contact.user_id == user.id, Contact.deleted_at.is_(None)).order_by(Contact.id).limit(limit)
+    if after_id is not None:
+        stmt = stmt.where(Contact.id > after_id)
+    else:
+        stmt = stmt.offset(skip)
+
+    async def load():
+        return await _fetch_rows(stmt, db)
+
+    key = ("list", limit, f"after={after_id}" if after_id is not None else skip, ",".join(fields or ()))
+    return await contacts_cache.get_or_load(user.id, key, load, version)
 
 
-async def get_contact(contact_id: int, user: User, db: Session) -> Contact:
+async def stream_contacts(user: User, engine: AsyncEngine, batch_size: int = 500) -> AsyncIterator[Sequence[Row]]:
+    """
+    Streams all contacts of a user from a server-side cursor, one batch of rows at a time.
+
+    The rows are fetched on a dedicated connection so that the stream can outlive the request
+    session. Only the exported columns are selected, no ORM objects are built.
+
+    :param user: The user to stream the contacts for.
+    :type user: User
+    :param engine: The engine to open the connection on.
+    :type engine: AsyncEngine
+    :param batch_size: The number of rows fetched per round trip.
+    :type batch_size: int
+    :return: Batches of rows with the id, first_name, last_name, email, phone and birthday_date columns.
+    :rtype: AsyncIterator[Sequence[Row]]
+    """
+    stmt = select(Contact.id, Contact.first_name, Contact.last_name, Contact.email, Contact.phone, Contact.birthday_date)\
+        .where(Contact.user_id == user.id, Contact.deleted_at.is_(None)).order_by(Contact.id)\
+        .execution_options(yield_per=batch_size)
+    async with engine.connect() as conn:
+        result = await conn.stream(stmt)
+        async for rows in result.partitions():
+            yield rows
+
+
+async def get_contact(contact_id: int, user: User, db: AsyncSession, fields: Optional[Tuple[str, ...]] = None,
+                      version: Optional[str] = None) -> dict | None:
     """
     Retrieves a single contact with the specified ID for a specific user.
 
@@ -39,14 +159,45 @@ async def get_contact(contact_id: int, user: User, db: Session) -> Contact:
     :param user: The user to retrieve the contact for.
     :type user: User
     :param db: The database session.
-    :type db: Session
-    :return: The contact with the specified ID, or None if it does not exist.
-    :rtype: Note | None
+    :type db: AsyncSession
+    :param fields: The fields to select, or None for all of :data:`RESPONSE_COLUMNS`.
+    :type fields: Optional[Tuple[str, ...]]
+    :param version: The contacts version the response is tagged with, or None to resolve it.
+    :type version: Optional[str]
+    :return: The contact with the specified ID as a row of the selected columns, or None if it does not exist.
+    :rtype: dict | None
+    """
+    stmt = select(*response_columns(fields))\
+        .where(and_(Contact.id == contact_id, Contact.user_id == user.id, Contact.deleted_at.is_(None)))
+
+    async def load():
+        contact = await db.execute(stmt)
+        row = contact.mappings().one_or_none()
+        return None if row is None else dict(row)
+
+    return await contacts_cache.get_or_load(user.id, ("contact", contact_id, ",".join(fields or ())), load, version)
+
+
+def _contact_values(body: ContactModel) -> dict:
     """
-    return db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
+    Maps the contact data to column values, including the derived ``birthday_md``.
+
+    :param body: The data for the contact.
+    :type body: ContactModel
+    :return: The column values.
+    :rtype: dict
+    """
+    return {
+        "first_name": body.first_name,
+        "last_name": body.last_name,
+        "email": body.email,
+        "phone": body.phone,
+        "birthday_date": body.birthday_date,
+        "birthday_md": to_birthday_md(body.birthday_date),
+    }
 
 
-async def create_contact(body: ContactModel, user: User, db: Session) -> Contact:
+async def create_contact(body: ContactModel, user: User, db: AsyncSession) -> Contact:
     """
     Creates a new contact for a specific user.
 
@@ -55,18 +206,64 @@ async def create_contact(body: ContactModel, user: User, db: Session) -> Contact
     :param user: The user to create the contact for.
     :type user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The newly created contact.
     :rtype: Contact
     """
-    contact = Contact(first_name=body.first_name, last_name=body.last_name, email=body.email, phone=body.phone, birthday_date = body.birthday_date, user_id=user.id)
-    db.add(contact)
-    db.commit()
-    db.refresh(contact)
+    stmt = insert(Contact).values(**_contact_values(body), user_id=user.id).returning(Contact)
+    contact = await db.execute(stmt)
+    contact = contact.scalar_one()
+    await db.commit()
+    await contacts_cache.invalidate(user.id)
+    return contact
+
+
+async def create_contacts(bodies: List[ContactModel], user: User, db: AsyncSession) -> int:
+    """
+    Creates a batch of contacts for a specific user with a single multi-row INSERT.
+
+    :param bodies: The data for the contacts to create.
+    :type bodies: List[ContactModel]
+    :param user: The user to create the contacts for.
+    :type user: User
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The number of contacts created.
+    :rtype: int
+    """
+    if not bodies:
+        return 0
+    await db.execute(insert(Contact), [dict(_contact_values(body), user_id=user.id) for body in bodies])
+    await db.commit()
+    await contacts_cache.invalidate(user.id)
+    return len(bodies)
+
+
+async def _update_returning(contact_id: int, user: User, db: AsyncSession, **values) -> Contact | None:
+    """
+    Updates a contact of a specific user with a single ``UPDATE ... RETURNING`` statement.
+
+    :param contact_id: The ID of the contact to update.
+    :type contact_id: int
+    :param user: The user the contact belongs to.
+    :type user: User
+    :param db: The database session.
+    :type db: AsyncSession
+    :param values: The column values to set.
+    :return: The updated contact, or None if it does not exist.
+    :rtype: Contact | None
+    """
+    stmt = update(Contact).where(and_(Contact.id == contact_id, Contact.user_id == user.id, Contact.deleted_at.is_(None)))\
+        .values(**values).returning(Contact)
+    contact = await db.execute(stmt.execution_options(synchronize_session=False))
+    contact = contact.scalar_one_or_none()
+    if contact:
+        await db.commit()
+        await contacts_cache.invalidate(user.id)
     return contact
 
 
-async def update_contact(contact_id: int, body: ContactModel, user: User, db: Session) -> Contact | None:
+async def update_contact(contact_id: int, body: ContactModel, user: User, db: AsyncSession) -> Contact | None:
     """
     Updates a single contact with the specified ID for a specific user.
 
@@ -77,22 +274,14 @@ async def update_contact(contact_id: int, body: ContactModel, user: User, db: Se
     :param user: The user to update the contact for.
     :type user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The updated contact, or None if it does not exist.
     :rtype: Note | None
     """
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
-    if contact:
-        contact.first_name = body.first_name
-        contact.last_name = body.last_name
-        contact.email = body.email
-        contact.phone = body.phone
-        contact.birthday_date = body.birthday_date  
-        db.commit()
-    return contact
+    return await _update_returning(contact_id, user, db, **_contact_values(body))
 
 
-async def update_birthday(contact_id: int, birthday_date: datetime, user: User, db: Session) -> Contact | None:
+async def update_birthday(contact_id: int, birthday_date: datetime, user: User, db: AsyncSession) -> Contact | None:
     """
     Updates a birthday of single contact with the specified ID for a specific user.
 
@@ -103,69 +292,176 @@ async def update_birthday(contact_id: int, birthday_date: datetime, user: User,
     :param user: The user to update the birthday for.
     :type user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The updated contact, or None if it does not exist.
     :rtype: Note | None
     """
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
-    if contact:
-        contact.birthday_date = birthday_date
-        db.commit()
-        db.refresh(contact)
-    return contact
+    return await _update_returning(contact_id, user, db, birthday_date=birthday_date,
+                                   birthday_md=to_birthday_md(birthday_date))
 
 
-async def remove_contact(contact_id: int, user: User, db: Session)  -> Contact | None:
+async def remove_contact(contact_id: int, user: User, db: AsyncSession)  -> Contact | None:
     """
     Removes a single contact with the specified ID for a specific user.
 
+    The row is kept as a tombstone (``deleted_at`` set) so that delta sync can report the deletion.
+
     :param contact_id: The ID of the contact to remove.
     :type contact_id: int
     :param user: The user to remove the contact for.
     :type user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The removed contact, or None if it does not exist.
     :rtype: Note | None
     """
-    contact = db.query(Contact).filter(and_(Contact.id == contact_id, Contact.user_id == user.id)).first()
-    if contact:
-        db.delete(contact)
-        db.commit()
-    return contact
+    now = utcnow()
+    return await _update_returning(contact_id, user, db, deleted_at=now, updated_at=now)
+
+
+contacts_fts = table("contacts_fts", column("rowid"))
+
+# FTS5 trigram tokens are three characters long, shorter queries cannot use the index.
+FTS_MIN_QUERY_LENGTH = 3
 
 
-async def search_contacts(query: str, user: User, db: Session) -> List[Contact]:
+def _like_pattern(query: str) -> str:
+    """
+    Builds a ``%query%`` pattern with LIKE wildcards in the query escaped by ``/``.
+
+    :param query: The raw search string.
+    :type query: str
+    :return: The LIKE pattern.
+    :rtype: str
     """
-    Search contacts with the specified string.
+    escaped = query.replace("/", "//").replace("%", "/%").replace("_", "/_")
+    return f"%{escaped}%"
+
+
+def _search_statement(query: str, user: User, dialect: str, fields: Optional[Tuple[str, ...]] = None):
+    """
+    Builds the ranked search statement for the given database dialect.
+
+    Postgres matches with ``ILIKE`` served by the pg_trgm GIN indexes and ranks by trigram
+    word similarity. SQLite matches against the FTS5 trigram table and ranks by ``bm25``.
+    Any other case falls back to a plain ``LIKE`` filter ordered by ID.
+
+    :param query: The search string.
+    :type query: str
+    :param user: The user whose contacts are searched.
+    :type user: User
+    :param dialect: The name of the database dialect.
+    :type dialect: str
+    :param fields: The fields to select, or None for all of :data:`RESPONSE_COLUMNS`.
+    :type fields: Optional[Tuple[str, ...]]
+    :return: The select statement.
+    :rtype: Select
+    """
+    stmt = select(*response_columns(fields)).select_from(Contact).where(Contact.user_id == user.id, Contact.deleted_at.is_(None))
+    if dialect == "sqlite" and len(query) >= FTS_MIN_QUERY_LENGTH:
+        phrase = '"' + query.replace('"', '""') + '"'
+        fts = literal_column("contacts_fts")
+        return stmt.join(contacts_fts, contacts_fts.c.rowid == Contact.id) \
+                   .where(fts.op("MATCH")(phrase)).order_by(func.bm25(fts), Contact.id)
+
+    columns = (Contact.first_name, Contact.last_name, Contact.email)
+    pattern = _like_pattern(query)
+    stmt = stmt.where(or_(*(col.ilike(pattern, escape="/") for col in columns)))
+    if dialect == "postgresql":
+        rank = func.greatest(*(func.word_similarity(query, col) for col in columns))
+        return stmt.order_by(rank.desc(), Contact.id)
+    return stmt.order_by(Contact.id)
+
+
+async def search_contacts(query: str, user: User, db: AsyncSession, limit: int = 50, offset: int = 0,
+                          fields: Optional[Tuple[str, ...]] = None) -> List[dict]:
+    """
+    Search contacts whose first name, last name or email contain the specified string.
+
+    Results are ranked by relevance, best match first.
 
     :param query: string query.
     :type query: str
-    :param user: The user to remove the contact for.
+    :param user: The user to search the contacts for.
     :type user: User
     :param db: The database session.
-    :type db: Session
-    :return: The contacts, or None if it does not exist.
-    :rtype: Note | None
+    :type db: AsyncSession
+    :param limit: The maximum number of contacts to return.
+    :type limit: int
+    :param offset: The number of ranked matches to skip.
+    :type offset: int
+    :param fields: The fields to select, or None for all of :data:`RESPONSE_COLUMNS`.
+    :type fields: Optional[Tuple[str, ...]]
+    :return: The matching contacts, as rows of the selected columns.
+    :rtype: List[dict]
     """
-    return db.query(Contact).filter(and_(Contact.user_id == user.id, ((Contact.first_name.ilike(f"%{query}%")) | (Contact.last_name.ilike(f"%{query}%")) | (Contact.email.ilike(f"%{query}%"))))
-    ).all()
+    stmt = _search_statement(query, user, db.get_bind().dialect.name, fields).offset(offset).limit(limit)
+    return await _fetch_rows(stmt, db)
 
 
-async def get_upcoming_birthdays(user: User, db: Session) -> List[Contact]:
+async def get_upcoming_birthdays(user: User, db: AsyncSession, days: int = 7,
+                                 fields: Optional[Tuple[str, ...]] = None) -> List[dict]:
     """
-    Return contacts whose birthday are in a week.
+    Return contacts whose birthday falls within the next ``days`` days, today included.
 
-    :param user: The user to update the birthday for.
+    The window is matched against the indexed ``birthday_md`` column, nearest birthday first.
+
+    :param user: The user to return the contacts for.
     :type user: User
     :param db: The database session.
-    :type db: Session
-    :return: The contacts whose birthday are in a week.
-    :rtype: Note | None
+    :type db: AsyncSession
+    :param days: The size of the window in days (default is a week).
+    :type days: int
+    :param fields: The fields to select, or None for all of :data:`RESPONSE_COLUMNS`.
+    :type fields: Optional[Tuple[str, ...]]
+    :return: The contacts whose birthday is in the window, as rows of the selected columns.
+    :rtype: List[dict]
     """
     today = datetime.now().date()
-    days_ahead = [(today + timedelta(days=i)).strftime('%m-%d') for i in range(8)]
+    ranges = birthday_md_ranges(today, days)
+    window = or_(*(Contact.birthday_md.between(start, end) for start, end in ranges))
+    # After the new year wrap, December birthdays come before January ones.
+    wrap_order = case((Contact.birthday_md >= ranges[0][0], 0), else_=1)
+
+    stmt = select(*response_columns(fields)).where(and_(Contact.user_id == user.id, Contact.deleted_at.is_(None), window)).order_by(wrap_order, Contact.birthday_md, Contact.id)
+
+    async def load():
+        return await _fetch_rows(stmt, db)
+
+    return await contacts_cache.get_or_load(user.id, ("birthdays", today.isoformat(), days, ",".join(fields or ())), load)
+
+
+async def get_changes(user: User, db: AsyncSession, since: tuple[datetime, int | None] | None, until: datetime,
+                      limit: int) -> List[Contact]:
+    """
+    Returns the contacts of a user changed in the ``(since, until]`` interval, tombstones included.
 
-    contacts = db.query(Contact).filter(and_(Contact.user_id == user.id, (func.to_char(Contact.birthday_date, 'MM-DD').in_(days_ahead)))
-    ).all()
-    return contacts
\ No newline at end of file
+    Changes are ordered by ``(updated_at, id)``. ``since`` is the position of the last change
+    already seen: with an ID, changes at exactly that time and a higher ID are included; without
+    one, only strictly later changes are. Without ``since`` every live contact is returned.
+
+    :param user: The user to return the changes for.
+    :type user: User
+    :param db: The database session.
+    :type db: AsyncSession
+    :param since: The ``(updated_at, id)`` position to resume after, or None for a full sync.
+    :type since: tuple[datetime, int | None] | None
+    :param until: The upper bound of ``updated_at``.
+    :type until: datetime
+    :param limit: The maximum number of changes to return.
+    :type limit: int
+    :return: The changed contacts, deleted ones have ``deleted_at`` set.
+    :rtype: List[Contact]
+    """
+    stmt = select(Contact).where(Contact.user_id == user.id, Contact.updated_at <= until)
+    if since is None:
+        stmt = stmt.where(Contact.deleted_at.is_(None))
+    else:
+        updated_at, last_id = since
+        if last_id is None:
+            stmt = stmt.where(Contact.updated_at > updated_at)
+        else:
+            stmt = stmt.where(or_(Contact.updated_at > updated_at, and_(Contact.updated_at == updated_at, Contact.id > last_id)))
+    stmt = stmt.order_by(Contact.updated_at, Contact.id).limit(limit)
+    contacts = await db.execute(stmt)
+    return contacts.scalars().all()
@@ -1,32 +1,34 @@
 from libgravatar import Gravatar
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import User
 from src.schemas import UserModel
 
 
-async def get_user_by_email(email: str, db: Session) -> User:
+async def get_user_by_email(email: str, db: AsyncSession) -> User:
     """
     Retrieves a user by their email address.
 
     :param email: The email address of the user to retrieve.
     :type email: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The user with the specified email, or None if the user does not exist.
     :rtype: User
     """
-    return db.query(User).filter(User.email == email).first()
+    user = await db.execute(select(User).where(User.email == email))
+    return user.scalar_one_or_none()
 
 
-async def create_user(body: UserModel, db: Session) -> User:
+async def create_user(body: UserModel, db: AsyncSession) -> User:
     """
     Creates a new user in the database.
 
     :param body: The data for the user to create.
     :type body: UserModel
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The newly created user.
     :rtype: User
     """
@@ -38,43 +40,43 @@ async def create_user(body: UserModel, db: Session) -> User:
         print(e)
     new_user = User(**body.dict(), avatar=avatar)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
     return new_user
 
 
-async def update_token(user: User, token: str | None, db: Session) -> None:
+async def update_password(user: User, hashed_password: str, db: AsyncSession) -> None:
     """
-    Updates the refresh token for a user.
+    Replaces the stored password hash of a user.
 
-    :param user: The user to update the token for.
+    :param user: The user to update the password for.
     :type user: User
-    :param token: The new refresh token, or None to remove the token.
-    :type token: str | None
+    :param hashed_password: The new password hash.
+    :type hashed_password: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: None
     """
-    user.refresh_token = token
-    db.commit()
+    user.password = hashed_password
+    await db.commit()
 
 
-async def confirmed_email(email: str, db: Session) -> None:
+async def confirmed_email(email: str, db: AsyncSession) -> None:
     """
     Confirms the user's email address.
 
     :param email: The email address to confirm.
     :type email: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: None
     """
     user = await get_user_by_email(email, db)
     user.confirmed = True
-    db.commit()
+    await db.commit()
 
 
-async def update_avatar(email, url: str, db: Session) -> User:
+async def update_avatar(email, url: str, db: AsyncSession) -> User:
     """
     Updates the avatar URL for a user.
 
@@ -83,11 +85,11 @@ async def update_avatar(email, url: str, db: Session) -> User:
     :param url: The new avatar URL.
     :type url: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The updated user with the new avatar URL.
     :rtype: User
     """
     user = await get_user_by_email(email, db)
     user.avatar = url
-    db.commit()
+    await db.commit()
     return user
\ No newline at end of file
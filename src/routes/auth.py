@@ -1,47 +1,85 @@
+import logging
 from typing import List
 
 from fastapi import APIRouter, HTTPException, Depends, status, Security, BackgroundTasks, Request
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
-from sqlalchemy.orm import Session
+from redis.exceptions import RedisError
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
 from src.schemas import UserModel, UserResponse, TokenModel, RequestEmail
 from src.repository import users as repository_users
 from src.services.auth import auth_service
 from src.services.email import send_email
+from src.services.refresh_tokens import refresh_tokens
+from src.services.rate_limit import RateLimiter
 
-router = APIRouter(prefix='/auth', tags=["auth"])
+router = APIRouter(prefix='/auth', tags=["auth"], dependencies=[Depends(RateLimiter("auth"))])
 security = HTTPBearer()
+logger = logging.getLogger(__name__)
 
 
 @router.get('/refresh_token', response_model=TokenModel)
-async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security), db: Session = Depends(get_db)):
+async def refresh_token(credentials: HTTPAuthorizationCredentials = Security(security)):
     """
     Refreshes the access token using a valid refresh token.
 
+    The refresh token is rotated: it cannot be used again, and presenting it a second time
+    revokes every refresh token descending from the same login.
+
     :param credentials: The authorization credentials containing the refresh token.
     :type credentials: HTTPAuthorizationCredentials
-    :param db: The database session.
-    :type db: Session
     :return: A new access token and refresh token.
     :rtype: TokenModel
-    :raises HTTPException: If the refresh token is invalid or expired.
+    :raises HTTPException: If the refresh token is invalid, expired or already used.
     """
-    token = credentials.credentials
-    email = await auth_service.decode_refresh_token(token)
-    user = await repository_users.get_user_by_email(email, db)
-    if user.refresh_token != token:
-        await repository_users.update_token(user, None, db)
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+    return await refresh_tokens.rotate(credentials.credentials)
+
+
+@router.post('/logout', status_code=status.HTTP_204_NO_CONTENT)
+async def logout(token: str = Depends(auth_service.oauth2_scheme)):
+    """
+    Revokes the access token of the request and the refresh tokens issued with it.
 
-    access_token = await auth_service.create_access_token(data={"sub": email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": email})
-    await repository_users.update_token(user, refresh_token, db)
-    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+    :param token: The access token provided by the user.
+    :type token: str
+    :return: None
+    :raises HTTPException: If the token is invalid, or if Redis is unavailable.
+    """
+    claims = await auth_service.decode_access_claims(token)
+    if "jti" not in claims:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token cannot be revoked",
+                            headers={"WWW-Authenticate": "Bearer"})
+    try:
+        await auth_service.revocations.revoke(claims["jti"], claims["exp"])
+    except RedisError as err:
+        logger.error("Access token revocation failed: %s", err)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Token store unavailable")
+    if claims.get("fam"):
+        await refresh_tokens.revoke_family(claims["fam"])
+
+
+@router.post('/logout_all', status_code=status.HTTP_204_NO_CONTENT)
+async def logout_all(token: str = Depends(auth_service.oauth2_scheme)):
+    """
+    Revokes every access and refresh token issued to the user until now, signing out all of
+    their sessions.
+
+    :param token: The access token provided by the user.
+    :type token: str
+    :return: None
+    :raises HTTPException: If the token is invalid, or if Redis is unavailable.
+    """
+    claims = await auth_service.decode_access_claims(token)
+    try:
+        await auth_service.revocations.revoke_user(claims["sub"])
+    except RedisError as err:
+        logger.error("User token revocation failed: %s", err)
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Token store unavailable")
 
 
 @router.post("/signup", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
-async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Request, db: Session = Depends(get_db)):
+async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Request, db: AsyncSession = Depends(get_db)):
     """
     Registers a new user in the system.
 
@@ -52,7 +90,7 @@ async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Re
     :param request: The incoming HTTP request to extract the base URL.
     :type request: Request
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The newly created user and a message to check email for confirmation.
     :rtype: dict
     :raises HTTPException: If the user already exists.
@@ -60,21 +98,21 @@ async def signup(body: UserModel, background_tasks: BackgroundTasks, request: Re
     exist_user = await repository_users.get_user_by_email(body.email, db)
     if exist_user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Account already exists")
-    body.password = auth_service.get_password_hash(body.password)
+    body.password = await auth_service.get_password_hash_async(body.password)
     new_user = await repository_users.create_user(body, db)
     background_tasks.add_task(send_email, new_user.email, new_user.username, request.base_url)
     return {"user": new_user, "detail": "User successfully created. Check your email for confirmation."}
 
 
 @router.post("/login", response_model=TokenModel)
-async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login(body: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_db)):
     """
     Authenticates a user and generates access and refresh tokens.
 
     :param body: The form data for user login (username and password).
     :type body: OAuth2PasswordRequestForm
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: A new access token and refresh token.
     :rtype: TokenModel
     :raises HTTPException: If the email or password is invalid, or if the email is not confirmed.
@@ -84,24 +122,25 @@ async def login(body: OAuth2PasswordRequestForm = Depends(), db: Session = Depen
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email")
     if not user.confirmed:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Email not confirmed")
-    if not auth_service.verify_password(body.password, user.password):
+    verified, new_hash = await auth_service.verify_and_update_password(body.password, user.password)
+    if not verified:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid password")
+    if new_hash is not None:
+        await repository_users.update_password(user, new_hash, db)
+        await auth_service.invalidate_user(user.email)
     # Generate JWT
-    access_token = await auth_service.create_access_token(data={"sub": user.email})
-    refresh_token = await auth_service.create_refresh_token(data={"sub": user.email})
-    await repository_users.update_token(user, refresh_token, db)
-    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+    return await refresh_tokens.issue(user.email)
 
 
 @router.get('/confirmed_email/{token}')
-async def confirmed_email(token: str, db: Session = Depends(get_db)):
+async def confirmed_email(token: str, db: AsyncSession = Depends(get_db)):
     """
     Confirms the user's email address using a token.
 
     :param token: The confirmation token sent via email.
     :type token: str
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: A message indicating the confirmation status of the email.
     :rtype: dict
     :raises HTTPException: If the token is invalid or the user is not found.
@@ -113,12 +152,13 @@ async def confirmed_email(token: str, db: Session = Depends(get_db)):
     if user.confirmed:
         return {"message": "Your email is already confirmed"}
     await repository_users.confirmed_email(email, db)
+    await auth_service.invalidate_user(email)
     return {"message": "Email confirmed"}
 
 
 @router.post('/request_email')
 async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, request: Request,
-                        db: Session = Depends(get_db)):
+                        db: AsyncSession = Depends(get_db)):
     """
     Sends a confirmation email to the user if their email is not yet confirmed.
 
@@ -129,7 +169,7 @@ async def request_email(body: RequestEmail, background_tasks: BackgroundTasks, r
     :param request: The incoming HTTP request to extract the base URL.
     :type request: Request
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: A message indicating that the confirmation email has been sent.
     :rtype: dict
     """
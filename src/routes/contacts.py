@@ -1,70 +1,257 @@
-from typing import List
+from typing import List, Optional, Tuple
 
-from fastapi import APIRouter, HTTPException, Depends, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, HTTPException, Depends, status, Response, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
-from src.database.models import User
-from src.schemas import ContactModel, ContactResponse
+from src.database.models import User, utcnow
+from src.schemas import ContactModel, ContactResponse, ContactImportResponse, ContactChanges, CONTACT_FIELDS, contact_adapter
 from src.repository import contacts as repository_contacts
 from src.services.auth import auth_service
-from fastapi_limiter.depends import RateLimiter
+from src.conf.config import settings
+from src.services.pagination import encode_cursor, decode_cursor
+from src.services import contacts_io
+from src.services.cache import contacts_cache
+from src.services.etags import etag_matches, make_etag
+from src.services.rate_limit import UserRateLimiter
+from src.services.profiling import QueryBudget
 
-from datetime import datetime
+from datetime import datetime, timedelta
 
-router = APIRouter(prefix='/contacts', tags=["contacts"])
+# Every route loads the user and runs a single statement, except the batched import.
+router = APIRouter(prefix='/contacts', tags=["contacts"],
+                   dependencies=[Depends(UserRateLimiter("contacts")), Depends(QueryBudget(2))])
 
 
-@router.get("/", response_model=List[ContactResponse], description='No more than 10 requests per minute', dependencies=[Depends(RateLimiter(times=10, seconds=60))])
-async def read_contacts(skip: int = 0, limit: int = 100, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+def contact_fields(fields: Optional[str] = Query(
+        None, description="Comma separated fields to return, e.g. first_name,last_name. The id is always returned.")
+) -> Optional[Tuple[str, ...]]:
+    """
+    Parses the ``fields`` query parameter of the contact read routes into a sparse fieldset.
+
+    :param fields: The comma separated field names of ContactResponse.
+    :type fields: Optional[str]
+    :return: The requested fields and the id in ContactResponse order, or None for all fields.
+    :rtype: Optional[Tuple[str, ...]]
+    :raises HTTPException: If a field is unknown.
+    """
+    if fields is None:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()} | {"id"}
+    unknown = requested.difference(CONTACT_FIELDS)
+    if unknown:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    if len(requested) == len(CONTACT_FIELDS):
+        return None
+    return tuple(name for name in CONTACT_FIELDS if name in requested)
+
+
+def rows_response(rows, headers: Optional[dict] = None, fields: Optional[Tuple[str, ...]] = None) -> Response:
+    """
+    Encodes contact rows straight to JSON, bypassing the response model validation of FastAPI.
+
+    Without ``fields`` the body is byte for byte what ``response_model=ContactResponse`` would
+    produce; the response model is kept on the routes for the OpenAPI schema.
+
+    :param rows: A row or a list of rows, as returned by the read queries of the repository.
+    :param headers: Extra response headers.
+    :type headers: Optional[dict]
+    :param fields: The sparse fieldset the rows were selected with.
+    :type fields: Optional[Tuple[str, ...]]
+    :return: The encoded response.
+    :rtype: Response
+    """
+    adapter = contact_adapter(fields, many=isinstance(rows, list))
+    return Response(adapter.dump_json(rows), media_type="application/json", headers=headers)
+
+
+@router.get("/", response_model=List[ContactResponse], description='No more than 10 requests per minute', dependencies=[Depends(UserRateLimiter("contacts:list"))])
+async def read_contacts(request: Request, skip: int = 0, limit: int = 100, cursor: Optional[str] = None,
+                        fields: Optional[Tuple[str, ...]] = Depends(contact_fields), db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     Retrieves a list of contacts for the authenticated user with pagination options.
 
-    :param skip: The number of contacts to skip (default is 0).
+    A full page carries an ``X-Next-Cursor`` header; passing its value back as ``cursor``
+    fetches the next page with an index seek instead of an offset scan.
+
+    The response carries an ``ETag``. A request whose ``If-None-Match`` matches it is answered
+    with ``304 Not Modified`` without loading any contact.
+
+    :param request: The incoming HTTP request, used for conditional GET.
+    :type request: Request
+    :param skip: The number of contacts to skip (default is 0). Ignored when ``cursor`` is given.
     :type skip: int
     :param limit: The maximum number of contacts to return (default is 100).
     :type limit: int
+    :param cursor: The opaque cursor returned with the previous page.
+    :type cursor: Optional[str]
+    :param fields: The fields to return, or None for all of them.
+    :type fields: Optional[Tuple[str, ...]]
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The authenticated user.
     :type current_user: User
     :return: A list of contacts for the authenticated user.
     :rtype: List[ContactResponse]
+    :raises HTTPException: If the cursor is invalid.
+    """
+    after_id = None
+    if cursor is not None:
+        try:
+            after_id = int(decode_cursor(cursor))
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    version = await contacts_cache.version(current_user.id)
+    etag = make_etag(version, current_user.id, request.url.path, request.url.query) if version else None
+    if etag and etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    contacts = await repository_contacts.get_contacts(skip, limit, current_user, db, after_id=after_id, fields=fields,
+                                                      version=version)
+    headers = {}
+    if etag:
+        headers["ETag"] = etag
+    if contacts and len(contacts) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(contacts[-1]["id"])
+    return rows_response(contacts, headers, fields)
+
+
+@router.get("/birthdays/", response_model=List[ContactResponse])
+@router.get("/birthdays", response_model=List[ContactResponse], include_in_schema=False)
+async def get_birthdays(days: int = Query(7, ge=0, le=366), fields: Optional[Tuple[str, ...]] = Depends(contact_fields), db: AsyncSession = Depends(get_db),
+                        current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Retrieves a list of contacts whose birthdays are within the next days for the authenticated user.
+
+    :param days: The number of days to look ahead (default is 7).
+    :type days: int
+    :param fields: The fields to return, or None for all of them.
+    :type fields: Optional[Tuple[str, ...]]
+    :param db: The database session.
+    :type db: AsyncSession
+    :param current_user: The authenticated user.
+    :type current_user: User
+    :return: A list of contacts with upcoming birthdays.
+    :rtype: List[ContactResponse]
+    """
+    contacts = await repository_contacts.get_upcoming_birthdays(current_user, db, days=days, fields=fields)
+    return rows_response(contacts, fields=fields)
+
+
+@router.get("/export", response_class=StreamingResponse)
+async def export_contacts(format: str = Query("ndjson", pattern="^(ndjson|csv|vcf)$"), db: AsyncSession = Depends(get_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Streams the whole address book of the authenticated user as NDJSON, CSV or vCard.
+
+    Rows are read from a server-side cursor and sent as they arrive, so memory use does not
+    depend on the number of contacts.
+
+    :param format: ``ndjson`` (default), ``csv`` or ``vcf``.
+    :type format: str
+    :param db: The database session, whose engine opens the streaming connection.
+    :type db: AsyncSession
+    :param current_user: The authenticated user.
+    :type current_user: User
+    :return: The streamed export.
+    :rtype: StreamingResponse
+    """
+    media_type, extension = contacts_io.EXPORT_FORMATS[format]
+    batches = repository_contacts.stream_contacts(current_user, db.bind, settings.export_batch_size)
+    return StreamingResponse(contacts_io.export_contacts(batches, format), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="contacts.{extension}"'})
+
+
+@router.get("/changes", response_model=ContactChanges)
+async def read_changes(since: Optional[str] = None, limit: int = Query(settings.sync_page_size, ge=1, le=1000),
+                       db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
-    contacts = await repository_contacts.get_contacts(skip, limit, current_user, db)
-    return contacts
+    Returns the contacts created, updated or deleted since a sync token, for incremental sync.
+
+    Without ``since`` the live contacts are returned as a full snapshot. Changes are returned in
+    ``(updated_at, id)`` order up to ``sync_settle_seconds`` ago, so that writes still being
+    committed are picked up by a later call instead of being skipped. The client stores
+    ``next_token`` and calls again with it, immediately while ``has_more`` is true.
+
+    :param since: The ``next_token`` of the previous call.
+    :type since: Optional[str]
+    :param limit: The maximum number of changes to return.
+    :type limit: int
+    :param db: The database session.
+    :type db: AsyncSession
+    :param current_user: The authenticated user.
+    :type current_user: User
+    :return: The upserted contacts, the IDs of the deleted ones and the next sync token.
+    :rtype: ContactChanges
+    :raises HTTPException: If the sync token is invalid.
+    """
+    position = None
+    if since is not None:
+        try:
+            updated_at, last_id = decode_cursor(since)
+            position = (datetime.fromisoformat(updated_at), None if last_id is None else int(last_id))
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid sync token")
+    until = utcnow() - timedelta(seconds=settings.sync_settle_seconds)
+    if position is not None and position[0] > until:
+        until = position[0]
+    contacts = await repository_contacts.get_changes(current_user, db, position, until, limit)
+    has_more = len(contacts) == limit
+    if has_more:
+        next_token = encode_cursor([contacts[-1].updated_at.isoformat(), contacts[-1].id])
+    else:
+        next_token = encode_cursor([until.isoformat(), None])
+    return {
+        "upserts": [contact for contact in contacts if contact.deleted_at is None],
+        "deletions": [contact.id for contact in contacts if contact.deleted_at is not None],
+        "next_token": next_token,
+        "has_more": has_more,
+    }
 
 
 @router.get("/{contact_id}", response_model=ContactResponse)
-async def read_contact(contact_id: int, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+async def read_contact(contact_id: int, request: Request, fields: Optional[Tuple[str, ...]] = Depends(contact_fields), db: AsyncSession = Depends(get_db),
+                       current_user: User = Depends(auth_service.get_current_user)):
     """
     Retrieves a specific contact by ID for the authenticated user.
 
+    The response carries an ``ETag``. A request whose ``If-None-Match`` matches it is answered
+    with ``304 Not Modified`` without loading the contact.
+
     :param contact_id: The ID of the contact to retrieve.
     :type contact_id: int
+    :param request: The incoming HTTP request, used for conditional GET.
+    :type request: Request
+    :param fields: The fields to return, or None for all of them.
+    :type fields: Optional[Tuple[str, ...]]
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The authenticated user.
     :type current_user: User
     :return: The contact with the specified ID.
     :rtype: ContactResponse
     :raises HTTPException: If the contact is not found.
     """
-    contact = await repository_contacts.get_contact(contact_id, current_user, db)
+    version = await contacts_cache.version(current_user.id)
+    etag = make_etag(version, current_user.id, request.url.path, request.url.query) if version else None
+    if etag and etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    contact = await repository_contacts.get_contact(contact_id, current_user, db, fields=fields, version=version)
     if contact is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
-    return contact
+    return rows_response(contact, {"ETag": etag} if etag else None, fields)
 
 
 @router.post("/", response_model=ContactResponse, status_code=status.HTTP_201_CREATED)
-async def create_contact(body: ContactModel, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+async def create_contact(body: ContactModel, db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     Creates a new contact for the authenticated user.
 
     :param body: The data for the new contact.
     :type body: ContactModel
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The authenticated user.
     :type current_user: User
     :return: The newly created contact.
@@ -73,8 +260,39 @@ async def create_contact(body: ContactModel, db: Session = Depends(get_db), curr
     return await repository_contacts.create_contact(body, current_user, db)
 
 
+@router.post("/import", response_model=ContactImportResponse, dependencies=[Depends(QueryBudget(None))])
+async def import_contacts(request: Request, format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+                          db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+    """
+    Imports contacts for the authenticated user from a CSV or NDJSON request body.
+
+    The body is parsed while it is streamed and inserted in batches. CSV uploads need a
+    header line with the ``ContactModel`` field names. Invalid rows are skipped and reported
+    with their line number.
+
+    :param request: The incoming HTTP request carrying the upload as its body.
+    :type request: Request
+    :param format: ``csv`` or ``ndjson``; detected from the Content-Type header when omitted.
+    :type format: Optional[str]
+    :param db: The database session.
+    :type db: AsyncSession
+    :param current_user: The authenticated user.
+    :type current_user: User
+    :return: The number of imported and failed rows with the per-row errors.
+    :rtype: ContactImportResponse
+    :raises HTTPException: If the format is not supported or the body is not valid UTF-8.
+    """
+    fmt = format or contacts_io.detect_format(request.headers.get("content-type"))
+    if fmt is None:
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Upload CSV or NDJSON")
+    try:
+        return await contacts_io.import_contacts(request.stream(), fmt, current_user, db)
+    except UnicodeDecodeError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Upload must be UTF-8 encoded")
+
+
 @router.put("/{contact_id}", response_model=ContactResponse)
-async def update_contact(body: ContactModel, contact_id: int, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+async def update_contact(body: ContactModel, contact_id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     Updates a contact by ID for the authenticated user.
 
@@ -83,7 +301,7 @@ async def update_contact(body: ContactModel, contact_id: int, db: Session = Depe
     :param contact_id: The ID of the contact to update.
     :type contact_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The authenticated user.
     :type current_user: User
     :return: The updated contact.
@@ -97,14 +315,14 @@ async def update_contact(body: ContactModel, contact_id: int, db: Session = Depe
 
 
 @router.delete("/{contact_id}", response_model=ContactResponse)
-async def remove_contact(contact_id: int, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+async def remove_contact(contact_id: int, db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     Deletes a contact by ID for the authenticated user.
 
     :param contact_id: The ID of the contact to delete.
     :type contact_id: int
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The authenticated user.
     :type current_user: User
     :return: The deleted contact.
@@ -113,12 +331,12 @@ async def remove_contact(contact_id: int, db: Session = Depends(get_db), current
     """
     contact = await repository_contacts.remove_contact(contact_id, current_user, db)
     if contact is None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contacts not found")
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Contact not found")
     return contact
 
 
 @router.patch("/{contact_id}/birthday", response_model=ContactResponse)
-async def update_contact_birthday(contact_id: int, birthday_date: datetime, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+async def update_contact_birthday(contact_id: int, birthday_date: datetime, db: AsyncSession = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
     """
     Updates the birthday of a contact by ID for the authenticated user.
 
@@ -127,7 +345,7 @@ async def update_contact_birthday(contact_id: int, birthday_date: datetime, db:
     :param birthday_date: The new birthday date for the contact.
     :type birthday_date: datetime
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The authenticated user.
     :type current_user: User
     :return: The updated contact with the new birthday.
@@ -141,36 +359,42 @@ async def update_contact_birthday(contact_id: int, birthday_date: datetime, db:
 
 
 @router.get("/search/", response_model=List[ContactResponse])
-async def search_contacts(query: str, db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
+async def search_contacts(query: str = Query(min_length=1), limit: int = Query(50, ge=1, le=500),
+                          cursor: Optional[str] = None, fields: Optional[Tuple[str, ...]] = Depends(contact_fields),
+                          db: AsyncSession = Depends(get_db),
+                          current_user: User = Depends(auth_service.get_current_user)):
     """
     Searches contacts by a query string for the authenticated user.
 
+    Matches are ranked best first. A full page carries an ``X-Next-Cursor`` header to fetch
+    the following matches.
+
     :param query: The search query (can be part of the first name, last name, or email).
     :type query: str
+    :param limit: The maximum number of contacts to return (default is 50).
+    :type limit: int
+    :param cursor: The opaque cursor returned with the previous page.
+    :type cursor: Optional[str]
+    :param fields: The fields to return, or None for all of them.
+    :type fields: Optional[Tuple[str, ...]]
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :param current_user: The authenticated user.
     :type current_user: User
     :return: A list of contacts matching the search query.
     :rtype: List[ContactResponse]
+    :raises HTTPException: If the cursor is invalid.
     """
-    contacts = await repository_contacts.search_contacts(query, current_user, db)
-    return contacts
-
-
-@router.get("/birthdays/", response_model=List[ContactResponse])
-async def get_birthdays(db: Session = Depends(get_db), current_user: User = Depends(auth_service.get_current_user)):
-    """
-    Retrieves a list of contacts whose birthdays are within the next week for the authenticated user.
-
-    :param db: The database session.
-    :type db: Session
-    :param current_user: The authenticated user.
-    :type current_user: User
-    :return: A list of contacts with upcoming birthdays.
-    :rtype: List[ContactResponse]
-    """
-    contacts = await repository_contacts.get_upcoming_birthdays(current_user, db)
-    return contacts
-
-
+    offset = 0
+    if cursor is not None:
+        try:
+            offset = int(decode_cursor(cursor))
+        except (ValueError, TypeError):
+            offset = -1
+        if offset < 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+    contacts = await repository_contacts.search_contacts(query, current_user, db, limit=limit, offset=offset, fields=fields)
+    headers = {}
+    if len(contacts) == limit:
+        headers["X-Next-Cursor"] = encode_cursor(offset + limit)
+    return rows_response(contacts, headers, fields)
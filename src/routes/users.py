@@ -1,16 +1,15 @@
 from fastapi import APIRouter, Depends, status, UploadFile, File
-from sqlalchemy.orm import Session
-import cloudinary
-import cloudinary.uploader
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
 from src.database.models import User
 from src.repository import users as repository_users
 from src.services.auth import auth_service
-from src.conf.config import settings
 from src.schemas import UserDb
+from src.services.avatar import store_avatar
+from src.services.rate_limit import UserRateLimiter
 
-router = APIRouter(prefix="/users", tags=["users"])
+router = APIRouter(prefix="/users", tags=["users"], dependencies=[Depends(UserRateLimiter("users"))])
 
 
 @router.get("/me/", response_model=UserDb)
@@ -28,28 +27,26 @@ async def read_users_me(current_user: User = Depends(auth_service.get_current_us
 
 @router.patch('/avatar', response_model=UserDb)
 async def update_avatar_user(file: UploadFile = File(), current_user: User = Depends(auth_service.get_current_user),
-                             db: Session = Depends(get_db)):
+                             db: AsyncSession = Depends(get_db)):
     """
-    Updates the avatar of the authenticated user using Cloudinary.
+    Updates the avatar of the authenticated user.
+
+    The image is cropped and resized to 250x250 before it is stored. Uploading the current
+    avatar again changes nothing.
 
     :param file: The image file to upload as the avatar.
     :type file: UploadFile
     :param current_user: The authenticated user whose avatar is being updated.
     :type current_user: User
     :param db: The database session.
-    :type db: Session
+    :type db: AsyncSession
     :return: The updated user with the new avatar URL.
     :rtype: UserDb
+    :raises HTTPException: If the file is not an image or is too large.
     """
-    cloudinary.config(
-        cloud_name=settings.cloudinary_name,
-        api_key=settings.cloudinary_api_key,
-        api_secret=settings.cloudinary_api_secret,
-        secure=True
-    )
-
-    r = cloudinary.uploader.upload(file.file, public_id=f'NotesApp/{current_user.username}', overwrite=True)
-    src_url = cloudinary.CloudinaryImage(f'NotesApp/{current_user.username}')\
-                        .build_url(width=250, height=250, crop='fill', version=r.get('version'))
+    src_url = await store_avatar(file, current_user.id, current_user.avatar)
+    if src_url is None:
+        return current_user
     user = await repository_users.update_avatar(current_user.email, src_url, db)
+    await auth_service.invalidate_user(current_user.email)
     return user
\ No newline at end of file
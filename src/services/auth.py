@@ -1,15 +1,33 @@
+import asyncio
+import logging
+import math
+import pickle
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 import redis.asyncio as redis
-from jose import JWTError, jwt
+from redis.exceptions import RedisError
+from jose import JWTError
 from fastapi import HTTPException, status, Depends
 from fastapi.security import OAuth2PasswordBearer
 from passlib.context import CryptContext
+from passlib.hash import bcrypt
 from datetime import datetime, timedelta
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.db import get_db
+from src.database.models import User
 from src.repository import users as repository_users
 from src.conf.config import settings
+from src.services.jwt_backend import create_backend
+from src.services.revocation import RevocationList
+
+logger = logging.getLogger(__name__)
+
+# Secrets are never needed by the readers of the user cache: logins check the password in the database.
+UNCACHED_USER_COLUMNS = ("password", "refresh_token")
 
 
 class Auth:
@@ -18,16 +36,74 @@ class Auth:
 
     Attributes:
         pwd_context (CryptContext): The context for password hashing and verification.
-        SECRET_KEY (str): The secret key for JWT encoding and decoding.
-        ALGORITHM (str): The algorithm used for JWT encoding and decoding.
+        hash_executor (ThreadPoolExecutor): Bounded pool running bcrypt off the event loop.
+        jwt (JWTBackend): Signs and verifies the tokens, with keys prepared once.
         oauth2_scheme (OAuth2PasswordBearer): OAuth2 password bearer scheme for token validation.
-        r (redis.Redis): Redis connection for token management.
+        r (Optional[redis.Redis]): The Redis client for token management and caching, shared by
+            the whole application. Set by the lifespan handler, which owns its connection pool.
+        revocations (RevocationList): The access tokens revoked before their expiry.
     """
     pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-    SECRET_KEY = settings.secret_key
-    ALGORITHM = settings.algorithm
     oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
-    r = redis.Redis(host=settings.redis_host, port=settings.redis_port, db=0)
+    r: Optional[redis.Redis] = None
+    hash_executor = ThreadPoolExecutor(max_workers=settings.password_hash_workers, thread_name_prefix="bcrypt")
+
+    def __init__(self):
+        self.jwt = create_backend()
+        self.revocations = RevocationList(lambda: self.r)
+
+    def configure_password_rounds(self, rounds: int):
+        """
+        Sets the bcrypt cost factor for new hashes.
+
+        Stored hashes with a lower cost are marked as deprecated and get rehashed on the next login.
+
+        :param rounds: The bcrypt cost factor (log2 of the number of iterations).
+        :type rounds: int
+        :return: None
+        """
+        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto",
+                                        bcrypt__rounds=rounds, bcrypt__min_rounds=rounds)
+
+    def calibrate_password_rounds(self, target_ms: float, min_rounds: int) -> int:
+        """
+        Finds the bcrypt cost factor whose hashing time on this machine is closest to the target.
+
+        Every extra round doubles the work, so the cost is extrapolated from a cheap probe hash.
+
+        :param target_ms: The desired hashing time in milliseconds.
+        :type target_ms: float
+        :param min_rounds: The lowest cost factor that may be returned.
+        :type min_rounds: int
+        :return: The calibrated cost factor.
+        :rtype: int
+        """
+        probe_rounds = 8
+        hasher = bcrypt.using(rounds=probe_rounds)
+        elapsed = []
+        for _ in range(3):
+            start = time.perf_counter()
+            hasher.hash("calibration")
+            elapsed.append((time.perf_counter() - start) * 1000)
+        rounds = probe_rounds + round(math.log2(target_ms / max(min(elapsed), 1e-3)))
+        return max(min_rounds, min(rounds, 31))
+
+    async def setup_password_hashing(self):
+        """
+        Applies the configured bcrypt cost factor, calibrating it to ``bcrypt_target_ms`` when
+        ``bcrypt_rounds`` is not set. Meant to run once at application startup.
+
+        :return: The cost factor in use.
+        :rtype: int
+        """
+        rounds = settings.bcrypt_rounds
+        if rounds is None:
+            loop = asyncio.get_running_loop()
+            rounds = await loop.run_in_executor(self.hash_executor, self.calibrate_password_rounds,
+                                                settings.bcrypt_target_ms, settings.bcrypt_min_rounds)
+        self.configure_password_rounds(rounds)
+        logger.info("bcrypt cost factor set to %s", rounds)
+        return rounds
 
     def verify_password(self, plain_password, hashed_password):
         """
@@ -53,10 +129,41 @@ class Auth:
         """
         return self.pwd_context.hash(password)
 
+    async def get_password_hash_async(self, password: str) -> str:
+        """
+        Hashes a plain password in the hashing thread pool, without blocking the event loop.
+
+        :param password: The plain password to hash.
+        :type password: str
+        :return: The hashed password.
+        :rtype: str
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.hash_executor, self.pwd_context.hash, password)
+
+    async def verify_and_update_password(self, plain_password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """
+        Verifies a password in the hashing thread pool, without blocking the event loop.
+
+        When the stored hash is deprecated (e.g. its cost factor is below the current minimum)
+        a replacement hash is returned along with the result and should be saved.
+
+        :param plain_password: The plain password provided by the user.
+        :type plain_password: str
+        :param hashed_password: The stored hashed password.
+        :type hashed_password: str
+        :return: Whether the password matches, and the new hash or None.
+        :rtype: tuple[bool, str | None]
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.hash_executor, self.pwd_context.verify_and_update,
+                                          plain_password, hashed_password)
+
     # define a function to generate a new access token
     async def create_access_token(self, data: dict, expires_delta: Optional[float] = None):
         """
-        Creates a new access token (JWT) with an optional expiration time.
+        Creates a new access token (JWT) with an optional expiration time and a random ID (``jti``)
+        by which it can be revoked.
 
         :param data: The payload data to encode in the token.
         :type data: dict
@@ -71,7 +178,8 @@ class Auth:
         else:
             expire = datetime.utcnow() + timedelta(minutes=15)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "access_token"})
-        encoded_access_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        to_encode.setdefault("jti", uuid.uuid4().hex)
+        encoded_access_token = self.jwt.encode(to_encode)
         return encoded_access_token
 
     # define a function to generate a new refresh token
@@ -92,39 +200,51 @@ class Auth:
         else:
             expire = datetime.utcnow() + timedelta(days=7)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire, "scope": "refresh_token"})
-        encoded_refresh_token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        encoded_refresh_token = self.jwt.encode(to_encode)
         return encoded_refresh_token
 
-    async def decode_refresh_token(self, refresh_token: str):
+    async def decode_refresh_claims(self, refresh_token: str) -> dict:
         """
-        Decodes a refresh token (JWT) and extracts the user's email.
+        Decodes a refresh token (JWT) and returns its claims.
 
         :param refresh_token: The refresh token to decode.
         :type refresh_token: str
-        :return: The user's email extracted from the token.
-        :rtype: str
-        :raises HTTPException: If the token is invalid or has an incorrect scope.
+        :return: The claims, including the user's email as ``sub``.
+        :rtype: dict
+        :raises HTTPException: If the token is invalid, has an incorrect scope or was revoked.
         """
         try:
-            payload = jwt.decode(refresh_token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.jwt.decode(refresh_token)
             if payload['scope'] == 'refresh_token':
-                email = payload['sub']
-                return email
+                if await self.revocations.is_user_revoked(payload.get("sub"), payload.get("iat")):
+                    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
+                return payload
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Invalid scope for token')
         except JWTError:
             raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail='Could not validate credentials')
 
-    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    async def decode_refresh_token(self, refresh_token: str):
         """
-        Retrieves the currently authenticated user based on the provided access token.
+        Decodes a refresh token (JWT) and extracts the user's email.
 
-        :param token: The access token provided by the user.
+        :param refresh_token: The refresh token to decode.
+        :type refresh_token: str
+        :return: The user's email extracted from the token.
+        :rtype: str
+        :raises HTTPException: If the token is invalid or has an incorrect scope.
+        """
+        payload = await self.decode_refresh_claims(refresh_token)
+        return payload['sub']
+
+    async def decode_access_claims(self, token: str) -> dict:
+        """
+        Decodes an access token (JWT) and returns its claims.
+
+        :param token: The access token to decode.
         :type token: str
-        :param db: The database session.
-        :type db: Session
-        :return: The authenticated user.
-        :rtype: User
-        :raises HTTPException: If the token is invalid or the user does not exist.
+        :return: The claims, including the user's email as ``sub``.
+        :rtype: dict
+        :raises HTTPException: If the token is invalid, has an incorrect scope or was revoked.
         """
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -134,20 +254,91 @@ class Auth:
 
         try:
             # Decode JWT
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
-            if payload['scope'] == 'access_token':
-                email = payload["sub"]
-                if email is None:
-                    raise credentials_exception
-            else:
+            payload = self.jwt.decode(token)
+            if payload['scope'] != 'access_token' or payload.get("sub") is None:
                 raise credentials_exception
         except JWTError as e:
             raise credentials_exception
+        if await self.revocations.is_revoked(payload.get("jti")):
+            raise credentials_exception
+        if await self.revocations.is_user_revoked(payload["sub"], payload.get("iat")):
+            raise credentials_exception
+        return payload
+
+    async def get_current_user(self, token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)):
+        """
+        Retrieves the currently authenticated user based on the provided access token.
 
-        user = await repository_users.get_user_by_email(email, db)
+        :param token: The access token provided by the user.
+        :type token: str
+        :param db: The database session.
+        :type db: AsyncSession
+        :return: The authenticated user.
+        :rtype: User
+        :raises HTTPException: If the token is invalid or revoked, or the user does not exist.
+        """
+        email = (await self.decode_access_claims(token))["sub"]
+        user = await self.get_cached_user(email)
         if user is None:
-            raise credentials_exception
+            user = await repository_users.get_user_by_email(email, db)
+            if user is None:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Could not validate credentials",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            await self.cache_user(user)
         return user
+
+    async def get_cached_user(self, email: str) -> User | None:
+        """
+        Reads a user from the Redis cache.
+
+        The cached user is a transient object rebuilt from its column values, it is not
+        attached to any database session and has no password hash or refresh token.
+
+        :param email: The email of the user.
+        :type email: str
+        :return: The cached user, or None on a cache miss or if Redis is unavailable.
+        :rtype: User | None
+        """
+        try:
+            data = await self.r.get(f"user:{email}")
+        except RedisError as err:
+            logger.warning("User cache read failed: %s", err)
+            return None
+        if data is None:
+            return None
+        return User(**pickle.loads(data))
+
+    async def cache_user(self, user: User) -> None:
+        """
+        Stores the column values of a user, except :data:`UNCACHED_USER_COLUMNS`, in the Redis
+        cache for ``user_cache_ttl`` seconds.
+
+        :param user: The user to cache.
+        :type user: User
+        :return: None
+        """
+        data = {attr.key: getattr(user, attr.key) for attr in inspect(User).column_attrs
+                if attr.key not in UNCACHED_USER_COLUMNS}
+        try:
+            await self.r.set(f"user:{user.email}", pickle.dumps(data), ex=settings.user_cache_ttl)
+        except RedisError as err:
+            logger.warning("User cache write failed: %s", err)
+
+    async def invalidate_user(self, email: str) -> None:
+        """
+        Drops a user from the Redis cache. Must be called after every change to the user row.
+
+        :param email: The email of the user.
+        :type email: str
+        :return: None
+        """
+        try:
+            await self.r.delete(f"user:{email}")
+        except RedisError as err:
+            logger.warning("User cache invalidation failed: %s", err)
     
     def create_email_token(self, data: dict):
         """
@@ -161,12 +352,12 @@ class Auth:
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(days=7)
         to_encode.update({"iat": datetime.utcnow(), "exp": expire})
-        token = jwt.encode(to_encode, self.SECRET_KEY, algorithm=self.ALGORITHM)
+        token = self.jwt.encode(to_encode)
         return token
     
     async def get_email_from_token(self, token: str):
         try:
-            payload = jwt.decode(token, self.SECRET_KEY, algorithms=[self.ALGORITHM])
+            payload = self.jwt.decode(token)
             email = payload["sub"]
             return email
         except JWTError as e:
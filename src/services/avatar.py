@@ -0,0 +1,237 @@
+import asyncio
+import hashlib
+import io
+import logging
+import os
+import re
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import BinaryIO, Optional
+
+import cloudinary
+import cloudinary.exceptions
+import cloudinary.uploader
+from fastapi import HTTPException, UploadFile, status
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from src.conf.config import settings
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+image_executor = ThreadPoolExecutor(max_workers=settings.avatar_workers, thread_name_prefix="avatar")
+
+
+class AvatarStorage(ABC):
+    """
+    Stores resized avatars and returns their public URL.
+    """
+
+    @abstractmethod
+    def save(self, data: bytes, public_id: str) -> str:
+        """
+        Stores an avatar. Blocking; called from :data:`image_executor`.
+
+        :param data: The JPEG image.
+        :type data: bytes
+        :param public_id: The path of the avatar, unique per content.
+        :type public_id: str
+        :return: The URL of the stored avatar.
+        :rtype: str
+        """
+
+    @abstractmethod
+    def delete(self, public_id: str) -> None:
+        """
+        Deletes a stored avatar, if it exists. Blocking; called from :data:`image_executor`.
+
+        :param public_id: The path of the avatar.
+        :type public_id: str
+        :return: None
+        """
+
+
+class CloudinaryStorage(AvatarStorage):
+    """
+    Stores avatars on Cloudinary.
+    """
+
+    def __init__(self):
+        cloudinary.config(
+            cloud_name=settings.cloudinary_name,
+            api_key=settings.cloudinary_api_key,
+            api_secret=settings.cloudinary_api_secret,
+            secure=True
+        )
+
+    def save(self, data: bytes, public_id: str) -> str:
+        r = cloudinary.uploader.upload(io.BytesIO(data), public_id=public_id, overwrite=True)
+        return r["secure_url"]
+
+    def delete(self, public_id: str) -> None:
+        cloudinary.uploader.destroy(public_id, invalidate=True)
+
+
+class LocalStorage(AvatarStorage):
+    """
+    Stores avatars on the local disk, for development and tests.
+
+    Attributes:
+        root (Path): The directory the avatars are written to.
+        base_url (str): The URL the directory is served from.
+    """
+
+    def __init__(self, root: str, base_url: str):
+        self.root = Path(root)
+        self.base_url = base_url.rstrip("/")
+
+    def _path(self, public_id: str) -> Path:
+        """
+        Resolves the file of an avatar, refusing paths that escape :attr:`root`.
+
+        :param public_id: The path of the avatar.
+        :type public_id: str
+        :return: The file of the avatar.
+        :rtype: Path
+        :raises ValueError: If the path resolves outside of :attr:`root`.
+        """
+        root = self.root.resolve()
+        path = (root / f"{public_id}.jpg").resolve()
+        if not path.is_relative_to(root):
+            raise ValueError(f"Avatar path outside of the storage root: {public_id}")
+        return path
+
+    def save(self, data: bytes, public_id: str) -> str:
+        path = self._path(public_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        return f"{self.base_url}/{public_id}.jpg"
+
+    def delete(self, public_id: str) -> None:
+        self._path(public_id).unlink(missing_ok=True)
+
+
+@lru_cache
+def get_storage() -> AvatarStorage:
+    """
+    Returns the storage backend selected by ``settings.avatar_storage`` (``cloudinary`` or ``local``).
+
+    :return: The storage backend.
+    :rtype: AvatarStorage
+    """
+    if settings.avatar_storage == "local":
+        return LocalStorage(settings.avatar_local_dir, settings.avatar_base_url)
+    return CloudinaryStorage()
+
+
+async def hash_upload(file: UploadFile) -> str:
+    """
+    Reads an upload in chunks, checking its size and computing its SHA-256, then rewinds it.
+
+    The multipart parser has already spooled the upload to a temporary file, so it is read
+    from there rather than copied.
+
+    :param file: The uploaded file.
+    :type file: UploadFile
+    :return: The hex digest of the content.
+    :rtype: str
+    :raises HTTPException: 413 if the file is larger than ``avatar_max_bytes``.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := await file.read(CHUNK_SIZE):
+        size += len(chunk)
+        if size > settings.avatar_max_bytes:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Avatar too large")
+        digest.update(chunk)
+    await file.seek(0)
+    return digest.hexdigest()
+
+
+def resize_avatar(source: BinaryIO, size: int) -> bytes:
+    """
+    Crops an image to a centered square and scales it to ``size`` pixels, as a JPEG.
+
+    JPEG sources are decoded at a reduced scale when they are much larger than the target.
+    Blocking; called from :data:`image_executor`.
+
+    :param source: The image file.
+    :type source: BinaryIO
+    :param size: The width and height of the avatar.
+    :type size: int
+    :return: The JPEG image.
+    :rtype: bytes
+    :raises ValueError: If the file is not a supported image.
+    """
+    try:
+        with Image.open(source) as image:
+            image.draft("RGB", (size * 2, size * 2))
+            image = ImageOps.exif_transpose(image).convert("RGB")
+            avatar = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as err:
+        raise ValueError(f"Invalid image: {err}") from err
+    buffer = io.BytesIO()
+    avatar.save(buffer, "JPEG", quality=settings.avatar_quality, optimize=True)
+    return buffer.getvalue()
+
+
+def stored_public_id(url: Optional[str], user_id: int) -> Optional[str]:
+    """
+    Finds the path of a user's stored avatar in its URL.
+
+    Only paths under the user's own id are recognized. Avatars stored under the username by
+    earlier versions are left alone, since usernames are not unique and the path may be shared.
+
+    :param url: The URL of the avatar.
+    :type url: Optional[str]
+    :param user_id: The id of the owner.
+    :type user_id: int
+    :return: The path, or None if the avatar is not stored by the application (e.g. Gravatar).
+    :rtype: Optional[str]
+    """
+    match = re.search(rf"/(NotesApp/{int(user_id)}/[0-9a-f]{{16}})\.\w+$", url or "")
+    return match.group(1) if match else None
+
+
+async def store_avatar(file: UploadFile, user_id: int, current_url: Optional[str]) -> Optional[str]:
+    """
+    Resizes an uploaded avatar and stores it, unless it is the current avatar already.
+
+    The storage path contains a hash of the uploaded content, so an unchanged upload is
+    recognized from the current URL without any work. Once the new avatar is stored the
+    previous one is deleted. Resizing, uploading and deleting run in :data:`image_executor`,
+    off the event loop.
+
+    :param file: The uploaded image.
+    :type file: UploadFile
+    :param user_id: The id of the owner.
+    :type user_id: int
+    :param current_url: The URL of the current avatar.
+    :type current_url: Optional[str]
+    :return: The URL of the new avatar, or None if it did not change.
+    :rtype: Optional[str]
+    :raises HTTPException: 400 if the file is not an image, 413 if it is too large.
+    """
+    digest = await hash_upload(file)
+    public_id = f"NotesApp/{int(user_id)}/{digest[:16]}"
+    if current_url and f"/{public_id}." in current_url:
+        return None
+    loop = asyncio.get_running_loop()
+    try:
+        data = await loop.run_in_executor(image_executor, resize_avatar, file.file, settings.avatar_size)
+    except ValueError as err:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(err))
+    storage = get_storage()
+    url = await loop.run_in_executor(image_executor, storage.save, data, public_id)
+    previous_id = stored_public_id(current_url, user_id)
+    if previous_id is not None:
+        try:
+            await loop.run_in_executor(image_executor, storage.delete, previous_id)
+        except (cloudinary.exceptions.Error, OSError) as err:
+            logger.warning("Deleting the previous avatar %s failed: %s", previous_id, err)
+    return url
@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import pickle
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.services.auth import auth_service
+from src.services.etags import bump_contacts_version, get_contacts_version
+from src.services.lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "contacts:invalidate"
+
+
+class ContactsCache:
+    """
+    A two-tier read cache for contact queries.
+
+    Entries are keyed by the user's contacts version token (see :mod:`src.services.etags`),
+    which every write replaces, so a cached result can never outlive the data it was read
+    from. The first tier is a bounded in-process LRU, the second a shared Redis tier.
+
+    Writers publish the new version on :data:`INVALIDATION_CHANNEL`. While a worker is
+    subscribed it trusts the versions it received for up to ``cache_version_ttl`` seconds, so
+    that an in-process hit needs no Redis round trip at all; when it is not subscribed every
+    read fetches the version from Redis. When Redis is unavailable the cache is bypassed.
+
+    A request that also sends an ETag resolves the version once with :meth:`version` and
+    passes it to :meth:`get_or_load`, so that the ETag and the body come from the same version.
+
+    Attributes:
+        local (LRUCache): The in-process tier.
+        versions (LRUCache): The versions received from other workers, per user ID.
+        stats (dict): Hit, miss and error counters of this worker.
+    """
+
+    def __init__(self):
+        self.local = LRUCache(settings.cache_local_size, settings.cache_local_ttl)
+        self.versions = LRUCache(settings.cache_local_size, settings.cache_version_ttl)
+        self.subscribed = False
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "errors": 0}
+        self._listener: Optional[asyncio.Task] = None
+
+    async def version(self, user_id: int) -> Optional[str]:
+        """
+        Returns the contacts version of a user, as this worker trusts it.
+
+        :param user_id: The ID of the user.
+        :type user_id: int
+        :return: The version token, or None if Redis is unavailable.
+        :rtype: Optional[str]
+        """
+        if self.subscribed:
+            found, version = self.versions.get(user_id)
+            if found:
+                return version
+        version = await get_contacts_version(user_id)
+        if version is not None and self.subscribed:
+            self.versions.set(user_id, version)
+        return version
+
+    async def get_or_load(self, user_id: int, key: Tuple, loader: Callable[[], Awaitable[Any]],
+                          version: Optional[str] = None) -> Any:
+        """
+        Returns a cached contacts query result, running the query on a miss in both tiers.
+
+        Results are plain, picklable data (column rows as dicts), cached as is.
+
+        :param user_id: The ID of the user the query is about.
+        :type user_id: int
+        :param key: The query name and parameters.
+        :type key: Tuple
+        :param loader: Runs the query.
+        :type loader: Callable[[], Awaitable[Any]]
+        :param version: The version from :meth:`version`, or None to resolve it here.
+        :type version: Optional[str]
+        :return: The query result.
+        :rtype: Any
+        """
+        if version is None:
+            version = await self.version(user_id)
+        if version is None:
+            return await loader()
+        local_key = (user_id, version, *key)
+        found, data = self.local.get(local_key)
+        if found:
+            self.stats["local_hits"] += 1
+            return data
+        redis_key = f"contacts:cache:{user_id}:{version}:" + ":".join(map(str, key))
+        try:
+            cached = await auth_service.r.get(redis_key)
+        except RedisError as err:
+            logger.warning("Contacts cache read failed: %s", err)
+            self.stats["errors"] += 1
+            cached = None
+        if cached is not None:
+            self.stats["redis_hits"] += 1
+            data = pickle.loads(cached)
+            self.local.set(local_key, data)
+            return data
+
+        self.stats["misses"] += 1
+        data = await loader()
+        self.local.set(local_key, data)
+        try:
+            await auth_service.r.set(redis_key, pickle.dumps(data), ex=settings.cache_redis_ttl)
+        except RedisError as err:
+            logger.warning("Contacts cache write failed: %s", err)
+            self.stats["errors"] += 1
+        return data
+
+    async def invalidate(self, user_id: int) -> None:
+        """
+        Replaces the contacts version of a user and tells the other workers about it.
+        Must be called after every committed write.
+
+        :param user_id: The ID of the user.
+        :type user_id: int
+        :return: None
+        """
+        self.versions.pop(user_id)
+        version = await bump_contacts_version(user_id, INVALIDATION_CHANNEL)
+        if version is None:
+            # The old version may still be in Redis, and its entries must not be served here.
+            self.stats["errors"] += 1
+            self.local.clear()
+        elif self.subscribed:
+            self.versions.set(user_id, version)
+
+    def _on_message(self, data: Any) -> None:
+        if isinstance(data, bytes):
+            data = data.decode()
+        user_id, _, version = data.partition(":")
+        try:
+            self.versions.set(int(user_id), version)
+        except ValueError:
+            logger.warning("Ignoring malformed invalidation message: %r", data)
+
+    async def listen(self) -> None:
+        """
+        Applies the invalidation messages of the other workers, reconnecting after failures.
+
+        Versions received before a disconnection are forgotten, since messages published in
+        the meantime are lost.
+
+        :return: None
+        """
+        while True:
+            pubsub = auth_service.r.pubsub()
+            try:
+                await pubsub.subscribe(INVALIDATION_CHANNEL)
+                self.subscribed = True
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        self._on_message(message["data"])
+            except RedisError as err:
+                logger.warning("Contacts cache subscription lost: %s", err)
+            finally:
+                self.subscribed = False
+                self.versions.clear()
+                await pubsub.aclose()
+            await asyncio.sleep(1)
+
+    def start(self) -> None:
+        """
+        Starts the invalidation listener in the background.
+
+        :return: None
+        """
+        if self._listener is None:
+            self._listener = asyncio.create_task(self.listen())
+
+    async def stop(self) -> None:
+        """
+        Stops the invalidation listener.
+
+        :return: None
+        """
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    def get_stats(self) -> dict:
+        """
+        Returns the counters of this worker, with the number of in-process entries.
+
+        :return: The statistics.
+        :rtype: dict
+        """
+        lookups = sum(self.stats[name] for name in ("local_hits", "redis_hits", "misses"))
+        hits = self.stats["local_hits"] + self.stats["redis_hits"]
+        return dict(self.stats, local_entries=len(self.local), hit_ratio=hits / lookups if lookups else 0.0)
+
+
+contacts_cache = ContactsCache()
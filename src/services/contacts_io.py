@@ -0,0 +1,346 @@
+import codecs
+import csv
+import io
+import json
+from collections import deque
+from typing import AsyncIterator, List, Optional, Sequence, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.conf.config import settings
+from src.database.models import User
+from src.repository import contacts as repository_contacts
+from src.schemas import ContactModel
+
+IMPORT_FORMATS = {
+    "text/csv": "csv",
+    "application/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+EXPORT_FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "vcf": ("text/vcard; charset=utf-8", "vcf"),
+}
+
+CSV_COLUMNS = ["id", "first_name", "last_name", "email", "phone", "birthday_date"]
+
+
+def detect_format(content_type: Optional[str]) -> Optional[str]:
+    """
+    Maps the Content-Type of an upload to an import format.
+
+    :param content_type: The Content-Type header of the request.
+    :type content_type: Optional[str]
+    :return: ``csv``, ``ndjson`` or None if the type is not supported.
+    :rtype: Optional[str]
+    """
+    if not content_type:
+        return None
+    return IMPORT_FORMATS.get(content_type.split(";")[0].strip().lower())
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """
+    Splits a stream of UTF-8 encoded chunks into lines as the chunks arrive.
+
+    :param chunks: The raw body chunks.
+    :type chunks: AsyncIterator[bytes]
+    :return: The lines without their line endings.
+    :rtype: AsyncIterator[str]
+    :raises UnicodeDecodeError: If the body is not valid UTF-8.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+
+class _LineFeed:
+    """
+    The lines of an upload, handed to one ``csv.reader`` as complete records arrive.
+    """
+
+    def __init__(self):
+        self.lines = deque()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> str:
+        if not self.lines:
+            raise StopIteration
+        return self.lines.popleft()
+
+
+def _in_quoted_field(line: str, in_quotes: bool) -> bool:
+    """
+    Tells whether a quoted CSV field is still open at the end of a line.
+
+    Follows the rules of ``csv.reader``: a quote opens a quoted field only at the start of a
+    field, elsewhere it is a literal character, and a doubled quote inside a quoted field is
+    an escaped quote.
+
+    :param line: The line, without its line ending.
+    :type line: str
+    :param in_quotes: Whether a quoted field was open at the start of the line.
+    :type in_quotes: bool
+    :return: Whether a quoted field is open at the end of the line.
+    :rtype: bool
+    """
+    pos = 0
+    while (pos := line.find('"', pos)) >= 0:
+        if in_quotes:
+            if line.startswith('"', pos + 1):
+                pos += 1
+            else:
+                in_quotes = False
+        elif pos == 0 or line[pos - 1] == ",":
+            in_quotes = True
+        pos += 1
+    return in_quotes
+
+
+async def _parse_csv(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    feed = _LineFeed()
+    reader = csv.reader(feed)
+    header = None
+    record: List[str] = []
+    start = line_no = size = 0
+    in_quotes = False
+    async for line in lines:
+        line_no += 1
+        if not record:
+            if not line.strip():
+                continue
+            start = line_no
+        record.append(line + "\n")
+        size += len(line) + 1
+        in_quotes = _in_quoted_field(line, in_quotes)
+        if size > settings.import_max_record_size:
+            yield start, None, f"Record longer than {settings.import_max_record_size} characters"
+            record, in_quotes, size = [], False, 0
+            continue
+        if in_quotes:
+            continue
+        feed.lines.extend(record)
+        record, size = [], 0
+        try:
+            values = next(reader)
+        except csv.Error as err:
+            yield start, None, f"Invalid CSV: {err}"
+            continue
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield start, None, f"Expected {len(header)} fields, got {len(values)}"
+            continue
+        yield start, dict(zip(header, values)), None
+    if record:
+        yield start, None, "Unterminated quoted field"
+
+
+async def _parse_ndjson(lines: AsyncIterator[str]) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as err:
+            yield line_no, None, f"Invalid JSON: {err}"
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, "Expected a JSON object"
+            continue
+        yield line_no, record, None
+
+
+def parse_records(lines: AsyncIterator[str], fmt: str) -> AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """
+    Parses CSV (with a header line) or NDJSON lines into records.
+
+    Blank lines are skipped. Each record is yielded with its 1-based line number (the first
+    line of a CSV record with quoted line breaks) and either the parsed fields or a parse
+    error message. CSV records longer than ``import_max_record_size`` characters are
+    rejected, so that an unterminated quote cannot buffer the rest of the upload.
+
+    :param lines: The lines of the upload.
+    :type lines: AsyncIterator[str]
+    :param fmt: ``csv`` or ``ndjson``.
+    :type fmt: str
+    :return: Tuples of line number, record and error.
+    :rtype: AsyncIterator[Tuple[int, Optional[dict], Optional[str]]]
+    """
+    return _parse_csv(lines) if fmt == "csv" else _parse_ndjson(lines)
+
+
+async def import_contacts(chunks: AsyncIterator[bytes], fmt: str, user: User, db: AsyncSession) -> dict:
+    """
+    Streams an upload into the contacts of a user.
+
+    Records are validated with :class:`ContactModel` and inserted in batches of
+    ``import_batch_size``. Invalid records are skipped and reported, up to ``import_max_errors``.
+
+    :param chunks: The raw body chunks.
+    :type chunks: AsyncIterator[bytes]
+    :param fmt: ``csv`` or ``ndjson``.
+    :type fmt: str
+    :param user: The user to import the contacts for.
+    :type user: User
+    :param db: The database session.
+    :type db: AsyncSession
+    :return: The number of imported and failed records, and the error report.
+    :rtype: dict
+    """
+    imported = failed = 0
+    errors = []
+    batch: List[ContactModel] = []
+
+    def report(line_no: int, messages: List[str]):
+        nonlocal failed
+        failed += 1
+        if len(errors) < settings.import_max_errors:
+            errors.append({"line": line_no, "errors": messages})
+
+    async for line_no, record, error in parse_records(iter_lines(chunks), fmt):
+        if error is not None:
+            report(line_no, [error])
+            continue
+        try:
+            batch.append(ContactModel(**record))
+        except ValidationError as err:
+            report(line_no, [f"{'.'.join(map(str, e['loc']))}: {e['msg']}" for e in err.errors()])
+            continue
+        if len(batch) >= settings.import_batch_size:
+            imported += await repository_contacts.create_contacts(batch, user, db)
+            batch = []
+    imported += await repository_contacts.create_contacts(batch, user, db)
+    return {"imported": imported, "failed": failed, "errors": errors}
+
+
+def _format_ndjson(rows: Sequence[Row]) -> str:
+    """
+    Formats rows as JSON objects with the ``ContactResponse`` fields, one per line.
+
+    :param rows: The contact rows.
+    :type rows: Sequence[Row]
+    :return: The NDJSON text.
+    :rtype: str
+    """
+    return "".join(
+        json.dumps({
+            "first_name": row.first_name,
+            "last_name": row.last_name,
+            "email": row.email,
+            "phone": row.phone,
+            "id": row.id,
+            "birthday_date": row.birthday_date.isoformat() if row.birthday_date else None,
+        }, ensure_ascii=False) + "\n"
+        for row in rows
+    )
+
+
+def _format_csv(rows: Sequence[Row]) -> str:
+    """
+    Formats rows as CSV records in the order of :data:`CSV_COLUMNS`.
+
+    :param rows: The contact rows.
+    :type rows: Sequence[Row]
+    :return: The CSV text.
+    :rtype: str
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    for row in rows:
+        writer.writerow([row.id, row.first_name, row.last_name, row.email, row.phone,
+                         row.birthday_date.date().isoformat() if row.birthday_date else ""])
+    return buffer.getvalue()
+
+
+def _vcard_escape(value: str) -> str:
+    """
+    Escapes a vCard property value (RFC 6350, section 3.4).
+
+    :param value: The raw value.
+    :type value: str
+    :return: The escaped value.
+    :rtype: str
+    """
+    return value.replace("\\", "\\\\").replace(",", "\\,").replace(";", "\\;").replace("\n", "\\n")
+
+
+def _vcard_line(line: str) -> str:
+    """
+    Terminates a vCard content line, folding it at 75 characters.
+
+    :param line: The unfolded content line.
+    :type line: str
+    :return: The folded line with CRLF line breaks.
+    :rtype: str
+    """
+    parts = [line[:75]] + [" " + line[i:i + 74] for i in range(75, len(line), 74)]
+    return "\r\n".join(parts) + "\r\n"
+
+
+def _format_vcf(rows: Sequence[Row]) -> str:
+    """
+    Formats rows as vCard 3.0 entries.
+
+    :param rows: The contact rows.
+    :type rows: Sequence[Row]
+    :return: The vCard text.
+    :rtype: str
+    """
+    cards = []
+    for row in rows:
+        first_name, last_name = _vcard_escape(row.first_name), _vcard_escape(row.last_name)
+        lines = [
+            "BEGIN:VCARD",
+            "VERSION:3.0",
+            f"N:{last_name};{first_name};;;",
+            f"FN:{first_name} {last_name}",
+            f"EMAIL:{_vcard_escape(row.email)}",
+            f"TEL:{_vcard_escape(row.phone)}",
+        ]
+        if row.birthday_date:
+            lines.append(f"BDAY:{row.birthday_date.date().isoformat()}")
+        lines.append("END:VCARD")
+        cards.append("".join(_vcard_line(line) for line in lines))
+    return "".join(cards)
+
+
+FORMATTERS = {"ndjson": _format_ndjson, "csv": _format_csv, "vcf": _format_vcf}
+
+
+async def export_contacts(batches: AsyncIterator[Sequence[Row]], fmt: str) -> AsyncIterator[str]:
+    """
+    Formats streamed batches of contact rows, yielding one chunk per batch.
+
+    CSV output starts with a header line, sent before the first row is fetched.
+
+    :param batches: The row batches from :func:`src.repository.contacts.stream_contacts`.
+    :type batches: AsyncIterator[Sequence[Row]]
+    :param fmt: ``ndjson``, ``csv`` or ``vcf``.
+    :type fmt: str
+    :return: The formatted chunks.
+    :rtype: AsyncIterator[str]
+    """
+    if fmt == "csv":
+        yield ",".join(CSV_COLUMNS) + "\n"
+    formatter = FORMATTERS[fmt]
+    async for rows in batches:
+        yield formatter(rows)
@@ -1,31 +1,60 @@
+import json
+import logging
+from functools import lru_cache
 from pathlib import Path
 
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig, MessageType
-from fastapi_mail.errors import ConnectionErrors
+from jinja2 import Environment, FileSystemLoader, Template, select_autoescape
 from pydantic import EmailStr
+from redis.exceptions import RedisError
 
 from src.services.auth import auth_service
 from src.conf.config import settings
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.mail_username,
-    MAIL_PASSWORD=settings.mail_password,
-    MAIL_FROM=settings.mail_from,
-    MAIL_PORT=settings.mail_port,
-    MAIL_SERVER=settings.mail_server,
-    MAIL_FROM_NAME="Rest API Application",
-    MAIL_STARTTLS=False,
-    MAIL_SSL_TLS=True,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-    TEMPLATE_FOLDER=Path(__file__).parent / 'templates',
-)
+logger = logging.getLogger(__name__)
+
+TEMPLATE_FOLDER = Path(__file__).parent / 'templates'
+
+templates = Environment(loader=FileSystemLoader(TEMPLATE_FOLDER), autoescape=select_autoescape(["html"]),
+                        auto_reload=False)
+
+
+@lru_cache
+def get_template(name: str) -> Template:
+    """
+    Returns a compiled template from the ``templates`` folder, loaded once per process.
+
+    :param name: The file name of the template.
+    :type name: str
+    :return: The compiled template.
+    :rtype: Template
+    """
+    return templates.get_template(name)
+
+
+async def enqueue_email(recipient: str, subject: str, html: str) -> None:
+    """
+    Queues a rendered email for the delivery worker (:mod:`src.services.email_worker`).
+
+    :param recipient: The email address of the recipient.
+    :type recipient: str
+    :param subject: The subject of the email.
+    :type subject: str
+    :param html: The HTML body.
+    :type html: str
+    :return: None
+    :raises RedisError: If the queue is unavailable.
+    """
+    payload = json.dumps({"to": recipient, "subject": subject, "html": html, "attempts": 0})
+    await auth_service.r.lpush(settings.email_queue, payload)
 
 
 async def send_email(email: EmailStr, username: str, host: str):
     """
     Sends a confirmation email to the user with a verification token.
 
+    The email is rendered here and delivered by the email worker, which keeps its SMTP
+    connection open between messages.
+
     :param email: The email address of the recipient.
     :type email: EmailStr
     :param username: The username of the recipient.
@@ -33,18 +62,10 @@ async def send_email(email: EmailStr, username: str, host: str):
     :param host: The host URL for the email template, used to generate the confirmation link.
     :type host: str
     :return: None
-    :raises ConnectionErrors: If there is an error connecting to the email server.
     """
+    token_verification = auth_service.create_email_token({"sub": email})
+    html = get_template("email_template.html").render(host=host, username=username, token=token_verification)
     try:
-        token_verification = auth_service.create_email_token({"sub": email})
-        message = MessageSchema(
-            subject="Confirm your email ",
-            recipients=[email],
-            template_body={"host": host, "username": username, "token": token_verification},
-            subtype=MessageType.html
-        )
-
-        fm = FastMail(conf)
-        await fm.send_message(message, template_name="email_template.html")
-    except ConnectionErrors as err:
-        print(err)
\ No newline at end of file
+        await enqueue_email(email, "Confirm your email ", html)
+    except RedisError as err:
+        logger.error("Could not queue the confirmation email for %s: %s", email, err)
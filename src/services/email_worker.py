@@ -0,0 +1,251 @@
+"""
+Delivers the emails queued by :func:`src.services.email.enqueue_email`.
+
+Run one or more workers next to the API::
+
+    python -m src.services.email_worker [worker-name]
+
+Each running worker needs its own name, which defaults to ``{hostname}:{pid}``. Give a worker
+a stable name (one per replica) so that it resumes the batch it left behind after a crash.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import sys
+import time
+from email.message import EmailMessage
+from email.utils import formataddr
+from typing import List, Optional
+
+import aiosmtplib
+import redis.asyncio as redis
+
+from src.conf.config import settings
+from src.database.redis import close_redis, create_redis
+
+logger = logging.getLogger(__name__)
+
+
+class SMTPSender:
+    """
+    Sends emails over one SMTP connection that is kept open between messages and reopened
+    when the server drops it.
+    """
+
+    def __init__(self):
+        self.smtp: Optional[aiosmtplib.SMTP] = None
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        credentials = {"username": settings.mail_username, "password": settings.mail_password} \
+            if settings.mail_use_credentials else {}
+        smtp = aiosmtplib.SMTP(hostname=settings.mail_server, port=settings.mail_port, use_tls=settings.mail_ssl_tls,
+                               start_tls=settings.mail_starttls, validate_certs=settings.mail_validate_certs,
+                               timeout=settings.email_timeout, **credentials)
+        await smtp.connect()
+        self.smtp = smtp
+        return smtp
+
+    async def send(self, message: EmailMessage) -> None:
+        """
+        Sends one email, reconnecting once if the connection was closed by the server.
+
+        :param message: The email to send.
+        :type message: EmailMessage
+        :return: None
+        :raises aiosmtplib.SMTPException: If the email could not be sent.
+        """
+        smtp = self.smtp if self.smtp is not None and self.smtp.is_connected else await self._connect()
+        try:
+            await smtp.send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            smtp = await self._connect()
+            await smtp.send_message(message)
+
+    async def close(self) -> None:
+        """
+        Closes the connection.
+
+        :return: None
+        """
+        if self.smtp is not None and self.smtp.is_connected:
+            try:
+                await self.smtp.quit()
+            except aiosmtplib.SMTPException:
+                self.smtp.close()
+        self.smtp = None
+
+
+def build_message(payload: dict) -> EmailMessage:
+    """
+    Builds an HTML email from a queued payload.
+
+    :param payload: The ``to``, ``subject`` and ``html`` of the email.
+    :type payload: dict
+    :return: The email.
+    :rtype: EmailMessage
+    """
+    message = EmailMessage()
+    message["From"] = formataddr((settings.mail_from_name, settings.mail_from))
+    message["To"] = payload["to"]
+    message["Subject"] = payload["subject"]
+    message.set_content(payload["html"], subtype="html")
+    return message
+
+
+class EmailWorker:
+    """
+    Moves batches of emails from the Redis queue to SMTP.
+
+    A batch is first moved to a processing list owned by the worker, so that a worker
+    restarted after a crash sends it again. Failed emails are retried with exponential
+    backoff, up to ``email_max_attempts`` times, then moved to the dead-letter list.
+
+    The name of the worker must not be shared with another running worker, which would
+    re-queue and delete the batches in its processing list.
+
+    Attributes:
+        r (redis.Redis): The Redis connection holding the queue.
+        sender (SMTPSender): The SMTP connection.
+        processing (str): The key of the processing list of this worker.
+    """
+
+    def __init__(self, r: redis.Redis, sender: SMTPSender, name: Optional[str] = None):
+        if name is None:
+            name = f"{socket.gethostname()}:{os.getpid()}"
+        self.r = r
+        self.sender = sender
+        self.queue = settings.email_queue
+        self.retries = f"{settings.email_queue}:retry"
+        self.dead = f"{settings.email_queue}:dead"
+        self.processing = f"{settings.email_queue}:processing:{name}"
+
+    async def recover(self) -> None:
+        """
+        Puts back the batch a previous run of this worker did not finish.
+
+        :return: None
+        """
+        while await self.r.lmove(self.processing, self.queue, "RIGHT", "RIGHT"):
+            pass
+
+    async def promote_retries(self) -> None:
+        """
+        Moves the emails whose backoff has expired back to the queue.
+
+        :return: None
+        """
+        due = await self.r.zrangebyscore(self.retries, 0, time.time())
+        if due:
+            async with self.r.pipeline(transaction=True) as pipe:
+                pipe.zrem(self.retries, *due)
+                pipe.rpush(self.queue, *due)
+                await pipe.execute()
+
+    async def fetch_batch(self, timeout: float) -> List[bytes]:
+        """
+        Moves up to ``email_batch_size`` emails to the processing list, waiting for the first one.
+
+        :param timeout: The number of seconds to wait for an email.
+        :type timeout: float
+        :return: The raw payloads.
+        :rtype: List[bytes]
+        """
+        first = await self.r.blmove(self.queue, self.processing, timeout, "RIGHT", "LEFT")
+        if first is None:
+            return []
+        async with self.r.pipeline(transaction=False) as pipe:
+            for _ in range(settings.email_batch_size - 1):
+                pipe.lmove(self.queue, self.processing, "RIGHT", "LEFT")
+            rest = await pipe.execute()
+        return [first] + [payload for payload in rest if payload is not None]
+
+    async def deliver(self, batch: List[bytes]) -> int:
+        """
+        Sends a batch over the open connection and schedules the failed emails for a retry.
+        Payloads that cannot be decoded or turned into an email go to the dead-letter list.
+
+        :param batch: The raw payloads.
+        :type batch: List[bytes]
+        :return: The number of emails sent.
+        :rtype: int
+        """
+        sent = 0
+        retries = {}
+        dead = []
+        for raw in batch:
+            try:
+                payload = json.loads(raw)
+                message = build_message(payload)
+            except Exception as err:
+                # A payload that cannot be decoded or built never will be: retrying it is pointless.
+                logger.error("Moving an invalid email payload to the dead-letter list: %r", err)
+                dead.append(raw)
+                continue
+            try:
+                await self.sender.send(message)
+                sent += 1
+            except (aiosmtplib.SMTPException, OSError) as err:
+                payload["attempts"] += 1
+                logger.warning("Sending to %s failed (attempt %s): %s", payload["to"], payload["attempts"], err)
+                if payload["attempts"] >= settings.email_max_attempts:
+                    dead.append(json.dumps(payload))
+                else:
+                    delay = settings.email_retry_delay * 2 ** (payload["attempts"] - 1)
+                    retries[json.dumps(payload)] = time.time() + delay
+        async with self.r.pipeline(transaction=True) as pipe:
+            if retries:
+                pipe.zadd(self.retries, retries)
+            if dead:
+                pipe.lpush(self.dead, *dead)
+            pipe.delete(self.processing)
+            await pipe.execute()
+        return sent
+
+    async def run_once(self, timeout: float = 1) -> int:
+        """
+        Sends one batch of emails.
+
+        :param timeout: The number of seconds to wait for an email.
+        :type timeout: float
+        :return: The number of emails sent.
+        :rtype: int
+        """
+        await self.promote_retries()
+        batch = await self.fetch_batch(timeout)
+        return await self.deliver(batch) if batch else 0
+
+    async def run(self) -> None:
+        """
+        Sends emails until cancelled, closing the SMTP connection after ``email_idle_timeout``
+        seconds without emails.
+
+        :return: None
+        """
+        await self.recover()
+        last_sent = time.monotonic()
+        try:
+            while True:
+                await self.promote_retries()
+                batch = await self.fetch_batch(1)
+                if batch:
+                    await self.deliver(batch)
+                    last_sent = time.monotonic()
+                elif time.monotonic() - last_sent > settings.email_idle_timeout:
+                    await self.sender.close()
+        finally:
+            await self.sender.close()
+
+
+async def main(name: Optional[str] = None) -> None:
+    r = create_redis()
+    try:
+        await EmailWorker(r, SMTPSender(), name).run()
+    finally:
+        await close_redis(r)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(*sys.argv[1:2]))
@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import logging
+import uuid
+from typing import Optional
+
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.database.redis import pipelined
+from src.services.auth import auth_service
+
+logger = logging.getLogger(__name__)
+
+BUMP_ATTEMPTS = 3
+BUMP_RETRY_DELAY = 0.05
+
+
+def _version_key(user_id: int) -> str:
+    return f"contacts:version:{user_id}"
+
+
+async def get_contacts_version(user_id: int) -> Optional[str]:
+    """
+    Returns the current version token of a user's contacts, creating one if there is none.
+
+    The token is a random value replaced on every write, so a lost or expired key can never
+    bring an old token back.
+
+    :param user_id: The ID of the user.
+    :type user_id: int
+    :return: The version token, or None if Redis is unavailable.
+    :rtype: Optional[str]
+    """
+    key = _version_key(user_id)
+    try:
+        version = await auth_service.r.get(key)
+        if version is None:
+            version = uuid.uuid4().hex
+            if not await auth_service.r.set(key, version, nx=True, ex=settings.contacts_version_ttl):
+                version = await auth_service.r.get(key)
+    except RedisError as err:
+        logger.warning("Contacts version read failed: %s", err)
+        return None
+    if isinstance(version, bytes):
+        version = version.decode()
+    return version
+
+
+async def bump_contacts_version(user_id: int, channel: Optional[str] = None) -> Optional[str]:
+    """
+    Replaces the version token of a user's contacts. Must be called after every committed write.
+
+    A failed write is retried ``BUMP_ATTEMPTS`` times. If it still fails, the version key is
+    deleted as a last resort, so that the next read creates a new token instead of the old
+    one validating stale copies until it expires.
+
+    :param user_id: The ID of the user.
+    :type user_id: int
+    :param channel: A channel to publish ``{user_id}:{version}`` on, in the same round trip.
+    :type channel: Optional[str]
+    :return: The new version token, or None if it could not be stored.
+    :rtype: Optional[str]
+    """
+    version = uuid.uuid4().hex
+    commands = [("SET", _version_key(user_id), version, "EX", settings.contacts_version_ttl)]
+    if channel is not None:
+        commands.append(("PUBLISH", channel, f"{user_id}:{version}"))
+    for attempt in range(BUMP_ATTEMPTS):
+        try:
+            await pipelined(auth_service.r, *commands)
+            return version
+        except RedisError as err:
+            logger.warning("Contacts version bump failed for user %s (attempt %s): %s", user_id, attempt + 1, err)
+        if attempt + 1 < BUMP_ATTEMPTS:
+            await asyncio.sleep(BUMP_RETRY_DELAY * 2 ** attempt)
+    try:
+        await auth_service.r.delete(_version_key(user_id))
+        logger.error("Contacts version of user %s could not be replaced and was deleted", user_id)
+    except RedisError as err:
+        logger.error("Contacts version of user %s could not be replaced or deleted, stale ETags may be "
+                     "accepted for up to %s seconds: %s", user_id, settings.contacts_version_ttl, err)
+    return None
+
+
+def make_etag(version: str, *parts) -> str:
+    """
+    Builds a strong ETag from a version token and the parameters that shape the response.
+
+    :param version: The contacts version token.
+    :type version: str
+    :param parts: The request parameters (path, query string...).
+    :return: The quoted ETag.
+    :rtype: str
+    """
+    digest = hashlib.sha1(":".join(map(str, (version, *parts))).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Checks an ``If-None-Match`` header against an ETag, using weak comparison as RFC 9110 requires.
+
+    :param if_none_match: The header value, a list of ETags.
+    :type if_none_match: Optional[str]
+    :param etag: The current ETag.
+    :type etag: str
+    :return: True if the client copy is current.
+    :rtype: bool
+    """
+    if not if_none_match:
+        return False
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return etag in candidates
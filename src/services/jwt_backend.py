@@ -0,0 +1,258 @@
+import base64
+import calendar
+import hashlib
+import hmac
+import json
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, encode_dss_signature
+from jose import jwk, jwt
+from jose.exceptions import ExpiredSignatureError, JWTClaimsError, JWTError
+
+from src.conf.config import settings
+from src.services.lru import LRUCache
+
+HMAC_ALGORITHMS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+TIME_CLAIMS = ("exp", "iat", "nbf")
+
+
+def _b64encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def _b64decode(data: bytes) -> bytes:
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+def _timestamps(claims: dict) -> dict:
+    """
+    Converts the datetime values of the time claims to Unix timestamps, as python-jose does.
+
+    :param claims: The claims.
+    :type claims: dict
+    :return: A copy of the claims.
+    :rtype: dict
+    """
+    claims = dict(claims)
+    for name in TIME_CLAIMS:
+        if isinstance(claims.get(name), datetime):
+            claims[name] = calendar.timegm(claims[name].utctimetuple())
+    return claims
+
+
+class JWTBackend(ABC):
+    """
+    Signs and verifies JWTs with keys prepared once, when the backend is created.
+
+    ``decode`` raises the python-jose exceptions (``JWTError`` and its subclasses) whatever the
+    backend, so callers do not depend on the implementation.
+
+    Attributes:
+        algorithm (str): The JWS algorithm.
+    """
+    algorithm: str
+
+    @abstractmethod
+    def encode(self, claims: dict) -> str:
+        """
+        Signs a set of claims.
+
+        :param claims: The claims; datetime values of ``exp``, ``iat`` and ``nbf`` are converted to timestamps.
+        :type claims: dict
+        :return: The compact JWT.
+        :rtype: str
+        """
+
+    @abstractmethod
+    def decode(self, token: str) -> dict:
+        """
+        Verifies the signature and the expiry of a token.
+
+        :param token: The compact JWT.
+        :type token: str
+        :return: The claims.
+        :rtype: dict
+        :raises JWTError: If the token is malformed, badly signed or expired.
+        """
+
+
+class JoseBackend(JWTBackend):
+    """
+    Delegates to python-jose, with the key parsed into a jose ``Key`` once instead of per call.
+    Supports the algorithms of python-jose, which does not include EdDSA.
+    """
+
+    def __init__(self, algorithm: str, signing_key, verifying_key=None):
+        if signing_key is None and verifying_key is None:
+            raise ValueError(f"{algorithm} requires a signing or verifying key")
+        self.algorithm = algorithm
+        self.signing_key = jwk.construct(signing_key, algorithm) if signing_key is not None else None
+        if verifying_key is not None:
+            self.verifying_key = jwk.construct(verifying_key, algorithm)
+        elif algorithm in HMAC_ALGORITHMS:
+            self.verifying_key = self.signing_key
+        else:
+            self.verifying_key = self.signing_key.public_key()
+
+    def encode(self, claims: dict) -> str:
+        if self.signing_key is None:
+            raise JWTError("No signing key configured")
+        return jwt.encode(claims, self.signing_key, algorithm=self.algorithm)
+
+    def decode(self, token: str) -> dict:
+        return jwt.decode(token, self.verifying_key, algorithms=[self.algorithm])
+
+
+class NativeBackend(JWTBackend):
+    """
+    Signs and verifies with the ``cryptography`` primitives directly, skipping the generic key
+    and claim handling of python-jose.
+
+    Supports HS256/HS384/HS512 with a shared secret, and ES256 and EdDSA (Ed25519) with a PEM
+    private key. A service that only verifies tokens can be given the public key alone. Only
+    the configured algorithm is accepted, and ``exp`` and ``nbf`` are checked.
+    """
+
+    def __init__(self, algorithm: str, signing_key=None, verifying_key=None):
+        self.algorithm = algorithm
+        self._header = _b64encode(json.dumps({"alg": algorithm, "typ": "JWT"}, separators=(",", ":")).encode())
+        self._hmac = self._private = self._public = None
+        if algorithm in HMAC_ALGORITHMS:
+            secret = signing_key.encode() if isinstance(signing_key, str) else signing_key
+            # The key is padded and hashed once; every token starts from a copy of this state.
+            self._hmac = hmac.new(secret, digestmod=HMAC_ALGORITHMS[algorithm])
+        elif algorithm in ("ES256", "EdDSA"):
+            if signing_key is None and verifying_key is None:
+                raise ValueError(f"{algorithm} requires a signing or verifying key")
+            if signing_key is not None:
+                self._private = serialization.load_pem_private_key(_pem(signing_key), password=None)
+            self._public = serialization.load_pem_public_key(_pem(verifying_key)) if verifying_key is not None \
+                else self._private.public_key()
+            if not (isinstance(self._public, ec.EllipticCurvePublicKey) and isinstance(self._public.curve, ec.SECP256R1)
+                    if algorithm == "ES256" else isinstance(self._public, ed25519.Ed25519PublicKey)):
+                raise ValueError(f"The key does not match the {algorithm} algorithm")
+        else:
+            raise ValueError(f"Unsupported JWT algorithm: {algorithm}")
+
+    def _sign(self, message: bytes) -> bytes:
+        if self._hmac is not None:
+            mac = self._hmac.copy()
+            mac.update(message)
+            return mac.digest()
+        if self._private is None:
+            raise JWTError("No signing key configured")
+        if self.algorithm == "ES256":
+            r, s = decode_dss_signature(self._private.sign(message, ec.ECDSA(hashes.SHA256())))
+            return r.to_bytes(32, "big") + s.to_bytes(32, "big")
+        return self._private.sign(message)
+
+    def _verify(self, message: bytes, signature: bytes) -> bool:
+        if self._hmac is not None:
+            return hmac.compare_digest(self._sign(message), signature)
+        try:
+            if self.algorithm == "ES256":
+                if len(signature) != 64:
+                    return False
+                der = encode_dss_signature(int.from_bytes(signature[:32], "big"), int.from_bytes(signature[32:], "big"))
+                self._public.verify(der, message, ec.ECDSA(hashes.SHA256()))
+            else:
+                self._public.verify(signature, message)
+        except InvalidSignature:
+            return False
+        return True
+
+    def encode(self, claims: dict) -> str:
+        payload = _b64encode(json.dumps(_timestamps(claims), separators=(",", ":")).encode())
+        message = self._header + b"." + payload
+        return (message + b"." + _b64encode(self._sign(message))).decode()
+
+    def decode(self, token: str) -> dict:
+        try:
+            message, _, signature = token.encode().rpartition(b".")
+            header, _, payload = message.partition(b".")
+            if json.loads(_b64decode(header)).get("alg") != self.algorithm:
+                raise JWTError("The specified alg value is not allowed")
+            if not self._verify(message, _b64decode(signature)):
+                raise JWTError("Signature verification failed.")
+            claims = json.loads(_b64decode(payload))
+        except (ValueError, AttributeError, UnicodeError) as err:
+            raise JWTError(f"Invalid token: {err}")
+        if not isinstance(claims, dict):
+            raise JWTError("Invalid payload")
+        now = time.time()
+        try:
+            if "exp" in claims and int(claims["exp"]) <= now:
+                raise ExpiredSignatureError("Signature has expired.")
+            if "nbf" in claims and int(claims["nbf"]) > now:
+                raise JWTClaimsError("The token is not yet valid (nbf)")
+        except (TypeError, ValueError):
+            raise JWTClaimsError("Invalid time claim")
+        return claims
+
+
+class CachingBackend(JWTBackend):
+    """
+    Remembers the claims of recently verified tokens, so that a client sending the same token
+    on every request is verified once per ``ttl`` seconds. A cached token is still rejected
+    once it expires.
+
+    Attributes:
+        backend (JWTBackend): The backend doing the work.
+        verified (LRUCache): The claims per token.
+    """
+
+    def __init__(self, backend: JWTBackend, maxsize: int, ttl: float):
+        self.backend = backend
+        self.algorithm = backend.algorithm
+        self.verified = LRUCache(maxsize, ttl)
+
+    def encode(self, claims: dict) -> str:
+        return self.backend.encode(claims)
+
+    def decode(self, token: str) -> dict:
+        found, claims = self.verified.get(token)
+        if found and ("exp" not in claims or claims["exp"] > time.time()):
+            return dict(claims)
+        claims = self.backend.decode(token)
+        self.verified.set(token, claims)
+        return dict(claims)
+
+
+def _pem(key) -> bytes:
+    return key.encode() if isinstance(key, str) else key
+
+
+def _read_key(path: Optional[str]) -> Optional[bytes]:
+    return Path(path).read_bytes() if path else None
+
+
+BACKENDS = {"jose": JoseBackend, "native": NativeBackend}
+
+
+def create_backend() -> JWTBackend:
+    """
+    Builds the JWT backend from the settings.
+
+    ``jwt_backend`` selects the implementation. HMAC algorithms sign with ``secret_key``;
+    ES256 and EdDSA read PEM keys from ``jwt_private_key_file`` and ``jwt_public_key_file``,
+    either of which may be omitted (signing only, or verification only). A positive
+    ``jwt_cache_size`` adds a cache of verified tokens.
+
+    :return: The backend.
+    :rtype: JWTBackend
+    """
+    if settings.algorithm in HMAC_ALGORITHMS:
+        signing_key, verifying_key = settings.secret_key, None
+    else:
+        signing_key, verifying_key = _read_key(settings.jwt_private_key_file), _read_key(settings.jwt_public_key_file)
+    backend = BACKENDS[settings.jwt_backend](settings.algorithm, signing_key, verifying_key)
+    if settings.jwt_cache_size > 0:
+        backend = CachingBackend(backend, settings.jwt_cache_size, settings.jwt_cache_ttl)
+    return backend
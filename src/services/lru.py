@@ -0,0 +1,73 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Tuple
+
+
+class LRUCache:
+    """
+    A bounded in-process cache with least-recently-used eviction and a per-entry TTL.
+
+    Attributes:
+        maxsize (int): The maximum number of entries.
+        ttl (float): The lifetime of an entry in seconds.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """
+        Looks up a key, dropping it if it has expired.
+
+        :param key: The key to look up.
+        :type key: Hashable
+        :return: Whether the key was found, and its value.
+        :rtype: Tuple[bool, Any]
+        """
+        entry = self._data.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """
+        Stores a value, evicting the least recently used entry if the cache is full.
+
+        :param key: The key to store.
+        :type key: Hashable
+        :param value: The value to store.
+        :type value: Any
+        :return: None
+        """
+        self._data[key] = (time.monotonic() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable) -> None:
+        """
+        Removes a key if it is present.
+
+        :param key: The key to remove.
+        :type key: Hashable
+        :return: None
+        """
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        """
+        Removes all entries.
+
+        :return: None
+        """
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -0,0 +1,371 @@
+import time
+from contextvars import ContextVar
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+INF_LABEL = 'le="+Inf"'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: Tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class Counter:
+    """
+    A monotonically increasing value per label set.
+
+    Attributes:
+        name (str): The metric name.
+        documentation (str): The help text.
+        labelnames (Tuple[str, ...]): The names of the labels.
+    """
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        """
+        Increases the value of a label set.
+
+        :param labels: The label values, in the order of ``labelnames``.
+        :param amount: The increment.
+        :type amount: float
+        :return: None
+        """
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+                for labels, value in sorted(self._values.items())]
+
+
+class Gauge:
+    """
+    A value per label set that can go up and down.
+
+    Attributes:
+        name (str): The metric name.
+        documentation (str): The help text.
+        labelnames (Tuple[str, ...]): The names of the labels.
+    """
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+
+    def set(self, value: float, *labels) -> None:
+        """
+        Sets the value of a label set.
+
+        :param value: The value.
+        :type value: float
+        :param labels: The label values, in the order of ``labelnames``.
+        :return: None
+        """
+        self._values[labels] = value
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+                for labels, value in sorted(self._values.items())]
+
+
+class Histogram:
+    """
+    Observations counted into cumulative buckets per label set, with their sum and count.
+
+    Attributes:
+        name (str): The metric name.
+        documentation (str): The help text.
+        labelnames (Tuple[str, ...]): The names of the labels.
+        buckets (Tuple[float, ...]): The upper bounds of the buckets, without ``+Inf``.
+    """
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple, list] = {}
+
+    def observe(self, value: float, *labels) -> None:
+        """
+        Records an observation.
+
+        :param value: The observed value.
+        :type value: float
+        :param labels: The label values, in the order of ``labelnames``.
+        :return: None
+        """
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+        counts = state[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        state[1] += value
+        state[2] += 1
+
+    def count(self, *labels) -> int:
+        state = self._values.get(labels)
+        return state[2] if state else 0
+
+    def samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, INF_LABEL)} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Registry:
+    """
+    The metrics of this process, rendered in the Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """
+        Renders all metrics.
+
+        :return: The Prometheus text format (version 0.0.4).
+        :rtype: str
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route, method and status.", ("route", "method", "status")))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route, until the last body byte is sent.",
+    ("route", "method")))
+http_request_db_queries = registry.register(Histogram(
+    "http_request_db_queries", "Database queries per HTTP request by route.", ("route", "method"),
+    QUERY_COUNT_BUCKETS))
+http_request_db_duration = registry.register(Histogram(
+    "http_request_db_duration_seconds", "Database time per HTTP request by route.", ("route", "method")))
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds", "Database statement execution time by statement type.", ("statement",), DB_BUCKETS))
+redis_commands = registry.register(Counter(
+    "redis_commands_total", "Redis commands by command and outcome.", ("command", "outcome")))
+redis_command_duration = registry.register(Histogram(
+    "redis_command_duration_seconds", "Redis command latency by command.", ("command",), DB_BUCKETS))
+
+db_pool_checkout_duration = registry.register(Histogram(
+    "db_pool_checkout_duration_seconds",
+    "Time to check out a database connection, waiting for a free one or opening a new one.", (), DB_BUCKETS))
+db_pool_timeouts = registry.register(Counter(
+    "db_pool_timeouts_total", "Database connection checkouts that gave up waiting for a free connection."))
+db_pool_connections = registry.register(Gauge(
+    "db_pool_connections", "Database pool connections by state.", ("state",)))
+db_pool_saturation = registry.register(Gauge(
+    "db_pool_saturation", "Checked out database connections as a share of pool_size + max_overflow."))
+
+
+class RequestStats:
+    """
+    The database activity of the current request.
+
+    Attributes:
+        path (str): The request path, for log messages.
+        queries (int): The number of statements executed.
+        db_time (float): The time spent executing them, in seconds.
+        statements (Dict[str, int]): How many times each statement text was executed.
+        budget (Optional[int]): The maximum number of statements the route should need.
+    """
+    __slots__ = ("path", "queries", "db_time", "statements", "budget")
+
+    def __init__(self, path: str = ""):
+        self.path = path
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements: Dict[str, int] = {}
+        self.budget: Optional[int] = None
+
+
+request_stats: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording the latency, status and database activity of every HTTP request,
+    labelled with the route template (e.g. ``/api/contacts/{contact_id}``).
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats(scope["path"])
+        token = request_stats.set(stats)
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            request_stats.reset(token)
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            http_requests.inc(path, method, str(status_code))
+            http_request_duration.observe(elapsed, path, method)
+            http_request_db_queries.observe(stats.queries, path, method)
+            http_request_db_duration.observe(stats.db_time, path, method)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Times every statement run on an engine and adds it to the statistics of the current request.
+
+    :param engine: The engine; for an ``AsyncEngine`` pass its ``sync_engine``.
+    :type engine: Engine
+    :return: None
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        db_query_duration.observe(elapsed, statement.lstrip().split(None, 1)[0].upper())
+        stats = request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.db_time += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        starts = context.connection.info.get("query_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    The asyncio queue pool, recording how long checkouts take, how many time out and how much
+    of the pool is in use.
+    """
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            db_pool_timeouts.inc()
+            raise
+        finally:
+            db_pool_checkout_duration.observe(time.perf_counter() - start)
+            self._report()
+
+    def _do_return_conn(self, record) -> None:
+        super()._do_return_conn(record)
+        self._report()
+
+    def _report(self) -> None:
+        in_use = self.checkedout()
+        db_pool_connections.set(in_use, "in_use")
+        db_pool_connections.set(self.checkedin(), "idle")
+        db_pool_connections.set(max(self.overflow(), 0), "overflow")
+        if self._max_overflow >= 0:
+            db_pool_saturation.set(in_use / (self.size() + self._max_overflow))
+
+
+def _timed(execute, command: Optional[str] = None):
+    async def timed_execute(*args, **options):
+        name = command or str(args[0]).upper()
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            result = await execute(*args, **options)
+            outcome = "ok"
+            return result
+        finally:
+            redis_commands.inc(name, outcome)
+            redis_command_duration.observe(time.perf_counter() - start, name)
+    return timed_execute
+
+
+def instrument_redis(client) -> None:
+    """
+    Counts and times the commands sent through a ``redis.asyncio.Redis`` client.
+
+    A pipeline is counted as one ``PIPELINE`` command.
+
+    :param client: The client to instrument.
+    :return: None
+    """
+    pipeline = client.pipeline
+
+    def instrumented_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        pipe.execute = _timed(pipe.execute, "PIPELINE")
+        return pipe
+
+    client.execute_command = _timed(client.execute_command)
+    client.pipeline = instrumented_pipeline
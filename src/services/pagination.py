@@ -0,0 +1,33 @@
+import base64
+import json
+from typing import Any
+
+
+def encode_cursor(value: Any) -> str:
+    """
+    Encodes a pagination position into an opaque, URL-safe cursor string.
+
+    :param value: The JSON-serializable position (e.g. the last seen contact ID).
+    :type value: Any
+    :return: The opaque cursor.
+    :rtype: str
+    """
+    raw = json.dumps(value, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> Any:
+    """
+    Decodes a cursor produced by :func:`encode_cursor`.
+
+    :param cursor: The opaque cursor received from the client.
+    :type cursor: str
+    :return: The decoded position.
+    :rtype: Any
+    :raises ValueError: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        return json.loads(raw)
+    except (ValueError, TypeError) as err:
+        raise ValueError("Invalid cursor") from err
@@ -0,0 +1,134 @@
+import logging
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, Engine
+
+from src.conf.config import settings
+from src.services.metrics import Counter, RequestStats, registry, request_stats
+
+logger = logging.getLogger(__name__)
+
+db_query_warnings = registry.register(Counter(
+    "db_query_warnings_total", "Slow statements, repeated statements and exceeded query budgets.", ("kind",)))
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Raised in strict mode when a request runs more statements than its budget allows.
+    """
+
+
+def explain(conn: Connection, statement: str, parameters) -> str:
+    """
+    Returns the query plan of a statement, run on a raw cursor so that it is not instrumented itself.
+
+    :param conn: The connection the statement ran on.
+    :type conn: Connection
+    :param statement: The statement, as sent to the driver.
+    :type statement: str
+    :param parameters: The parameters of the statement.
+    :return: The plan, one line per step.
+    :rtype: str
+    """
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return "\n".join(str(row[-1]) for row in cursor.fetchall())
+    finally:
+        cursor.close()
+
+
+def instrument_profiling(engine: Engine) -> None:
+    """
+    Watches the statements run on an engine:
+
+    * statements slower than ``slow_query_ms`` are logged, SELECTs with their plan when
+      ``slow_query_explain`` is set;
+    * a statement executed ``n_plus_one_threshold`` times in one request is logged as a
+      likely N+1 query;
+    * a request running more statements than its :class:`QueryBudget` is logged, or fails
+      with :class:`QueryBudgetExceeded` when ``query_budget_strict`` is set.
+
+    Must be called after :func:`src.services.metrics.instrument_engine`, which counts the statements.
+
+    :param engine: The engine; for an ``AsyncEngine`` pass its ``sync_engine``.
+    :type engine: Engine
+    :return: None
+    """
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("profile_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["profile_start"].pop()) * 1000
+        if settings.slow_query_ms is not None and elapsed_ms >= settings.slow_query_ms:
+            db_query_warnings.inc("slow")
+            plan = ""
+            if settings.slow_query_explain and not executemany and statement.lstrip()[:6].upper() == "SELECT":
+                try:
+                    plan = "\nPlan:\n" + explain(conn, statement, parameters)
+                except Exception as err:
+                    plan = f"\nPlan unavailable: {err}"
+            logger.warning("Slow query (%.1f ms):\n%s%s", elapsed_ms, statement, plan)
+
+        stats = request_stats.get()
+        if stats is None:
+            return
+        count = stats.statements[statement] = stats.statements.get(statement, 0) + 1
+        if count == settings.n_plus_one_threshold:
+            db_query_warnings.inc("repeated")
+            logger.warning("Statement executed %s times in %s, likely an N+1 query:\n%s", count, stats.path, statement)
+        if stats.budget is not None and stats.queries == stats.budget + 1:
+            db_query_warnings.inc("budget")
+            message = f"{stats.path} ran more than its budget of {stats.budget} statements"
+            if settings.query_budget_strict:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        starts = context.connection.info.get("profile_start") if context.connection is not None else None
+        if starts:
+            starts.pop()
+
+
+class QueryBudget:
+    """
+    A FastAPI dependency setting the maximum number of statements a route should run per request.
+
+    Attributes:
+        max_queries (Optional[int]): The budget, or None for no budget.
+    """
+
+    def __init__(self, max_queries: Optional[int]):
+        self.max_queries = max_queries
+
+    async def __call__(self) -> None:
+        stats = request_stats.get()
+        if stats is not None:
+            stats.budget = self.max_queries
+
+
+@contextmanager
+def track_queries(budget: Optional[int] = None) -> Iterator[RequestStats]:
+    """
+    Collects the statements run inside the block, as a request would, for tests and scripts.
+
+    :param budget: The maximum number of statements, enforced as for a request.
+    :type budget: Optional[int]
+    :return: The statistics, filled in as statements run.
+    :rtype: Iterator[RequestStats]
+    """
+    stats = RequestStats("track_queries")
+    stats.budget = budget
+    token = request_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        request_stats.reset(token)
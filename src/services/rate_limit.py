@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import math
+import time
+from typing import Optional, Tuple
+
+from fastapi import Depends, HTTPException, Request, status
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.database.redis import pipelined
+from src.database.models import User
+from src.services.auth import auth_service
+from src.services.lru import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def parse_policy(policy: Optional[str]) -> Optional[Tuple[int, int]]:
+    """
+    Parses a ``"<times>/<seconds>"`` rate limit policy.
+
+    :param policy: The policy, e.g. ``"10/60"``. An empty value disables the limit.
+    :type policy: Optional[str]
+    :return: The number of requests allowed per window and the window length, or None.
+    :rtype: Optional[Tuple[int, int]]
+    :raises ValueError: If the policy is malformed.
+    """
+    if not policy:
+        return None
+    times, _, seconds = policy.partition("/")
+    times, seconds = int(times), int(seconds)
+    if times < 1 or seconds < 1:
+        raise ValueError(f"Invalid rate limit policy: {policy!r}")
+    return times, seconds
+
+
+class _Bucket:
+    """
+    The tokens a worker has leased for one identity and one window.
+    """
+    __slots__ = ("window", "tokens", "exhausted", "lease")
+
+    def __init__(self, window: int):
+        self.window = window
+        self.tokens = 0
+        self.exhausted = False
+        self.lease: Optional[asyncio.Task] = None
+
+
+class RateLimiter:
+    """
+    A FastAPI dependency limiting requests per client IP with a local token bucket.
+
+    The global quota is a fixed-window counter in Redis. Instead of a round trip per request,
+    each worker leases tokens from it in chunks of ``rate_limit_lease`` (a fraction of the
+    quota) and spends them locally. The next chunk is leased in the background when the bucket
+    runs low, so most requests cost no network at all. Leased tokens a worker does not use are
+    lost when the window ends, which makes the limit slightly stricter, never looser. If Redis
+    is unavailable the limiter fails open.
+
+    The policy is read from ``settings.rate_limits[name]``; without one the dependency does nothing.
+
+    Attributes:
+        name (str): The name of the policy, also used in the Redis keys.
+        times (int): The number of requests allowed per window.
+        seconds (int): The length of the window.
+        lease_size (int): The number of tokens leased from Redis at once.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        policy = parse_policy(settings.rate_limits.get(name))
+        self.times, self.seconds = policy or (0, 0)
+        self.lease_size = max(1, math.ceil(self.times * settings.rate_limit_lease))
+        self.buckets = LRUCache(settings.rate_limit_local_size, self.seconds)
+
+    @property
+    def enabled(self) -> bool:
+        return self.times > 0
+
+    async def _lease(self, identity: str, bucket: _Bucket) -> None:
+        key = f"ratelimit:{self.name}:{identity}:{bucket.window}"
+        try:
+            count, _ = await pipelined(auth_service.r, ("INCRBY", key, self.lease_size), ("EXPIRE", key, self.seconds))
+            count = int(count)
+            granted = min(self.lease_size, max(0, self.times - (count - self.lease_size)))
+        except RedisError as err:
+            logger.warning("Rate limit lease failed for %s: %s", self.name, err)
+            granted = self.lease_size
+        bucket.tokens += granted
+        bucket.exhausted = granted < self.lease_size
+        bucket.lease = None
+
+    async def acquire(self, identity: str) -> Tuple[bool, int]:
+        """
+        Takes a token for a request.
+
+        :param identity: The client the request is counted against.
+        :type identity: str
+        :return: Whether the request is allowed, and the seconds until the window ends.
+        :rtype: Tuple[bool, int]
+        """
+        now = time.time()
+        window = int(now // self.seconds)
+        retry_after = math.ceil((window + 1) * self.seconds - now)
+        found, bucket = self.buckets.get(identity)
+        if not found or bucket.window != window:
+            bucket = _Bucket(window)
+            self.buckets.set(identity, bucket)
+        elif bucket.lease is not None and bucket.lease.get_loop() is not asyncio.get_running_loop():
+            # A lease started on an event loop that has since been closed will never finish.
+            bucket.lease = None
+        if bucket.tokens <= 0:
+            if bucket.exhausted:
+                return False, retry_after
+            if bucket.lease is None:
+                bucket.lease = asyncio.create_task(self._lease(identity, bucket))
+            await asyncio.shield(bucket.lease)
+            if bucket.tokens <= 0:
+                return False, retry_after
+        bucket.tokens -= 1
+        if bucket.tokens <= self.lease_size // 2 and not bucket.exhausted and bucket.lease is None:
+            bucket.lease = asyncio.create_task(self._lease(identity, bucket))
+        return True, retry_after
+
+    async def check(self, identity: str) -> None:
+        """
+        Rejects the request if the client has used up its quota.
+
+        :param identity: The client the request is counted against.
+        :type identity: str
+        :return: None
+        :raises HTTPException: 429 with a ``Retry-After`` header if the quota is used up.
+        """
+        if not self.enabled:
+            return
+        allowed, retry_after = await self.acquire(identity)
+        if not allowed:
+            raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too Many Requests",
+                                headers={"Retry-After": str(retry_after)})
+
+    async def __call__(self, request: Request) -> None:
+        await self.check(request.client.host if request.client else "unknown")
+
+
+class UserRateLimiter(RateLimiter):
+    """
+    A :class:`RateLimiter` counting the requests of each authenticated user.
+    """
+
+    async def __call__(self, current_user: User = Depends(auth_service.get_current_user)) -> None:
+        await self.check(f"user:{current_user.id}")
@@ -0,0 +1,106 @@
+import logging
+import uuid
+from typing import Optional
+
+from fastapi import HTTPException, status
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.services.auth import auth_service
+
+logger = logging.getLogger(__name__)
+
+
+def _token_key(jti: str) -> str:
+    return f"refresh:token:{jti}"
+
+
+def _family_key(family: str) -> str:
+    return f"refresh:family:{family}"
+
+
+class RefreshTokenStore:
+    """
+    Keeps the valid refresh tokens in Redis instead of the ``users`` table.
+
+    Every refresh token carries a random ID (``jti``) and the ID of its family (``fam``), the
+    chain of tokens descending from one login. ``refresh:token:{jti}`` exists while the token
+    is valid, and ``refresh:family:{fam}`` points to the latest token of the family; both expire
+    with the token after ``refresh_token_ttl`` seconds.
+
+    A token is consumed with an atomic ``GETDEL``, so it can be rotated once. Presenting it
+    again is taken as a sign that it leaked: the whole family is revoked, logging out both the
+    legitimate client and the attacker.
+    """
+
+    async def issue(self, email: str, family: Optional[str] = None) -> dict:
+        """
+        Creates an access token and a stored refresh token. The access token carries the family
+        ID too, so that logging out can revoke the refresh tokens along with it.
+
+        :param email: The email of the user.
+        :type email: str
+        :param family: The family to extend, or None to start a new one (at login).
+        :type family: Optional[str]
+        :return: The access token, the refresh token and the token type.
+        :rtype: dict
+        :raises HTTPException: If Redis is unavailable.
+        """
+        jti, family = uuid.uuid4().hex, family or uuid.uuid4().hex
+        refresh_token = await auth_service.create_refresh_token(data={"sub": email, "jti": jti, "fam": family},
+                                                                expires_delta=settings.refresh_token_ttl)
+        pipe = auth_service.r.pipeline(transaction=True)
+        pipe.set(_token_key(jti), family, ex=settings.refresh_token_ttl)
+        pipe.set(_family_key(family), jti, ex=settings.refresh_token_ttl)
+        try:
+            await pipe.execute()
+        except RedisError as err:
+            logger.error("Refresh token store write failed: %s", err)
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Token store unavailable")
+        access_token = await auth_service.create_access_token(data={"sub": email, "fam": family})
+        return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+    async def rotate(self, refresh_token: str) -> dict:
+        """
+        Consumes a refresh token and issues its successor in the same family.
+
+        :param refresh_token: The refresh token presented by the client.
+        :type refresh_token: str
+        :return: The access token, the refresh token and the token type.
+        :rtype: dict
+        :raises HTTPException: If the token is invalid, already used or revoked, or if Redis is unavailable.
+        """
+        claims = await auth_service.decode_refresh_claims(refresh_token)
+        jti, family = claims.get("jti"), claims.get("fam")
+        if not jti or not family:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+        try:
+            stored = await auth_service.r.getdel(_token_key(jti))
+        except RedisError as err:
+            logger.error("Refresh token store read failed: %s", err)
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Token store unavailable")
+        if stored is None:
+            logger.warning("Refresh token %s of %s reused or revoked, revoking its family", jti, claims["sub"])
+            await self.revoke_family(family)
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token")
+        return await self.issue(claims["sub"], family)
+
+    async def revoke_family(self, family: str) -> None:
+        """
+        Invalidates the latest token of a family, and with it the family.
+
+        :param family: The family ID.
+        :type family: str
+        :return: None
+        :raises HTTPException: If Redis is unavailable.
+        """
+        try:
+            jti = await auth_service.r.getdel(_family_key(family))
+            if jti is not None:
+                await auth_service.r.delete(_token_key(jti.decode() if isinstance(jti, bytes) else jti))
+        except RedisError as err:
+            logger.error("Refresh token family revocation failed: %s", err)
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Token store unavailable")
+
+
+refresh_tokens = RefreshTokenStore()
@@ -0,0 +1,267 @@
+import asyncio
+import hashlib
+import logging
+import math
+import time
+from typing import Callable, Dict, Iterable, Optional
+
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+
+from src.conf.config import settings
+from src.database.redis import pipelined
+from src.services.metrics import Counter, registry
+
+logger = logging.getLogger(__name__)
+
+REVOKED_KEY = "tokens:revoked"
+REVOCATION_CHANNEL = "tokens:revoked"
+REVOKED_USERS_KEY = "tokens:revoked_users"
+USER_REVOCATION_CHANNEL = "tokens:revoked_users"
+
+revocation_checks = registry.register(Counter(
+    "token_revocation_checks_total", "Access token revocation checks by outcome.", ("result",)))
+
+
+class BloomFilter:
+    """
+    A fixed-size set membership filter with no false negatives and a bounded rate of false
+    positives. Members cannot be removed; the filter is rebuilt instead.
+
+    Attributes:
+        size (int): The number of bits.
+        hashes (int): The number of bits set per member.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str) -> Iterable[int]:
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hashes))
+
+    def add(self, item: str) -> None:
+        """
+        Adds a member.
+
+        :param item: The member.
+        :type item: str
+        :return: None
+        """
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class RevocationList:
+    """
+    The IDs (``jti``) of access tokens revoked before their expiry.
+
+    Revoked IDs are kept in the Redis sorted set :data:`REVOKED_KEY`, scored by the expiry of
+    the token, and announced on :data:`REVOCATION_CHANNEL`. While a worker is subscribed it
+    mirrors the set in a :class:`BloomFilter`, so that checking a token that was not revoked
+    needs no Redis round trip; only a filter hit is confirmed against Redis. The filter is
+    rebuilt every ``revocation_rebuild_interval`` seconds to drop expired tokens. When the
+    worker is not subscribed every check goes to Redis, and when Redis is unavailable tokens
+    are accepted.
+
+    Every token of a user is revoked at once (forced sign-out) by recording the time of the
+    revocation in the sorted set :data:`REVOKED_USERS_KEY`, keyed by the subject of the tokens:
+    tokens issued up to then are rejected. The times are announced on
+    :data:`USER_REVOCATION_CHANNEL` and mirrored in a dict the same way, and dropped once the
+    longest-lived token they may apply to (a refresh token) has expired.
+
+    Attributes:
+        client (Callable[[], redis.Redis]): Returns the Redis client to use.
+        bloom (BloomFilter): The in-process mirror of the revoked IDs.
+        revoked_users (Dict[str, float]): The in-process mirror of the user revocation times.
+        subscribed (bool): Whether the mirrors are kept up to date.
+    """
+
+    def __init__(self, client: Callable[[], redis.Redis]):
+        self.client = client
+        self.bloom = BloomFilter(settings.revocation_capacity, settings.revocation_error_rate)
+        self.revoked_users: Dict[str, float] = {}
+        self.subscribed = False
+        self._listener: Optional[asyncio.Task] = None
+
+    async def revoke(self, jti: str, expires_at: float) -> None:
+        """
+        Revokes an access token until it expires and tells the other workers about it.
+
+        :param jti: The ID of the token.
+        :type jti: str
+        :param expires_at: The expiry of the token, as a Unix timestamp.
+        :type expires_at: float
+        :return: None
+        :raises RedisError: If the revocation could not be stored.
+        """
+        await pipelined(self.client(), ("ZADD", REVOKED_KEY, expires_at, jti), ("PUBLISH", REVOCATION_CHANNEL, jti))
+        self.bloom.add(jti)
+
+    async def is_revoked(self, jti: Optional[str]) -> bool:
+        """
+        Checks whether an access token was revoked.
+
+        :param jti: The ID of the token.
+        :type jti: Optional[str]
+        :return: True if the token was revoked and has not expired yet.
+        :rtype: bool
+        """
+        if jti is None:
+            return False
+        if self.subscribed and jti not in self.bloom:
+            revocation_checks.inc("filtered")
+            return False
+        try:
+            score = await self.client().zscore(REVOKED_KEY, jti)
+        except RedisError as err:
+            logger.warning("Token revocation check failed: %s", err)
+            revocation_checks.inc("error")
+            return False
+        revoked = score is not None and float(score) > time.time()
+        revocation_checks.inc("revoked" if revoked else "false_positive" if self.subscribed else "lookup")
+        return revoked
+
+    async def revoke_user(self, subject: str) -> float:
+        """
+        Revokes every token of a user issued until now and tells the other workers about it.
+
+        :param subject: The subject (``sub``) of the tokens, the email of the user.
+        :type subject: str
+        :return: The time of the revocation, as a Unix timestamp.
+        :rtype: float
+        :raises RedisError: If the revocation could not be stored.
+        """
+        revoked_at = time.time()
+        await pipelined(self.client(), ("ZADD", REVOKED_USERS_KEY, revoked_at, subject),
+                        ("PUBLISH", USER_REVOCATION_CHANNEL, f"{revoked_at}:{subject}"))
+        self._set_revoked_user(subject, revoked_at)
+        return revoked_at
+
+    async def is_user_revoked(self, subject: Optional[str], issued_at: Optional[float]) -> bool:
+        """
+        Checks whether a token was issued before every token of its user was revoked.
+
+        ``iat`` has a resolution of one second, so a token issued within the second of the
+        revocation is rejected as well.
+
+        :param subject: The subject (``sub``) of the token.
+        :type subject: Optional[str]
+        :param issued_at: The issue time (``iat``) of the token, as a Unix timestamp.
+        :type issued_at: Optional[float]
+        :return: True if the token was issued no later than the last revocation of its user.
+        :rtype: bool
+        """
+        if subject is None or issued_at is None:
+            return False
+        if self.subscribed:
+            revoked_at = self.revoked_users.get(subject)
+        else:
+            try:
+                revoked_at = await self.client().zscore(REVOKED_USERS_KEY, subject)
+            except RedisError as err:
+                logger.warning("User token revocation check failed: %s", err)
+                revocation_checks.inc("error")
+                return False
+        return revoked_at is not None and float(issued_at) <= float(revoked_at)
+
+    def _set_revoked_user(self, subject: str, revoked_at: float) -> None:
+        if revoked_at > self.revoked_users.get(subject, 0.0):
+            self.revoked_users[subject] = revoked_at
+
+    def _on_user_message(self, data: str) -> None:
+        revoked_at, _, subject = data.partition(":")
+        try:
+            self._set_revoked_user(subject, float(revoked_at))
+        except ValueError:
+            logger.warning("Ignoring malformed user revocation message: %r", data)
+
+    async def rebuild(self) -> None:
+        """
+        Drops the expired IDs and user revocations from Redis and reloads the mirrors from the
+        remaining ones.
+
+        :return: None
+        """
+        r = self.client()
+        now = time.time()
+        await r.zremrangebyscore(REVOKED_KEY, "-inf", now)
+        bloom = BloomFilter(settings.revocation_capacity, settings.revocation_error_rate)
+        for jti in await r.zrangebyscore(REVOKED_KEY, now, "+inf"):
+            bloom.add(jti.decode() if isinstance(jti, bytes) else jti)
+        if bloom.count > settings.revocation_capacity:
+            logger.warning("%s revoked tokens exceed the filter capacity of %s", bloom.count, settings.revocation_capacity)
+        self.bloom = bloom
+
+        oldest = now - settings.refresh_token_ttl
+        await r.zremrangebyscore(REVOKED_USERS_KEY, "-inf", f"({oldest}")
+        self.revoked_users = {
+            subject.decode() if isinstance(subject, bytes) else subject: float(revoked_at)
+            for subject, revoked_at in await r.zrangebyscore(REVOKED_USERS_KEY, oldest, "+inf", withscores=True)
+        }
+
+    async def listen(self) -> None:
+        """
+        Mirrors the revoked IDs and user revocations, reconnecting after failures.
+
+        The mirrors are loaded after subscribing, so that no revocation is missed in between.
+
+        :return: None
+        """
+        while True:
+            pubsub = self.client().pubsub()
+            try:
+                await pubsub.subscribe(REVOCATION_CHANNEL, USER_REVOCATION_CHANNEL)
+                await self.rebuild()
+                self.subscribed = True
+                rebuilt_at = time.monotonic()
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is not None and message["type"] == "message":
+                        channel, data = message["channel"], message["data"]
+                        channel = channel.decode() if isinstance(channel, bytes) else channel
+                        data = data.decode() if isinstance(data, bytes) else data
+                        if channel == USER_REVOCATION_CHANNEL:
+                            self._on_user_message(data)
+                        else:
+                            self.bloom.add(data)
+                    if time.monotonic() - rebuilt_at >= settings.revocation_rebuild_interval:
+                        await self.rebuild()
+                        rebuilt_at = time.monotonic()
+            except RedisError as err:
+                logger.warning("Token revocation subscription lost: %s", err)
+            finally:
+                self.subscribed = False
+                await pubsub.aclose()
+            await asyncio.sleep(1)
+
+    def start(self) -> None:
+        """
+        Starts the revocation listener in the background.
+
+        :return: None
+        """
+        if self._listener is None:
+            self._listener = asyncio.create_task(self.listen())
+
+    async def stop(self) -> None:
+        """
+        Stops the revocation listener.
+
+        :return: None
+        """
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
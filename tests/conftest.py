@@ -1,11 +1,18 @@
 import pytest
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 
 from main import app
 from src.database.models import Base
-from src.database.db import get_db
+from src.database.db import get_db, get_async_url
+from src.database.redis import create_redis
+from src.conf.config import settings
+from src.services.auth import auth_service
+from src.services.metrics import instrument_engine
+from src.services.profiling import instrument_profiling
 
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"
@@ -15,6 +22,20 @@ engine = create_engine(
 )
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The application talks to the same file through aiosqlite. TestClient runs every request
+# in its own event loop, so connections must not be pooled between requests.
+async_engine = create_async_engine(get_async_url(SQLALCHEMY_DATABASE_URL), poolclass=NullPool)
+instrument_engine(async_engine.sync_engine)
+instrument_profiling(async_engine.sync_engine)
+
+# TestClient is not entered, so the lifespan handler does not create the Redis client. Tests
+# that do not patch it talk to an unreachable server, which every caller tolerates.
+auth_service.r = create_redis()
+
+# Routes running more statements than their QueryBudget fail the tests.
+settings.query_budget_strict = True
+AsyncTestingSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 
 @pytest.fixture(scope="module")
 def session():
@@ -34,11 +55,9 @@ def session():
 def client(session):
     # Dependency override
 
-    def override_get_db():
-        try:
-            yield session
-        finally:
-            session.close()
+    async def override_get_db():
+        async with AsyncTestingSessionLocal() as db:
+            yield db
 
     app.dependency_overrides[get_db] = override_get_db
 
@@ -47,4 +66,22 @@ def client(session):
 
 @pytest.fixture(scope="module")
 def user():
-    return {"username": "deadpool", "email": "deadpool@example.com", "password": "123456789"}
\ No newline at end of file
+    return {"username": "deadpool", "email": "deadpool@example.com", "password": "123456789"}
+
+
+@pytest.fixture()
+def sql_statements():
+    # Records every SQL statement the application sends, and "COMMIT" for each commit.
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def commit(conn):
+        statements.append("COMMIT")
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(async_engine.sync_engine, "commit", commit)
+    yield statements
+    event.remove(async_engine.sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.remove(async_engine.sync_engine, "commit", commit)
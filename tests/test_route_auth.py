@@ -1,6 +1,19 @@
-from unittest.mock import MagicMock
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock, patch
+
+import pytest
+from fakeredis import FakeAsyncRedis
+from passlib.context import CryptContext
+from passlib.hash import bcrypt
 
 from src.database.models import User
+from src.services.auth import auth_service
+
+
+@pytest.fixture()
+def fake_redis():
+    with patch.object(auth_service, 'r', FakeAsyncRedis()) as r:
+        yield r
 
 
 def test_create_user(client, user, monkeypatch):
@@ -36,7 +49,7 @@ def test_login_user_not_confirmed(client, user):
     assert data["detail"] == "Email not confirmed"
 
 
-def test_login_user(client, session, user):
+def test_login_user(client, session, user, fake_redis):
     current_user: User = session.query(User).filter(User.email == user.get('email')).first()
     current_user.confirmed = True
     session.commit()
@@ -49,6 +62,95 @@ def test_login_user(client, session, user):
     assert data["token_type"] == "bearer"
 
 
+def test_login_rehashes_deprecated_password(client, session, user, fake_redis):
+    current_user: User = session.query(User).filter(User.email == user.get('email')).first()
+    current_user.password = bcrypt.using(rounds=4).hash(user.get('password'))
+    session.commit()
+    strict_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=5, bcrypt__min_rounds=5)
+    with patch.object(auth_service, 'pwd_context', strict_context):
+        response = client.post(
+            "/api/auth/login",
+            data={"username": user.get('email'), "password": user.get('password')},
+        )
+    assert response.status_code == 200, response.text
+    session.expire_all()
+    current_user = session.query(User).filter(User.email == user.get('email')).first()
+    assert bcrypt.from_string(current_user.password).rounds == 5
+
+
+def test_refresh_token_rotation(client, user, fake_redis, sql_statements):
+    response = client.post(
+        "/api/auth/login",
+        data={"username": user.get('email'), "password": user.get('password')},
+    )
+    assert response.status_code == 200, response.text
+    assert not [s for s in sql_statements if s.split()[0] == "UPDATE"]
+    first = response.json()["refresh_token"]
+
+    del sql_statements[:]
+    response = client.get("/api/auth/refresh_token", headers={"Authorization": f"Bearer {first}"})
+    assert response.status_code == 200, response.text
+    assert sql_statements == []
+    second = response.json()["refresh_token"]
+    assert second != first
+
+    # Reusing a rotated token revokes the whole family, including its latest token.
+    response = client.get("/api/auth/refresh_token", headers={"Authorization": f"Bearer {first}"})
+    assert response.status_code == 401, response.text
+    assert response.json()["detail"] == "Invalid refresh token"
+    response = client.get("/api/auth/refresh_token", headers={"Authorization": f"Bearer {second}"})
+    assert response.status_code == 401, response.text
+
+
+def test_refresh_token_rejects_access_token(client, user, fake_redis):
+    response = client.post(
+        "/api/auth/login",
+        data={"username": user.get('email'), "password": user.get('password')},
+    )
+    access_token = response.json()["access_token"]
+    response = client.get("/api/auth/refresh_token", headers={"Authorization": f"Bearer {access_token}"})
+    assert response.status_code == 401, response.text
+
+
+def test_logout_revokes_tokens(client, user, fake_redis):
+    response = client.post(
+        "/api/auth/login",
+        data={"username": user.get('email'), "password": user.get('password')},
+    )
+    tokens = response.json()
+    headers = {"Authorization": f"Bearer {tokens['access_token']}"}
+    assert client.get("/api/users/me/", headers=headers).status_code == 200
+
+    response = client.post("/api/auth/logout", headers=headers)
+    assert response.status_code == 204, response.text
+    assert client.get("/api/users/me/", headers=headers).status_code == 401
+    response = client.get("/api/auth/refresh_token", headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+    assert response.status_code == 401, response.text
+
+
+def test_logout_without_token_id(client, user, fake_redis):
+    token = auth_service.jwt.encode({"sub": user.get('email'), "scope": "access_token",
+                                     "exp": datetime.utcnow() + timedelta(minutes=15)})
+    response = client.post("/api/auth/logout", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 401, response.text
+    assert response.json()["detail"] == "Token cannot be revoked"
+
+
+def test_logout_all_revokes_every_session(client, user, fake_redis):
+    sessions = [
+        client.post("/api/auth/login", data={"username": user.get('email'), "password": user.get('password')}).json()
+        for _ in range(2)
+    ]
+    headers = {"Authorization": f"Bearer {sessions[0]['access_token']}"}
+    response = client.post("/api/auth/logout_all", headers=headers)
+    assert response.status_code == 204, response.text
+    for tokens in sessions:
+        response = client.get("/api/users/me/", headers={"Authorization": f"Bearer {tokens['access_token']}"})
+        assert response.status_code == 401, response.text
+        response = client.get("/api/auth/refresh_token", headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+        assert response.status_code == 401, response.text
+
+
 def test_login_wrong_password(client, user):
     response = client.post(
         "/api/auth/login",
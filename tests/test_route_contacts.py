@@ -1,9 +1,19 @@
-from unittest.mock import MagicMock, patch
+import pickle
+from datetime import date, timedelta
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+from fakeredis import FakeAsyncRedis
 
 from src.database.models import User
 from src.services.auth import auth_service
+from src.conf.config import settings
+
+
+def redis_mock():
+    r_mock = AsyncMock()
+    r_mock.pipeline = MagicMock(return_value=MagicMock(execute=AsyncMock(return_value=[1, True])))
+    return r_mock
 
 
 @pytest.fixture()
@@ -14,16 +24,17 @@ def token(client, user, session, monkeypatch):
     current_user: User = session.query(User).filter(User.email == user.get('email')).first()
     current_user.confirmed = True
     session.commit()
-    response = client.post(
-        "/api/auth/login",
-        data={"username": user.get('email'), "password": user.get('password')},
-    )
+    with patch.object(auth_service, 'r', FakeAsyncRedis()):
+        response = client.post(
+            "/api/auth/login",
+            data={"username": user.get('email'), "password": user.get('password')},
+        )
     data = response.json()
     return data["access_token"]
 
 
 def test_create_contact(client, token):
-    with patch.object(auth_service, 'r') as r_mock:
+    with patch.object(auth_service, 'r', new_callable=redis_mock) as r_mock:
         r_mock.get.return_value = None
         response = client.post(
             "/api/contacts",
@@ -45,7 +56,7 @@ def test_create_contact(client, token):
 
 
 def test_get_contact(client, token):
-    with patch.object(auth_service, 'r') as r_mock:
+    with patch.object(auth_service, 'r', new_callable=redis_mock) as r_mock:
         r_mock.get.return_value = None
         response = client.get(
             "/api/contacts/1",
@@ -58,8 +69,146 @@ def test_get_contact(client, token):
         assert "id" in data
 
 
+def test_get_contact_cached_user(client, token, session, user):
+    current_user: User = session.query(User).filter(User.email == user.get('email')).first()
+    cached = {"id": current_user.id, "email": current_user.email, "username": current_user.username,
+              "confirmed": True}
+    with patch.object(auth_service, 'r', new_callable=redis_mock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.get("/api/contacts/1", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        stored = [pickle.loads(call.args[1]) for call in r_mock.set.await_args_list if call.args[0].startswith("user:")]
+        assert stored and stored[0]["email"] == current_user.email
+        assert "password" not in stored[0] and "refresh_token" not in stored[0]
+
+    with patch.object(auth_service, 'r', new_callable=redis_mock) as r_mock:
+        r_mock.get.side_effect = lambda key: pickle.dumps(cached) if key.startswith("user:") else None
+        response = client.get(
+            "/api/contacts/1",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200, response.text
+        r_mock.get.assert_any_await(f"user:{user.get('email')}")
+        assert not [call for call in r_mock.set.await_args_list if call.args[0].startswith("user:")]
+
+
+def test_sparse_fieldsets(client, token, sql_statements):
+    headers = {"Authorization": f"Bearer {token}"}
+    with patch.object(auth_service, 'r', new_callable=redis_mock) as r_mock:
+        r_mock.get.return_value = None
+        del sql_statements[:]
+        response = client.get("/api/contacts/?fields=first_name,last_name", headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json() and all(list(contact) == ["first_name", "last_name", "id"] for contact in response.json())
+        select = [s for s in sql_statements if "FROM contacts" in s][-1]
+        assert "contacts.email" not in select and "contacts.birthday_date" not in select
+
+        response = client.get("/api/contacts/1?fields=birthday_date", headers=headers)
+        assert response.status_code == 200, response.text
+        assert list(response.json()) == ["id", "birthday_date"]
+
+        response = client.get("/api/contacts/1?fields=first_name,last_name,email,phone,birthday_date", headers=headers)
+        assert list(response.json()) == ["first_name", "last_name", "email", "phone", "id", "birthday_date"]
+
+        response = client.get("/api/contacts/search/?query=John&fields=email,password", headers=headers)
+        assert response.status_code == 400, response.text
+        assert response.json()["detail"] == "Unknown fields: password"
+
+
+def test_write_endpoints_single_statement(client, token, session, user, sql_statements):
+    current_user: User = session.query(User).filter(User.email == user.get('email')).first()
+    cached = {"id": current_user.id, "email": current_user.email, "username": current_user.username,
+              "password": current_user.password, "confirmed": True}
+    body = {
+        "first_name": "Single",
+        "last_name": "Statement",
+        "email": "single.statement@example.com",
+        "phone": "123456789",
+        "birthday_date": "1990-01-01"
+    }
+    headers = {"Authorization": f"Bearer {token}"}
+    with patch.object(auth_service, 'r', new_callable=redis_mock) as r_mock:
+        r_mock.get.side_effect = lambda key: pickle.dumps(cached) if key.startswith("user:") else None
+        del sql_statements[:]
+        response = client.post("/api/contacts", json=body, headers=headers)
+        assert response.status_code == 201, response.text
+        contact_id = response.json()["id"]
+        assert [s.split()[0] for s in sql_statements] == ["INSERT", "COMMIT"]
+
+        del sql_statements[:]
+        response = client.put(f"/api/contacts/{contact_id}", json=dict(body, first_name="Updated"), headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json()["first_name"] == "Updated"
+        assert [s.split()[0] for s in sql_statements] == ["UPDATE", "COMMIT"]
+
+        del sql_statements[:]
+        response = client.patch(f"/api/contacts/{contact_id}/birthday?birthday_date=1991-02-03", headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json()["birthday_date"] == "1991-02-03T00:00:00"
+        assert [s.split()[0] for s in sql_statements] == ["UPDATE", "COMMIT"]
+
+        del sql_statements[:]
+        response = client.delete(f"/api/contacts/{contact_id}", headers=headers)
+        assert response.status_code == 200, response.text
+        assert response.json()["first_name"] == "Updated"
+        assert [s.split()[0] for s in sql_statements] == ["UPDATE", "COMMIT"]
+
+        del sql_statements[:]
+        response = client.delete(f"/api/contacts/{contact_id}", headers=headers)
+        assert response.status_code == 404, response.text
+        assert [s.split()[0] for s in sql_statements] == ["UPDATE"]
+
+
+def test_changes_delta_sync(client, token, session, user):
+    current_user: User = session.query(User).filter(User.email == user.get('email')).first()
+    cached = {"id": current_user.id, "email": current_user.email, "username": current_user.username,
+              "password": current_user.password, "confirmed": True}
+    body = {
+        "first_name": "Delta",
+        "last_name": "Sync",
+        "email": "delta.sync@example.com",
+        "phone": "123456789",
+        "birthday_date": "1990-01-01"
+    }
+    headers = {"Authorization": f"Bearer {token}"}
+    with patch.object(auth_service, 'r', new_callable=redis_mock) as r_mock, \
+            patch.object(settings, 'sync_settle_seconds', 0):
+        r_mock.get.side_effect = lambda key: pickle.dumps(cached) if key.startswith("user:") else None
+        kept = client.post("/api/contacts", json=body, headers=headers).json()["id"]
+        removed = client.post("/api/contacts", json=dict(body, first_name="Removed"), headers=headers).json()["id"]
+
+        response = client.get("/api/contacts/changes", params={"limit": 1}, headers=headers)
+        assert response.status_code == 200, response.text
+        page = response.json()
+        assert page["has_more"] is True
+        assert page["deletions"] == []
+        ids = [contact["id"] for contact in page["upserts"]]
+        while page["has_more"]:
+            page = client.get("/api/contacts/changes", params={"since": page["next_token"], "limit": 1},
+                              headers=headers).json()
+            ids += [contact["id"] for contact in page["upserts"]]
+        assert kept in ids and removed in ids
+        token_after_snapshot = page["next_token"]
+
+        response = client.get("/api/contacts/changes", params={"since": token_after_snapshot}, headers=headers)
+        assert response.json()["upserts"] == [] and response.json()["deletions"] == []
+
+        client.put(f"/api/contacts/{kept}", json=dict(body, first_name="Changed"), headers=headers)
+        client.delete(f"/api/contacts/{removed}", headers=headers)
+        response = client.get("/api/contacts/changes", params={"since": token_after_snapshot}, headers=headers)
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert [contact["first_name"] for contact in data["upserts"]] == ["Changed"]
+        assert data["deletions"] == [removed]
+        assert data["has_more"] is False
+
+        assert client.get(f"/api/contacts/{removed}", headers=headers).status_code == 404
+        response = client.get("/api/contacts/changes", params={"since": "not-a-token"}, headers=headers)
+        assert response.status_code == 400, response.text
+
+
 def test_get_contact_not_found(client, token):
-    with patch.object(auth_service, 'r') as r_mock:
+    with patch.object(auth_service, 'r', new_callable=redis_mock) as r_mock:
         r_mock.get.return_value = None
         response = client.get(
             "/api/contacts/999",
@@ -70,8 +219,26 @@ def test_get_contact_not_found(client, token):
         assert data["detail"] == "Contact not found"
 
 
+def test_metrics(client, token):
+    with patch.object(auth_service, 'r', new_callable=redis_mock) as r_mock:
+        r_mock.get.return_value = None
+        client.get("/api/contacts/998", headers={"Authorization": f"Bearer {token}"})
+        client.get("/api/contacts/999", headers={"Authorization": f"Bearer {token}"})
+    response = client.get("/metrics")
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    lines = response.text.splitlines()
+    labels = 'route="/api/contacts/{contact_id}",method="GET"'
+    assert "# TYPE http_request_duration_seconds histogram" in lines
+    assert any(line.startswith(f'http_requests_total{{{labels},status="404"}} ') for line in lines)
+    assert any(line.startswith(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} ') for line in lines)
+    queries = next(line for line in lines if line.startswith(f"http_request_db_queries_sum{{{labels}}}"))
+    assert float(queries.split()[-1]) >= 2
+    assert any(line.startswith('db_query_duration_seconds_count{statement="SELECT"}') for line in lines)
+
+
 def test_get_contacts(client, token):
-    with patch.object(auth_service, 'r') as r_mock:
+    with patch.object(auth_service, 'r', new_callable=redis_mock) as r_mock:
         r_mock.get.return_value = None
         response = client.get(
             "/api/contacts",
@@ -85,7 +252,7 @@ def test_get_contacts(client, token):
 
 
 def test_update_contact(client, token):
-    with patch.object(auth_service, 'r') as r_mock:
+    with patch.object(auth_service, 'r', new_callable=redis_mock) as r_mock:
         r_mock.get.return_value = None
         response = client.put(
             "/api/contacts/1",
@@ -107,7 +274,7 @@ def test_update_contact(client, token):
 
 
 def test_update_contact_not_found(client, token):
-    with patch.object(auth_service, 'r') as r_mock:
+    with patch.object(auth_service, 'r', new_callable=redis_mock) as r_mock:
         r_mock.get.return_value = None
         response = client.put(
             "/api/contacts/999",
@@ -126,7 +293,7 @@ def test_update_contact_not_found(client, token):
 
 
 def test_delete_contact(client, token):
-    with patch.object(auth_service, 'r') as r_mock:
+    with patch.object(auth_service, 'r', new_callable=redis_mock) as r_mock:
         r_mock.get.return_value = None
         response = client.delete(
             "/api/contacts/1",
@@ -139,7 +306,7 @@ def test_delete_contact(client, token):
 
 
 def test_delete_contact_not_found(client, token):
-    with patch.object(auth_service, 'r') as r_mock:
+    with patch.object(auth_service, 'r', new_callable=redis_mock) as r_mock:
         r_mock.get.return_value = None
         response = client.delete(
             "/api/contacts/999",
@@ -151,8 +318,21 @@ def test_delete_contact_not_found(client, token):
 
 
 def test_search_contacts(client, token):
-    with patch.object(auth_service, 'r') as r_mock:
+    with patch.object(auth_service, 'r', new_callable=redis_mock) as r_mock:
         r_mock.get.return_value = None
+        response = client.post(
+            "/api/contacts",
+            json={
+                "first_name": "John",
+                "last_name": "Search",
+                "email": "john.search@example.com",
+                "phone": "123456789",
+                "birthday_date": "1990-01-01"
+            },
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 201, response.text
+        contact_id = response.json()["id"]
         response = client.get(
             "/api/contacts/search/?query=John",
             headers={"Authorization": f"Bearer {token}"}
@@ -162,10 +342,75 @@ def test_search_contacts(client, token):
         assert isinstance(data, list)
         assert data[0]["first_name"] == "John"
         assert "id" in data[0]
+        response = client.delete(
+            f"/api/contacts/{contact_id}",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200, response.text
+
+
+def test_search_contacts_ranked(client, token):
+    with patch.object(auth_service, 'r', new_callable=redis_mock) as r_mock:
+        r_mock.get.return_value = None
+        for first_name in ("Johnathan", "Ann", "John"):
+            client.post(
+                "/api/contacts",
+                json={
+                    "first_name": first_name,
+                    "last_name": "Smith",
+                    "email": f"{first_name.lower()}@example.com",
+                    "phone": "123456789",
+                    "birthday_date": "1990-01-01"
+                },
+                headers={"Authorization": f"Bearer {token}"}
+            )
+        response = client.get(
+            "/api/contacts/search/?query=john&limit=1",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert [contact["first_name"] for contact in data] == ["John"]
+        cursor = response.headers["X-Next-Cursor"]
+
+        response = client.get(
+            f"/api/contacts/search/?query=john&limit=1&cursor={cursor}",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert [contact["first_name"] for contact in data] == ["Johnathan"]
+
+
+def test_get_birthdays_window(client, token):
+    birthday = (date.today() + timedelta(days=3)).replace(year=1992)
+    with patch.object(auth_service, 'r', new_callable=redis_mock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.post(
+            "/api/contacts",
+            json={
+                "first_name": "Birthday",
+                "last_name": "Soon",
+                "email": "birthday.soon@example.com",
+                "phone": "123456789",
+                "birthday_date": birthday.isoformat()
+            },
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 201, response.text
+        contact_id = response.json()["id"]
+
+        response = client.get("/api/contacts/birthdays/?days=7", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        assert contact_id in [contact["id"] for contact in response.json()]
+
+        response = client.get("/api/contacts/birthdays/?days=1", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        assert contact_id not in [contact["id"] for contact in response.json()]
 
 
 def test_get_birthdays(client, token):
-    with patch.object(auth_service, 'r') as r_mock:
+    with patch.object(auth_service, 'r', new_callable=redis_mock) as r_mock:
         r_mock.get.return_value = None
         response = client.get(
             "/api/contacts/birthdays",
@@ -175,4 +420,87 @@ def test_get_birthdays(client, token):
         data = response.json()
         assert isinstance(data, list)
         assert "first_name" in data[0]
-        assert "id" in data[0]
\ No newline at end of file
+        assert "id" in data[0]
+
+
+def test_import_contacts(client, token):
+    body = (
+        "first_name,last_name,email,phone,birthday_date\n"
+        "Ada,Lovelace,ada@example.com,111,1815-12-10\n"
+        "Alan,Turing,alan@example.com,222,not-a-date\n"
+        "Grace,Hopper,grace@example.com,333,1906-12-09\n"
+    )
+    with patch.object(auth_service, 'r', new_callable=redis_mock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.post(
+            "/api/contacts/import",
+            content=body,
+            headers={"Authorization": f"Bearer {token}", "Content-Type": "text/csv"}
+        )
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["imported"] == 2
+        assert data["failed"] == 1
+        assert data["errors"][0]["line"] == 3
+
+        response = client.post(
+            "/api/contacts/import?format=ndjson",
+            content='{"first_name": "Linus", "last_name": "Torvalds", "email": "linus@example.com", '
+                    '"phone": "444", "birthday_date": "1969-12-28"}\n[]\n',
+            headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200, response.text
+        data = response.json()
+        assert data["imported"] == 1
+        assert data["errors"] == [{"line": 2, "errors": ["Expected a JSON object"]}]
+
+
+def test_export_contacts(client, token):
+    with patch.object(auth_service, 'r', new_callable=redis_mock) as r_mock:
+        r_mock.get.return_value = None
+        response = client.get("/api/contacts/export?format=csv", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        assert response.headers["content-type"].startswith("text/csv")
+        lines = response.text.splitlines()
+        assert lines[0] == "id,first_name,last_name,email,phone,birthday_date"
+        assert any(",Ada,Lovelace,ada@example.com,111,1815-12-10" in line for line in lines)
+
+        response = client.get("/api/contacts/export", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        assert len(response.text.splitlines()) == len(lines) - 1
+
+        response = client.get("/api/contacts/export?format=vcf", headers={"Authorization": f"Bearer {token}"})
+        assert response.status_code == 200, response.text
+        assert response.text.count("BEGIN:VCARD\r\n") == len(lines) - 1
+        assert "N:Lovelace;Ada;;;\r\n" in response.text
+
+
+def test_conditional_get(client, token, sql_statements):
+    headers = {"Authorization": f"Bearer {token}"}
+    with patch.object(auth_service, 'r', FakeAsyncRedis()):
+        response = client.post(
+            "/api/contacts",
+            json={
+                "first_name": "Etag",
+                "last_name": "Doe",
+                "email": "etag.doe@example.com",
+                "phone": "123456789",
+                "birthday_date": "1990-01-01"
+            },
+            headers=headers
+        )
+        contact_id = response.json()["id"]
+        response = client.get(f"/api/contacts/{contact_id}", headers=headers)
+        assert response.status_code == 200, response.text
+        etag = response.headers["ETag"]
+
+        del sql_statements[:]
+        response = client.get(f"/api/contacts/{contact_id}", headers=dict(headers, **{"If-None-Match": etag}))
+        assert response.status_code == 304, response.text
+        assert response.headers["ETag"] == etag
+        assert sql_statements == []
+
+        client.patch(f"/api/contacts/{contact_id}/birthday?birthday_date=1991-02-03", headers=headers)
+        response = client.get(f"/api/contacts/{contact_id}", headers=dict(headers, **{"If-None-Match": etag}))
+        assert response.status_code == 200, response.text
+        assert response.headers["ETag"] != etag
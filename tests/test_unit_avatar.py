@@ -0,0 +1,88 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+from src.services.avatar import LocalStorage, resize_avatar, store_avatar
+
+
+def make_image(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class TestAvatar(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.storage = LocalStorage(self.tmp.name, "/static/avatars")
+        patcher = patch("src.services.avatar.get_storage", return_value=self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_resize_avatar(self):
+        data = resize_avatar(io.BytesIO(make_image(1200, 800)), 250)
+        with Image.open(io.BytesIO(data)) as avatar:
+            self.assertEqual(avatar.format, "JPEG")
+            self.assertEqual(avatar.size, (250, 250))
+
+    async def test_store_avatar(self):
+        content = make_image(600, 600)
+        url = await store_avatar(UploadFile(io.BytesIO(content)), 1, None)
+        self.assertRegex(url, r"^/static/avatars/NotesApp/1/[0-9a-f]{16}\.jpg$")
+        path = self.tmp.name + url.removeprefix("/static/avatars")
+        with Image.open(path) as avatar:
+            self.assertEqual(avatar.size, (250, 250))
+
+        with patch.object(self.storage, "save") as save:
+            self.assertIsNone(await store_avatar(UploadFile(io.BytesIO(content)), 1, url))
+            save.assert_not_called()
+
+    async def test_store_avatar_deletes_previous(self):
+        first = await store_avatar(UploadFile(io.BytesIO(make_image(300, 300))), 1, None)
+        second = await store_avatar(UploadFile(io.BytesIO(make_image(400, 300))), 1, first)
+        self.assertNotEqual(first, second)
+        self.assertFalse(os.path.exists(self.tmp.name + first.removeprefix("/static/avatars")))
+        self.assertTrue(os.path.exists(self.tmp.name + second.removeprefix("/static/avatars")))
+
+        gravatar = "https://www.gravatar.com/avatar/0123456789abcdef"
+        with patch.object(self.storage, "delete") as delete:
+            await store_avatar(UploadFile(io.BytesIO(make_image(500, 300))), 1, gravatar)
+            delete.assert_not_called()
+
+    async def test_store_avatar_keeps_other_users_avatars(self):
+        content = make_image(300, 300)
+        first = await store_avatar(UploadFile(io.BytesIO(content)), 1, None)
+        second = await store_avatar(UploadFile(io.BytesIO(content)), 2, first)
+        self.assertNotEqual(first, second)
+        await store_avatar(UploadFile(io.BytesIO(make_image(400, 300))), 2, first)
+        self.assertTrue(os.path.exists(self.tmp.name + first.removeprefix("/static/avatars")))
+
+    def test_local_storage_rejects_traversal(self):
+        for public_id in ("../../../x", "NotesApp/../../x", "/tmp/x"):
+            with self.assertRaises(ValueError):
+                self.storage.save(b"data", public_id)
+            with self.assertRaises(ValueError):
+                self.storage.delete(public_id)
+        self.assertFalse(os.path.exists(os.path.join(os.path.dirname(self.tmp.name), "x.jpg")))
+
+    async def test_store_avatar_rejects_non_images(self):
+        with self.assertRaises(HTTPException) as ctx:
+            await store_avatar(UploadFile(io.BytesIO(b"not an image")), 1, None)
+        self.assertEqual(ctx.exception.status_code, 400)
+
+    async def test_store_avatar_rejects_large_files(self):
+        with patch("src.services.avatar.settings.avatar_max_bytes", 10):
+            with self.assertRaises(HTTPException) as ctx:
+                await store_avatar(UploadFile(io.BytesIO(make_image(10, 10))), 1, None)
+        self.assertEqual(ctx.exception.status_code, 413)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import random
+import unittest
+from datetime import datetime, timezone
+
+from benchmarks.serialization import model_body, row_body, run
+from benchmarks.stats import compare, percentile, summarize
+from benchmarks.tokens import backends, measure
+from src.database.models import Contact
+
+
+class TestBenchmarkStats(unittest.TestCase):
+
+    def test_percentile(self):
+        values = [i / 1000 for i in range(1, 101)]
+        self.assertEqual(percentile(values, 0.5), 0.05)
+        self.assertEqual(percentile(values, 0.99), 0.099)
+        self.assertEqual(percentile([], 0.99), 0.0)
+
+    def test_summarize(self):
+        summary = summarize([0.01, 0.02, 0.03, 0.04], errors=1, duration=2)
+        self.assertEqual(summary["requests"], 4)
+        self.assertEqual(summary["errors"], 1)
+        self.assertEqual(summary["rps"], 2.0)
+        self.assertEqual(summary["p50_ms"], 20.0)
+        self.assertEqual(summary["p99_ms"], 40.0)
+
+    def test_compare(self):
+        baseline = {"search": {"rps": 100, "p95_ms": 10, "errors": 0}, "login": {"rps": 10, "p95_ms": 300, "errors": 0}}
+        results = {"search": {"rps": 95, "p95_ms": 11.5, "errors": 0}, "login": {"rps": 7, "p95_ms": 400, "errors": 2}}
+        regressions = compare(results, baseline, tolerance=0.2)
+        self.assertEqual(len(regressions), 3)
+        self.assertTrue(all(message.startswith("login:") for message in regressions))
+        self.assertEqual(compare(results, {"export": baseline["search"]}, 0.2), ["export: not measured"])
+
+
+class TestSerialization(unittest.TestCase):
+
+    def test_row_body_matches_model_body(self):
+        rows = [
+            {"first_name": "Олена", "last_name": 'O"Brien\\', "email": "a/b@example.com", "phone": "\x01\n\t ",
+             "id": 1, "birthday_date": datetime(1990, 2, 28, 13, 5, 7, 120000)},
+            {"first_name": "😀", "last_name": "</script>", "email": "x@example.com", "phone": "",
+             "id": 2 ** 40, "birthday_date": datetime(2000, 1, 1, tzinfo=timezone.utc)},
+        ]
+        contacts = [Contact(**row) for row in rows]
+        self.assertEqual(row_body(rows), model_body(contacts))
+        self.assertEqual(row_body([]), model_body([]))
+
+    def test_run_checks_bodies(self):
+        result = run(20, repeat=1, rng=random.Random(1))
+        self.assertEqual(result["rows"], 20)
+        self.assertGreater(result["speedup"], 0)
+
+
+class TestTokens(unittest.TestCase):
+
+    def test_measure_every_backend(self):
+        for name, backend in backends():
+            result = measure(backend, seconds=0.001)
+            self.assertGreater(result["sign"], 0, name)
+            self.assertGreater(result["verify"], 0, name)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+import asyncio
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from fakeredis import FakeAsyncRedis, FakeServer
+from redis.exceptions import ConnectionError
+
+from src.services.auth import auth_service
+from src.services.cache import ContactsCache, LRUCache
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2, ttl=60)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual(cache.get("a"), (True, 1))
+        self.assertEqual(cache.get("b"), (False, None))
+        self.assertEqual(len(cache), 2)
+
+    def test_expires_entries(self):
+        cache = LRUCache(maxsize=2, ttl=-1)
+        cache.set("a", 1)
+        self.assertEqual(cache.get("a"), (False, None))
+        self.assertEqual(len(cache), 0)
+
+
+class TestContactsCache(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.redis = FakeAsyncRedis(server=FakeServer())
+        patcher = patch.object(auth_service, 'r', self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.contact = {"id": 1, "first_name": "John", "last_name": "Doe", "email": "john.doe@example.com",
+                        "phone": "123456789", "birthday_date": None}
+        self.loader = AsyncMock(return_value=[self.contact])
+
+    async def test_tiers(self):
+        worker, other_worker = ContactsCache(), ContactsCache()
+        result = await worker.get_or_load(1, ("list",), self.loader)
+        self.assertEqual(result, [self.contact])
+        result = await worker.get_or_load(1, ("list",), self.loader)
+        self.assertEqual(result[0]["first_name"], "John")
+        result = await other_worker.get_or_load(1, ("list",), self.loader)
+        self.assertEqual(result[0]["email"], "john.doe@example.com")
+        self.loader.assert_awaited_once()
+        self.assertEqual(worker.stats, {"local_hits": 1, "redis_hits": 0, "misses": 1, "errors": 0})
+        self.assertEqual(other_worker.stats["redis_hits"], 1)
+
+    async def test_write_invalidates_every_worker(self):
+        worker, other_worker = ContactsCache(), ContactsCache()
+        await worker.get_or_load(1, ("list",), self.loader)
+        await other_worker.get_or_load(1, ("list",), self.loader)
+        await worker.invalidate(1)
+        await other_worker.get_or_load(1, ("list",), self.loader)
+        self.assertEqual(self.loader.await_count, 2)
+
+    async def test_subscribed_worker_applies_messages(self):
+        worker, other_worker = ContactsCache(), ContactsCache()
+        other_worker.start()
+        self.addAsyncCleanup(other_worker.stop)
+        for _ in range(50):
+            if other_worker.subscribed:
+                break
+            await asyncio.sleep(0.01)
+        await other_worker.get_or_load(1, ("list",), self.loader)
+        await other_worker.get_or_load(1, ("list",), self.loader)
+        self.assertEqual(other_worker.stats["local_hits"], 1)
+
+        await worker.invalidate(1)
+        for _ in range(50):
+            if other_worker.versions.get(1)[1] == await self.redis.get("contacts:version:1"):
+                break
+            await asyncio.sleep(0.01)
+        await other_worker.get_or_load(1, ("list",), self.loader)
+        self.assertEqual(self.loader.await_count, 2)
+
+    async def test_given_version_keys_entries(self):
+        cache = ContactsCache()
+        version = await cache.version(1)
+        await cache.get_or_load(1, ("list",), self.loader, version)
+        await cache.get_or_load(1, ("list",), self.loader, version)
+        self.assertEqual(self.loader.await_count, 1)
+        await cache.get_or_load(1, ("list",), self.loader, "other")
+        self.assertEqual(self.loader.await_count, 2)
+        self.assertEqual(await self.redis.get("contacts:version:1"), version.encode())
+
+    async def test_bypassed_without_redis(self):
+        cache = ContactsCache()
+        with patch("src.services.cache.get_contacts_version", AsyncMock(return_value=None)):
+            await cache.get_or_load(1, ("list",), self.loader)
+            await cache.get_or_load(1, ("list",), self.loader)
+        self.assertEqual(self.loader.await_count, 2)
+        self.assertEqual(len(cache.local), 0)
+
+    async def test_failed_invalidation_drops_version(self):
+        cache = ContactsCache()
+        await cache.get_or_load(1, ("list",), self.loader)
+        failing = AsyncMock(side_effect=ConnectionError())
+        with patch("src.services.etags.pipelined", failing), patch("src.services.etags.BUMP_RETRY_DELAY", 0):
+            await cache.invalidate(1)
+        self.assertEqual(failing.await_count, 3)
+        self.assertIsNone(await self.redis.get("contacts:version:1"))
+        self.assertEqual(len(cache.local), 0)
+        self.assertEqual(cache.stats["errors"], 1)
+        await cache.get_or_load(1, ("list",), self.loader)
+        self.assertEqual(self.loader.await_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
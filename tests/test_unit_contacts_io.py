@@ -0,0 +1,53 @@
+import csv
+import io
+import unittest
+from unittest.mock import patch
+
+from src.conf.config import settings
+from src.services.contacts_io import iter_lines, parse_records
+
+
+async def chunks(data: bytes, size: int = 7):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def records(data: str, fmt: str = "csv"):
+    return [record async for record in parse_records(iter_lines(chunks(data.encode())), fmt)]
+
+
+class TestParseRecords(unittest.IsolatedAsyncioTestCase):
+
+    async def test_csv_round_trip(self):
+        rows = [["Ada", "Love\nlace", 'say "hi"', "111"], ["Alan", "Turing", "alan@example.com", "222"]]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(["first_name", "last_name", "email", "phone"])
+        writer.writerows(rows)
+        result = await records(buffer.getvalue())
+        self.assertEqual([line_no for line_no, _, _ in result], [2, 4])
+        self.assertEqual([list(record.values()) for _, record, _ in result], rows)
+
+    async def test_csv_errors(self):
+        result = await records('a,b\n1,2,3\n\n1,2\n"open,2\n')
+        self.assertEqual(result, [
+            (2, None, "Expected 2 fields, got 3"),
+            (4, {"a": "1", "b": "2"}, None),
+            (5, None, "Unterminated quoted field"),
+        ])
+        result = await records('a,b\nab"c,2\n3,4\n5,6\n')
+        self.assertEqual(result, [
+            (2, {"a": 'ab"c', "b": "2"}, None),
+            (3, {"a": "3", "b": "4"}, None),
+            (4, {"a": "5", "b": "6"}, None),
+        ])
+        result = await records('a,b\n"x ""y"", z",2\n"",""\n')
+        self.assertEqual(result, [(2, {"a": 'x "y", z', "b": "2"}, None), (3, {"a": "", "b": ""}, None)])
+        with patch.object(settings, 'import_max_record_size', 20):
+            result = await records('a,b\n"' + "x" * 30 + '\n1,2\n')
+        self.assertEqual(result[0][0], 2)
+        self.assertIn("Record longer than 20", result[0][2])
+
+
+if __name__ == '__main__':
+    unittest.main()
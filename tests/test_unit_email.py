@@ -0,0 +1,101 @@
+import json
+import os
+import socket
+import unittest
+from unittest.mock import AsyncMock, patch
+
+import aiosmtplib
+from aiosmtpd.controller import Controller
+from fakeredis import FakeAsyncRedis, FakeServer
+
+from src.conf.config import settings
+from src.services.auth import auth_service
+from src.services.email import send_email
+from src.services.email_worker import EmailWorker, SMTPSender
+
+
+class RecordingHandler:
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append(envelope)
+        self.sessions.add(id(session))
+        return "250 OK"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TestEmailWorker(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.handler = RecordingHandler()
+        port = free_port()
+        self.controller = Controller(self.handler, hostname="127.0.0.1", port=port)
+        self.controller.start()
+        self.addCleanup(self.controller.stop)
+        self.redis = FakeAsyncRedis(server=FakeServer())
+        patchers = [
+            patch.object(auth_service, 'r', self.redis),
+            patch.multiple(settings, mail_server="127.0.0.1", mail_port=port,
+                           mail_ssl_tls=False, mail_starttls=False, mail_use_credentials=False),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_default_name_is_unique_per_process(self):
+        worker = EmailWorker(self.redis, SMTPSender())
+        self.assertEqual(worker.processing, f"{settings.email_queue}:processing:{socket.gethostname()}:{os.getpid()}")
+        self.assertEqual(EmailWorker(self.redis, SMTPSender(), "a").processing, f"{settings.email_queue}:processing:a")
+
+    async def test_sends_batch_over_one_connection(self):
+        await send_email("first@example.com", "first", "http://testserver/")
+        await send_email("second@example.com", "second", "http://testserver/")
+        sender = SMTPSender()
+        self.addAsyncCleanup(sender.close)
+        worker = EmailWorker(self.redis, sender)
+        self.assertEqual(await worker.run_once(), 2)
+        self.assertEqual([envelope.rcpt_tos for envelope in self.handler.messages],
+                         [["first@example.com"], ["second@example.com"]])
+        self.assertIn(b"Hi first,", self.handler.messages[0].content)
+        self.assertIn(b"http://testserver/api/auth/confirmed_email/", self.handler.messages[0].content)
+        self.assertEqual(len(self.handler.sessions), 1)
+        self.assertEqual(await self.redis.llen(worker.processing), 0)
+
+    async def test_failed_email_is_retried_later(self):
+        await send_email("first@example.com", "first", "http://testserver/")
+        sender = SMTPSender()
+        worker = EmailWorker(self.redis, sender)
+        with patch.object(sender, 'send', AsyncMock(side_effect=aiosmtplib.SMTPResponseException(451, "Try again"))):
+            self.assertEqual(await worker.run_once(), 0)
+        retries = await self.redis.zrange(worker.retries, 0, -1)
+        self.assertEqual(json.loads(retries[0])["attempts"], 1)
+        self.assertEqual(await self.redis.llen(worker.processing), 0)
+        self.assertEqual(await self.redis.llen(worker.queue), 0)
+
+        with patch.object(settings, 'email_retry_delay', 0):
+            await self.redis.zadd(worker.retries, {retries[0]: 0})
+            self.addAsyncCleanup(sender.close)
+            self.assertEqual(await worker.run_once(), 1)
+        self.assertEqual(len(self.handler.messages), 1)
+
+    async def test_invalid_payloads_are_dead_lettered(self):
+        await self.redis.lpush(settings.email_queue, b"not json", json.dumps({"to": "x@example.com"}))
+        await send_email("first@example.com", "first", "http://testserver/")
+        sender = SMTPSender()
+        self.addAsyncCleanup(sender.close)
+        worker = EmailWorker(self.redis, sender)
+        self.assertEqual(await worker.run_once(), 1)
+        self.assertEqual(await self.redis.llen(worker.dead), 2)
+        self.assertEqual(await self.redis.llen(worker.processing), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+from jose.exceptions import ExpiredSignatureError, JWTError
+
+from src.services.jwt_backend import CachingBackend, JoseBackend, NativeBackend
+
+
+def pem_pair(private_key):
+    private = private_key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                        serialization.NoEncryption())
+    public = private_key.public_key().public_bytes(serialization.Encoding.PEM,
+                                                   serialization.PublicFormat.SubjectPublicKeyInfo)
+    return private, public
+
+
+class TestJWTBackends(unittest.TestCase):
+
+    def setUp(self):
+        self.claims = {"sub": "john@example.com", "scope": "access_token",
+                       "exp": datetime.utcnow() + timedelta(minutes=15)}
+        self.es256 = pem_pair(ec.generate_private_key(ec.SECP256R1()))
+        self.eddsa = pem_pair(ed25519.Ed25519PrivateKey.generate())
+
+    def test_hmac_interoperates_with_jose(self):
+        jose, native = JoseBackend("HS256", "secret"), NativeBackend("HS256", "secret")
+        self.assertEqual(native.decode(jose.encode(self.claims))["sub"], "john@example.com")
+        self.assertEqual(jose.decode(native.encode(self.claims))["sub"], "john@example.com")
+
+    def test_es256_interoperates_with_jose(self):
+        private, public = self.es256
+        jose, native = JoseBackend("ES256", private), NativeBackend("ES256", private)
+        self.assertEqual(native.decode(jose.encode(self.claims))["sub"], "john@example.com")
+        self.assertEqual(JoseBackend("ES256", None, public).decode(native.encode(self.claims))["sub"], "john@example.com")
+        self.assertEqual(jose.decode(native.encode(self.claims))["sub"], "john@example.com")
+
+    def test_eddsa_verifies_with_public_key_only(self):
+        private, public = self.eddsa
+        token = NativeBackend("EdDSA", private).encode(self.claims)
+        verifier = NativeBackend("EdDSA", verifying_key=public)
+        self.assertEqual(verifier.decode(token)["scope"], "access_token")
+        with self.assertRaises(JWTError):
+            verifier.encode(self.claims)
+
+    def test_rejects_invalid_tokens(self):
+        backend = NativeBackend("HS256", "secret")
+        token = backend.encode(self.claims)
+        with self.assertRaises(JWTError):
+            NativeBackend("HS256", "other").decode(token)
+        with self.assertRaises(JWTError):
+            backend.decode(token[:-2] + ("AA" if token[-2:] != "AA" else "BB"))
+        with self.assertRaises(JWTError):
+            backend.decode("not.a.token")
+        with self.assertRaises(JWTError):
+            NativeBackend("EdDSA", verifying_key=self.eddsa[1]).decode(token)
+        with self.assertRaises(ExpiredSignatureError):
+            backend.decode(backend.encode(dict(self.claims, exp=datetime.utcnow() - timedelta(seconds=1))))
+
+    def test_requires_a_key(self):
+        for backend in (JoseBackend, NativeBackend):
+            with self.assertRaisesRegex(ValueError, "ES256 requires a signing or verifying key"):
+                backend("ES256", None)
+
+    def test_caching_backend(self):
+        native = NativeBackend("HS256", "secret")
+        backend = CachingBackend(native, maxsize=10, ttl=60)
+        token = backend.encode(self.claims)
+        with patch.object(native, "decode", wraps=native.decode) as decode:
+            claims = backend.decode(token)
+            claims["sub"] = "changed"
+            self.assertEqual(backend.decode(token)["sub"], "john@example.com")
+            self.assertEqual(decode.call_count, 1)
+
+        expired = backend.encode(dict(self.claims, exp=datetime.utcnow() + timedelta(seconds=1)))
+        backend.decode(expired)
+        with patch("src.services.jwt_backend.time.time", return_value=time.time() + 3600):
+            with self.assertRaises(ExpiredSignatureError):
+                backend.decode(expired)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from src.conf.config import settings
+from src.database.db import engine_options, prewarm
+from src.services.metrics import (Counter, Histogram, InstrumentedPool, Registry, RequestStats, db_pool_checkout_duration,
+                                  db_pool_connections, db_pool_saturation, db_pool_timeouts, instrument_engine,
+                                  request_stats)
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_render(self):
+        registry = Registry()
+        counter = registry.register(Counter("requests_total", "Requests.", ("route",)))
+        histogram = registry.register(Histogram("latency_seconds", "Latency.", ("route",), (0.1, 1.0)))
+        counter.inc('/a "b"')
+        histogram.observe(0.05, "/a")
+        histogram.observe(0.5, "/a")
+        histogram.observe(5, "/a")
+        self.assertEqual(registry.render().splitlines(), [
+            "# HELP requests_total Requests.",
+            "# TYPE requests_total counter",
+            'requests_total{route="/a \\"b\\""} 1.0',
+            "# HELP latency_seconds Latency.",
+            "# TYPE latency_seconds histogram",
+            'latency_seconds_bucket{route="/a",le="0.1"} 1',
+            'latency_seconds_bucket{route="/a",le="1.0"} 2',
+            'latency_seconds_bucket{route="/a",le="+Inf"} 3',
+            'latency_seconds_sum{route="/a"} 5.55',
+            'latency_seconds_count{route="/a"} 3',
+        ])
+
+    def test_engine_hooks_count_request_queries(self):
+        engine = create_engine("sqlite://")
+        instrument_engine(engine)
+        stats = RequestStats()
+        token = request_stats.set(stats)
+        try:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+                conn.execute(text("SELECT 2"))
+        finally:
+            request_stats.reset(token)
+        self.assertEqual(stats.queries, 2)
+        self.assertGreater(stats.db_time, 0)
+
+
+class TestDatabasePool(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        handle, path = tempfile.mkstemp(suffix=".db")
+        os.close(handle)
+        self.addCleanup(os.remove, path)
+        self.url = f"sqlite+aiosqlite:///{path}"
+
+    def test_engine_options(self):
+        options = engine_options(self.url)
+        self.assertIs(options["poolclass"], InstrumentedPool)
+        self.assertEqual(options["pool_size"], settings.db_pool_size)
+        self.assertNotIn("poolclass", engine_options("sqlite+aiosqlite://"))
+        with patch.object(settings, 'db_pgbouncer', True):
+            options = engine_options("postgresql+asyncpg://user@localhost/db")
+        self.assertIs(options["poolclass"], NullPool)
+        self.assertEqual(options["connect_args"]["statement_cache_size"], 0)
+        name_statement = options["connect_args"]["prepared_statement_name_func"]
+        self.assertNotEqual(name_statement(), name_statement())
+
+    async def test_pool_metrics_and_prewarm(self):
+        with patch.object(settings, 'db_pool_size', 2), patch.object(settings, 'db_max_overflow', 0), \
+                patch.object(settings, 'db_pool_timeout', 0.05):
+            engine = create_async_engine(self.url, **engine_options(self.url))
+        self.addAsyncCleanup(engine.dispose)
+
+        self.assertEqual(await prewarm(engine, 5), 2)
+        self.assertEqual(engine.pool.checkedin(), 2)
+        self.assertEqual(db_pool_connections.value("idle"), 2)
+
+        checkouts, timeouts = db_pool_checkout_duration.count(), db_pool_timeouts.value()
+        async with engine.connect() as first, engine.connect() as second:
+            await first.execute(text("SELECT 1"))
+            await second.execute(text("SELECT 1"))
+            self.assertEqual(db_pool_saturation.value(), 1.0)
+            with self.assertRaises(PoolTimeoutError):
+                await engine.connect().start()
+        self.assertEqual(db_pool_timeouts.value(), timeouts + 1)
+        self.assertEqual(db_pool_checkout_duration.count(), checkouts + 3)
+        self.assertEqual(db_pool_saturation.value(), 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
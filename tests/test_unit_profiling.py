@@ -0,0 +1,45 @@
+import unittest
+from unittest.mock import patch
+
+from sqlalchemy import create_engine, text
+
+from src.conf.config import settings
+from src.services.metrics import instrument_engine
+from src.services.profiling import QueryBudgetExceeded, instrument_profiling, track_queries
+
+
+class TestProfiling(unittest.TestCase):
+
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        instrument_engine(self.engine)
+        instrument_profiling(self.engine)
+        self.conn = self.engine.connect()
+        self.addCleanup(self.conn.close)
+        self.conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+
+    def test_slow_query_is_logged_with_plan(self):
+        with patch.object(settings, 'slow_query_ms', 0), self.assertLogs("src.services.profiling", "WARNING") as logs:
+            self.conn.execute(text("SELECT name FROM items WHERE name = :name"), {"name": "a"})
+        self.assertIn("SELECT name FROM items", logs.output[0])
+        self.assertIn("Plan:", logs.output[0])
+        self.assertIn("SCAN", logs.output[0])
+
+    def test_repeated_statement_is_logged(self):
+        with patch.object(settings, 'slow_query_ms', None), patch.object(settings, 'n_plus_one_threshold', 3), \
+                track_queries() as stats, self.assertLogs("src.services.profiling", "WARNING") as logs:
+            for item_id in range(4):
+                self.conn.execute(text("SELECT name FROM items WHERE id = :id"), {"id": item_id})
+        self.assertEqual(stats.queries, 4)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("likely an N+1 query", logs.output[0])
+
+    def test_query_budget(self):
+        with patch.object(settings, 'query_budget_strict', True), track_queries(budget=1):
+            self.conn.execute(text("SELECT 1"))
+            with self.assertRaises(QueryBudgetExceeded):
+                self.conn.execute(text("SELECT 2"))
+
+
+if __name__ == '__main__':
+    unittest.main()
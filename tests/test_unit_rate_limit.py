@@ -0,0 +1,65 @@
+import unittest
+from unittest.mock import patch
+
+from fakeredis import FakeAsyncRedis, FakeServer
+from redis.exceptions import ConnectionError
+
+from src.conf.config import settings
+from src.database.redis import pipelined
+from src.services.auth import auth_service
+from src.services.rate_limit import RateLimiter, parse_policy
+
+
+class TestRateLimiter(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.redis = FakeAsyncRedis(server=FakeServer())
+        patchers = [
+            patch.object(auth_service, 'r', self.redis),
+            patch.object(settings, 'rate_limits', {"test": "10/3600"}),
+            patch.object(settings, 'rate_limit_lease', 0.2),
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_parse_policy(self):
+        self.assertEqual(parse_policy("10/60"), (10, 60))
+        self.assertIsNone(parse_policy(""))
+        with self.assertRaises(ValueError):
+            parse_policy("0/60")
+
+    async def test_quota_is_shared_between_workers(self):
+        worker, other_worker = RateLimiter("test"), RateLimiter("test")
+        allowed = 0
+        for _ in range(15):
+            allowed += (await worker.acquire("client"))[0]
+            allowed += (await other_worker.acquire("client"))[0]
+        self.assertEqual(allowed, 10)
+        self.assertTrue((await worker.acquire("another client"))[0])
+
+    async def test_leases_tokens_in_chunks(self):
+        limiter = RateLimiter("test")
+        with patch("src.services.rate_limit.pipelined", wraps=pipelined) as lease:
+            for _ in range(10):
+                self.assertTrue((await limiter.acquire("client"))[0])
+            allowed, retry_after = await limiter.acquire("client")
+        self.assertFalse(allowed)
+        self.assertGreater(retry_after, 0)
+        # Five leases of two tokens, then one that finds the quota used up.
+        self.assertEqual(lease.call_count, 6)
+
+    async def test_fails_open_without_redis(self):
+        limiter = RateLimiter("test")
+        with patch.object(self.redis, 'pipeline', side_effect=ConnectionError()):
+            for _ in range(20):
+                self.assertTrue((await limiter.acquire("client"))[0])
+
+    async def test_disabled_without_policy(self):
+        limiter = RateLimiter("unknown")
+        self.assertFalse(limiter.enabled)
+        await limiter.check("client")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+from unittest.mock import patch
+
+from fakeredis import FakeAsyncRedis, FakeServer
+
+from src.conf.config import settings
+from src.database.redis import create_pool, pipelined
+
+
+class TestRedis(unittest.IsolatedAsyncioTestCase):
+
+    def test_create_pool_from_settings(self):
+        with patch.object(settings, 'redis_max_connections', 7), patch.object(settings, 'redis_socket_timeout', 1.5):
+            pool = create_pool(db=3)
+        self.assertEqual(pool.max_connections, 7)
+        self.assertEqual(pool.connection_kwargs["socket_timeout"], 1.5)
+        self.assertEqual(pool.connection_kwargs["db"], 3)
+        self.assertEqual(pool.timeout, settings.redis_pool_timeout)
+
+    async def test_pipelined(self):
+        r = FakeAsyncRedis(server=FakeServer())
+        count, expired = await pipelined(r, ("INCRBY", "key", 10), ("EXPIRE", "key", 60))
+        self.assertEqual(count, 10)
+        self.assertTrue(expired)
+        self.assertGreater(await r.ttl("key"), 0)
+        self.assertEqual(await pipelined(r), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,8 @@
 import unittest
+from datetime import date
 from unittest.mock import MagicMock
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.database.models import Contact, User
 from src.schemas import ContactBase, ContactModel, ContactResponse
@@ -11,68 +12,109 @@ from src.repository.contacts import (
     create_contact,
     remove_contact,
     update_contact,
+    birthday_md_ranges,
 )
 
 
 class TestNotes(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
-        self.session = MagicMock(spec=Session)
+        self.session = MagicMock(spec=AsyncSession)
+        self.result = MagicMock()
+        self.session.execute.return_value = self.result
         self.user = User(id=1)
 
     async def test_get_contacts(self):
-        contact = [Contact(), Contact(), Contact()]
-        self.session.query().filter().offset().limit().all.return_value = contact
+        rows = [{"id": 1}, {"id": 2}, {"id": 3}]
+        self.result.mappings.return_value = rows
         result = await get_contacts(skip=0, limit=10, user=self.user, db=self.session)
-        self.assertEqual(result, contact)
+        self.assertEqual(result, rows)
+        stmt = self.session.execute.call_args.args[0]
+        self.assertEqual(list(stmt.selected_columns.keys()), list(ContactResponse.model_fields))
+
+    async def test_get_contacts_after_cursor(self):
+        rows = [{"id": 11}, {"id": 12}]
+        self.result.mappings.return_value = rows
+        result = await get_contacts(skip=0, limit=2, user=self.user, db=self.session, after_id=10)
+        self.assertEqual(result, rows)
+        stmt = str(self.session.execute.call_args.args[0])
+        self.assertIn("contacts.id >", stmt)
+        self.assertNotIn("OFFSET", stmt)
 
     async def test_get_contact_found(self):
-        contact = Contact()
-        self.session.query().filter().first.return_value = contact
-        result = await get_contact(contact_id=1, user=self.user, db=self.session)
-        self.assertEqual(result, contact)
+        row = {"id": 1, "first_name": "John"}
+        self.result.mappings.return_value.one_or_none.return_value = row
+        result = await get_contact(contact_id=1, user=self.user, db=self.session, fields=("first_name", "id"))
+        self.assertEqual(result, row)
+        stmt = self.session.execute.call_args.args[0]
+        self.assertEqual(list(stmt.selected_columns.keys()), ["first_name", "id"])
 
     async def test_get_contact_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.result.mappings.return_value.one_or_none.return_value = None
         result = await get_contact(contact_id=1, user=self.user, db=self.session)
         self.assertIsNone(result)
 
     async def test_create_contact(self):
         body = ContactModel(first_name="John", last_name="Doe", email="john.doe@example.com", phone="123456789", birthday_date="1990-01-01")
-        self.session.query().filter().all.return_value = body
+        contact = Contact()
+        self.result.scalar_one.return_value = contact
         result = await create_contact(body=body, user=self.user, db=self.session)
-        self.assertEqual(result.first_name, body.first_name)
-        self.assertEqual(result.last_name, body.last_name)
-        self.assertEqual(result.email, body.email)
-        self.assertEqual(result.phone, body.phone)
-        self.assertEqual(result.birthday_date, body.birthday_date)
+        self.assertEqual(result, contact)
+        params = self.session.execute.call_args.args[0].compile().params
+        self.assertEqual(params["first_name"], body.first_name)
+        self.assertEqual(params["last_name"], body.last_name)
+        self.assertEqual(params["email"], body.email)
+        self.assertEqual(params["phone"], body.phone)
+        self.assertEqual(params["birthday_date"], body.birthday_date)
+        self.assertEqual(params["birthday_md"], 101)
+        self.assertEqual(params["user_id"], self.user.id)
+        self.session.commit.assert_awaited_once()
 
     async def test_remove_contact_found(self):
         contact = Contact()
-        self.session.query().filter().first.return_value = contact
+        self.result.scalar_one_or_none.return_value = contact
         result = await remove_contact(contact_id=1, user=self.user, db=self.session)
         self.assertEqual(result, contact)
+        self.session.commit.assert_awaited_once()
 
     async def test_remove_contact_not_found(self):
-        self.session.query().filter().first.return_value = None
+        self.result.scalar_one_or_none.return_value = None
         result = await remove_contact(contact_id=1, user=self.user, db=self.session)
         self.assertIsNone(result)
+        self.session.commit.assert_not_awaited()
 
     async def test_update_contact_found(self):
         body = ContactModel(first_name="John", last_name="Doe", email="john.doe@example.com", phone="123456789", birthday_date="1990-01-01")
-        contact = Contact(body=body)
-        self.session.query().filter().first.return_value = contact
-        self.session.commit.return_value = None
-        result = await update_contact(note_id=1, body=body, user=self.user, db=self.session)
+        contact = Contact()
+        self.result.scalar_one_or_none.return_value = contact
+        result = await update_contact(contact_id=1, body=body, user=self.user, db=self.session)
         self.assertEqual(result, contact)
+        params = self.session.execute.call_args.args[0].compile().params
+        self.assertEqual(params["first_name"], body.first_name)
+        self.session.commit.assert_awaited_once()
 
     async def test_update_contact_not_found(self):
         body = ContactModel(first_name="John", last_name="Doe", email="john.doe@example.com", phone="123456789", birthday_date="1990-01-01")
-        self.session.query().filter().first.return_value = None
-        self.session.commit.return_value = None
-        result = await update_contact(note_id=1, body=body, user=self.user, db=self.session)
+        self.result.scalar_one_or_none.return_value = None
+        result = await update_contact(contact_id=1, body=body, user=self.user, db=self.session)
         self.assertIsNone(result)
 
 
+class TestBirthdayRanges(unittest.TestCase):
+
+    def test_window_inside_year(self):
+        self.assertEqual(birthday_md_ranges(date(2025, 6, 10), 7), [(610, 617)])
+
+    def test_window_wraps_new_year(self):
+        self.assertEqual(birthday_md_ranges(date(2025, 12, 28), 7), [(1228, 1231), (101, 104)])
+
+    def test_feb_29_in_non_leap_year(self):
+        self.assertEqual(birthday_md_ranges(date(2025, 2, 21), 7), [(221, 229)])
+        self.assertEqual(birthday_md_ranges(date(2024, 2, 21), 7), [(221, 228)])
+
+    def test_whole_year(self):
+        self.assertEqual(birthday_md_ranges(date(2025, 6, 10), 366), [(101, 1231)])
+
+
 if __name__ == '__main__':
-    unittest.main()
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,113 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import patch
+
+from fakeredis import FakeAsyncRedis, FakeServer
+
+from src.conf.config import settings
+from src.services.revocation import REVOKED_KEY, REVOKED_USERS_KEY, BloomFilter, RevocationList
+
+
+class TestBloomFilter(unittest.TestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        members = [f"member-{i}" for i in range(1000)]
+        for member in members:
+            bloom.add(member)
+        self.assertTrue(all(member in bloom for member in members))
+
+    def test_false_positive_rate(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+        for i in range(1000):
+            bloom.add(f"member-{i}")
+        false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+        self.assertLess(false_positives, 300)
+
+
+class TestRevocationList(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.redis = FakeAsyncRedis(server=FakeServer())
+
+    async def wait_subscribed(self, revocations: RevocationList):
+        revocations.start()
+        self.addAsyncCleanup(revocations.stop)
+        for _ in range(50):
+            if revocations.subscribed:
+                return
+            await asyncio.sleep(0.01)
+        self.fail("not subscribed")
+
+    async def test_revoke_until_expiry(self):
+        revocations = RevocationList(lambda: self.redis)
+        await revocations.revoke("live", time.time() + 60)
+        await revocations.revoke("expired", time.time() - 1)
+        self.assertTrue(await revocations.is_revoked("live"))
+        self.assertFalse(await revocations.is_revoked("expired"))
+        self.assertFalse(await revocations.is_revoked("other"))
+        self.assertFalse(await revocations.is_revoked(None))
+
+    async def test_subscribed_worker_skips_redis(self):
+        worker, other_worker = RevocationList(lambda: self.redis), RevocationList(lambda: self.redis)
+        await worker.revoke("before", time.time() + 60)
+        await self.wait_subscribed(other_worker)
+
+        with patch.object(self.redis, "zscore", wraps=self.redis.zscore) as zscore:
+            self.assertFalse(await other_worker.is_revoked("other"))
+            zscore.assert_not_called()
+            self.assertTrue(await other_worker.is_revoked("before"))
+
+            await worker.revoke("after", time.time() + 60)
+            for _ in range(50):
+                if "after" in other_worker.bloom:
+                    break
+                await asyncio.sleep(0.01)
+            self.assertTrue(await other_worker.is_revoked("after"))
+            self.assertEqual(zscore.call_count, 2)
+
+    async def test_rebuild_drops_expired(self):
+        revocations = RevocationList(lambda: self.redis)
+        await revocations.revoke("expired", time.time() - 1)
+        await revocations.revoke("live", time.time() + 60)
+        await revocations.rebuild()
+        self.assertNotIn("expired", revocations.bloom)
+        self.assertIn("live", revocations.bloom)
+        self.assertEqual(await self.redis.zcard(REVOKED_KEY), 1)
+
+    async def test_revoke_user(self):
+        revocations = RevocationList(lambda: self.redis)
+        revoked_at = await revocations.revoke_user("john@example.com")
+        self.assertTrue(await revocations.is_user_revoked("john@example.com", int(revoked_at)))
+        self.assertFalse(await revocations.is_user_revoked("john@example.com", int(revoked_at) + 1))
+        self.assertFalse(await revocations.is_user_revoked("ann@example.com", int(revoked_at)))
+        self.assertFalse(await revocations.is_user_revoked("john@example.com", None))
+
+    async def test_subscribed_worker_mirrors_user_revocations(self):
+        worker, other_worker = RevocationList(lambda: self.redis), RevocationList(lambda: self.redis)
+        before = await worker.revoke_user("john@example.com")
+        await self.wait_subscribed(other_worker)
+        self.assertEqual(other_worker.revoked_users, {"john@example.com": before})
+
+        with patch.object(self.redis, "zscore", wraps=self.redis.zscore) as zscore:
+            after = await worker.revoke_user("ann@example.com")
+            for _ in range(50):
+                if "ann@example.com" in other_worker.revoked_users:
+                    break
+                await asyncio.sleep(0.01)
+            self.assertTrue(await other_worker.is_user_revoked("ann@example.com", int(after)))
+            self.assertFalse(await other_worker.is_user_revoked("bob@example.com", int(after)))
+            zscore.assert_not_called()
+
+    async def test_rebuild_drops_old_user_revocations(self):
+        revocations = RevocationList(lambda: self.redis)
+        await self.redis.zadd(REVOKED_USERS_KEY, {"old@example.com": time.time() - settings.refresh_token_ttl - 1})
+        await revocations.revoke_user("john@example.com")
+        await revocations.rebuild()
+        self.assertEqual(list(revocations.revoked_users), ["john@example.com"])
+        self.assertEqual(await self.redis.zcard(REVOKED_USERS_KEY), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()